@@ -0,0 +1,98 @@
+# benchmarks/bench_exchange_sim.py
+#
+# Order throughput and grid fill-to-refill latency against the local exchange
+# simulator. The simulator runs in this process, so the numbers are a lower
+# bound on what a separate simulator process can sustain.
+#
+# Usage: python benchmarks/bench_exchange_sim.py [orders] [concurrency]
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.advanced.grid_engine import GridEngine
+from src.bot_client import BasicBot
+from src.exchange_sim import ExchangeSimulator, call_in_loop, start_in_thread
+from src.user_stream import UserDataStream
+
+SYMBOL = "BTCUSDT"
+
+
+def bench_sync_throughput(bot, orders):
+    start = time.perf_counter()
+    for i in range(orders):
+        bot.client.futures_create_order(symbol=SYMBOL, side='BUY', type='LIMIT', timeInForce='GTC',
+                                        quantity=0.01, price=40000 + i % 100)
+    return orders / (time.perf_counter() - start)
+
+
+def bench_async_throughput(bot, orders, concurrency):
+    async def run():
+        async_client = await bot.create_async_client()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def place(i):
+            async with semaphore:
+                await async_client.futures_create_order(symbol=SYMBOL, side='SELL', type='LIMIT', timeInForce='GTC',
+                                                        quantity=0.01, price=80000 + i % 100)
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*(place(i) for i in range(orders)))
+            return orders / (time.perf_counter() - start)
+        finally:
+            await async_client.close_connection()
+    return asyncio.run(run())
+
+
+def bench_grid_refill_latency(bot, server, fills=50):
+    """Time from a simulated fill until the grid's refill order is live on the simulator."""
+    engine = GridEngine(bot.client, SYMBOL, 59000, 61000, 200, 0.01)
+    stream = UserDataStream(bot.client, bot.stream_url)
+    sim = server.sim
+
+    async def run():
+        stream_task = asyncio.create_task(stream.run())
+        task = asyncio.create_task(engine.run(stream))
+        while len(engine.order_ids) < engine.grids:
+            await asyncio.sleep(0.01)
+
+        latencies = []
+        price = 60000.0
+        for _ in range(fills):
+            price -= float(engine.price_step)
+            before = sim.stats['orders']
+            start = time.perf_counter()
+            call_in_loop(server, sim.trade, SYMBOL, round(price, 1))
+            while sim.stats['orders'] == before:
+                await asyncio.sleep(0)
+            latencies.append(time.perf_counter() - start)
+
+        task.cancel()
+        await stream.stop()
+        stream_task.cancel()
+        await asyncio.gather(task, stream_task, return_exceptions=True)
+        return latencies
+    return asyncio.run(run())
+
+
+def describe(latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    return f"p50 {p50:.2f} ms, p99 {p99:.2f} ms, max {latencies[-1] * 1000:.2f} ms"
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    simulator = ExchangeSimulator(weight_limit=10**9, order_limit_10s=10**9, order_limit_1m=10**9)
+    server, url = start_in_thread(simulator)
+    bot = BasicBot("bench-key", "bench-secret", base_url=url)
+    bot.load_rate_limits()
+
+    print(f"sync orders/s:  {bench_sync_throughput(bot, orders):.0f}")
+    print(f"async orders/s: {bench_async_throughput(bot, orders, concurrency):.0f} (concurrency {concurrency})")
+    print(f"grid fill-to-refill: {describe(bench_grid_refill_latency(bot, server))}")
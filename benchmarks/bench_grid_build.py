@@ -0,0 +1,56 @@
+# benchmarks/bench_grid_build.py
+#
+# Measures grid build time against the local exchange simulator: one blocking
+# futures_create_order per level versus concurrent batchOrders.
+#
+# Usage: python benchmarks/bench_grid_build.py [latency_ms]
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.advanced.grid_engine import GridEngine
+from src.bot_client import BasicBot
+from src.exchange_sim import ExchangeSimulator, start_in_thread
+
+LEVELS = [10, 50, 100, 250, 500]
+SYMBOL = "BTCUSDT"
+
+
+def bench_sequential(bot, levels):
+    engine = GridEngine(bot.client, SYMBOL, 50000, 70000, levels, 0.01)
+    start = time.perf_counter()
+    engine.place_initial_orders()
+    return time.perf_counter() - start, len(engine.order_ids)
+
+
+def bench_batched(bot, levels):
+    async def run():
+        async_client = await bot.create_async_client()
+        engine = GridEngine(bot.client, SYMBOL, 50000, 70000, levels, 0.01)
+        try:
+            start = time.perf_counter()
+            await engine.place_initial_orders_batched(async_client)
+            return time.perf_counter() - start, len(engine.order_ids)
+        finally:
+            await async_client.close_connection()
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    latency_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 20.0
+    simulator = ExchangeSimulator(latency=latency_ms / 1000, weight_limit=10**9,
+                                  order_limit_10s=10**9, order_limit_1m=10**9)
+    server, url = start_in_thread(simulator)
+    bot = BasicBot("bench-key", "bench-secret", base_url=url)
+    bot.load_rate_limits()
+
+    print(f"Injected latency: {latency_ms:.0f} ms per request")
+    print(f"{'levels':>8} {'sequential_s':>14} {'batched_s':>11} {'speedup':>9}")
+    for levels in LEVELS:
+        sequential, placed_seq = bench_sequential(bot, levels)
+        batched, placed_batch = bench_batched(bot, levels)
+        assert placed_seq == placed_batch == levels
+        print(f"{levels:>8} {sequential:>14.3f} {batched:>11.3f} {sequential / batched:>8.1f}x")
@@ -0,0 +1,96 @@
+# benchmarks/bench_order_path.py
+#
+# Client-side CPU cost of placing one order: python-binance's own
+# futures_create_order request building (params sorted and URL-encoded per
+# call, a fresh HMAC, session.post re-reading the proxy environment) versus
+# RateLimitedClient's OrderEncoder fast path. Both go through the same rate
+# limiter, latency timing and response parser. The per-order numbers are CPU
+# time of the calling thread only, so the simulator answering in another
+# thread of this process does not count; the component rows time signing,
+# encoding and parsing alone.
+#
+# Usage: python benchmarks/bench_order_path.py [orders]
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from binance.client import Client
+from src.bot_client import BasicBot, OrderEncoder, _loads
+from src.exchange_sim import ExchangeSimulator, start_in_thread
+
+SYMBOL = "BTCUSDT"
+SECRET = "bench-secret" * 4
+PARAMS = {'symbol': SYMBOL, 'side': 'BUY', 'type': 'LIMIT', 'timeInForce': 'GTC', 'quantity': '0.010',
+          'price': '58000.10', 'newClientOrderId': 'x-bench0123456789abcdef'}
+RESPONSE = json.dumps({
+    'orderId': 123456789, 'symbol': SYMBOL, 'status': 'NEW', 'clientOrderId': 'x-bench0123456789abcdef',
+    'price': '58000.10', 'avgPrice': '0.00', 'origQty': '0.010', 'executedQty': '0', 'cumQuote': '0',
+    'timeInForce': 'GTC', 'type': 'LIMIT', 'reduceOnly': False, 'closePosition': False, 'side': 'BUY',
+    'positionSide': 'BOTH', 'stopPrice': '0', 'workingType': 'CONTRACT_PRICE', 'priceProtect': False,
+    'origType': 'LIMIT', 'updateTime': 1716000000000,
+}).encode()
+
+
+def per_call_us(fn, number=100000):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def bench_components():
+    encoder = OrderEncoder(SECRET, 10000)
+    data = dict(PARAMS, recvWindow=10000, timestamp=1716000000000)
+    query = "&".join(f"{key}={value}" for key, value in Client._order_params(data))
+    body = encoder.encode(PARAMS, 1716000000000)
+    rows = [
+        ("sign: hmac.new per order", per_call_us(lambda: hmac.new(SECRET.encode(), query.encode(),
+                                                                  hashlib.sha256).hexdigest())),
+        ("sign: keyed state copy", per_call_us(lambda: encoder.sign(body))),
+        ("encode: sorted params + join", per_call_us(lambda: "&".join(
+            f"{key}={value}" for key, value in Client._order_params(dict(data))))),
+        ("encode: cached prefix", per_call_us(lambda: encoder.encode(PARAMS, 1716000000000))),
+        ("parse: json", per_call_us(lambda: json.loads(RESPONSE))),
+        (f"parse: {_loads.__module__}", per_call_us(lambda: _loads(RESPONSE))),
+    ]
+    print(f"{'component':<32} {'us/call':>8}")
+    for name, us in rows:
+        print(f"{name:<32} {us:>8.2f}")
+
+
+def bench_orders(create_order, orders):
+    """Calling-thread CPU and wall time per order, in microseconds."""
+    for i in range(50):  # warm the connection and caches
+        create_order(i)
+    cpu, wall = time.thread_time(), time.perf_counter()
+    for i in range(orders):
+        create_order(i)
+    return (time.thread_time() - cpu) / orders * 1e6, (time.perf_counter() - wall) / orders * 1e6
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bench_components()
+
+    simulator = ExchangeSimulator(weight_limit=10**9, order_limit_10s=10**9, order_limit_1m=10**9,
+                                  accounts={"bench-key": SECRET})
+    server, url = start_in_thread(simulator)
+    bot = BasicBot("bench-key", SECRET, base_url=url)
+    bot.load_rate_limits()
+    client = bot.client
+
+    def order(i):
+        return dict(PARAMS, price=f"{40000 + i % 100}.10", newClientOrderId=f"bench-{i}-{time.perf_counter_ns()}")
+
+    paths = [
+        ("python-binance futures_create_order", lambda i: Client.futures_create_order(client, **order(i))),
+        ("fast path", lambda i: client.futures_create_order(**order(i))),
+    ]
+    print(f"\n{orders} orders each against the simulator")
+    print(f"{'path':<38} {'cpu_us/order':>13} {'wall_us/order':>14}")
+    for name, create_order in paths:
+        cpu, wall = bench_orders(create_order, orders)
+        print(f"{name:<38} {cpu:>13.1f} {wall:>14.1f}")
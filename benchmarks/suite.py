@@ -0,0 +1,567 @@
+# benchmarks/suite.py
+#
+# Reproducible benchmark and load-test suite for the order entry points and
+# strategies. Every benchmark gets a fresh exchange simulator in a child
+# process (src/exchange_sim.py), so no run sees another's book, and the CPU
+# time and tracemalloc figures taken in this process are the client's alone.
+#
+#   order_path      market and limit orders through BasicBot: CPU time per
+#                   call, tracemalloc peak and retained blocks per call,
+#                   latency percentiles and orders/s
+#   entry_points    market_orders.py, limit_orders.py and cli.py run as fresh
+#                   processes, as a user would: wall time and CPU per order
+#   concurrency     async orders/s and latency at 1, 16 and 64 in flight
+#   grid            ladder build time, one request per level and batched;
+#                   fill-to-refill latency on the user-data stream
+#   oco             trade-to-sibling-cancelled reaction time
+#   twap            slice drift from the schedule, from exchange timestamps
+#   trailing        mark-price move to every position's stop replaced
+#   fanout          one market order across several accounts
+#
+# Metric names carry their unit. *_per_s metrics are throughputs, higher is
+# better; every other metric is a time, size or count, lower is better. The
+# results go out as JSON (stdout, or --out) with the git commit and Python
+# version; --repeat N keeps each metric's median over N runs. --compare reads
+# an earlier run and exits 1 if any metric other than a p99 or max got worse
+# by more than --threshold (a fraction, default 0.2). Compare runs made with
+# the same options on the same machine, without --quick when gating.
+#
+# Usage: python benchmarks/suite.py [--quick] [--only grid,oco] [--latency-ms 0] [--repeat 1]
+#                                   [--out results.json] [--compare baseline.json] [--threshold 0.2]
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import aiohttp
+import requests
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(REPO_ROOT)
+from src.accounts import Account, AccountPool
+from src.advanced.grid_engine import GridEngine
+from src.advanced.oco_engine import OcoEngine
+from src.advanced.trailing_engine import TrailingStopEngine
+from src.advanced.twap_engine import TwapEngine
+from src.bot_client import BasicBot
+from src.user_stream import UserDataStream
+
+SYMBOL = "BTCUSDT"
+START_PRICE = 60000.0
+API_KEY = "bench-key"
+API_SECRET = "bench-secret"
+UNLIMITED = str(10**9)
+# Iteration counts per benchmark; --quick divides them by QUICK_DIVISOR (at least 3 each).
+COUNTS = {
+    'orders': 2000,
+    'traced_orders': 200,
+    'process_runs': 10,
+    'async_orders': 2000,
+    'grid_levels': 100,
+    'grid_builds': 5,
+    'grid_fills': 50,
+    'oco_rounds': 20,
+    'twap_slices': 20,
+    'trailing_positions': 50,
+    'trailing_moves': 10,
+    'fanout_accounts': 4,
+    'fanout_rounds': 50,
+}
+QUICK_DIVISOR = 5
+CONCURRENCY = (1, 16, 64)
+TWAP_INTERVAL = 0.1  # seconds between slices
+TAIL_SUFFIXES = ('_p99', '_max')
+
+
+class SimProcess:
+    """An exchange simulator in a child process on a free local port, stopped on exit."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.process = None
+        self.url = None
+
+    def __enter__(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_ROOT, 'src', 'exchange_sim.py'), '--port', str(port),
+             '--latency-ms', str(self.latency_ms), '--weight-limit', UNLIMITED,
+             '--order-limit-10s', UNLIMITED, '--order-limit-1m', UNLIMITED],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                requests.get(f"{self.url}/sim/stats", timeout=1).raise_for_status()
+                return self
+            except requests.RequestException:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.__exit__(None, None, None)
+                    raise RuntimeError(f"Exchange simulator did not start on port {port}.")
+                time.sleep(0.05)
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    def bot(self, api_key=API_KEY):
+        bot = BasicBot(api_key, API_SECRET, base_url=self.url)
+        bot.load_rate_limits()
+        return bot
+
+    async def trade(self, session, price, symbol=SYMBOL):
+        async with session.post(f"{self.url}/sim/trade", json={'symbol': symbol, 'price': str(price)}) as response:
+            response.raise_for_status()
+
+    async def orders_placed(self, session):
+        async with session.get(f"{self.url}/sim/stats") as response:
+            return (await response.json())['orders']
+
+
+# --- Statistics ---
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def latency_metrics(prefix, seconds):
+    """p50/p99/max of a list of durations in seconds, as {prefix}_ms_p50 etc."""
+    return {f"{prefix}_ms_p50": round(percentile(seconds, 0.5) * 1000, 3),
+            f"{prefix}_ms_p99": round(percentile(seconds, 0.99) * 1000, 3),
+            f"{prefix}_ms_max": round(max(seconds) * 1000, 3)}
+
+
+def measure_calls(fn, calls, traced_calls):
+    """Per-call CPU time of this thread, latency percentiles and throughput of fn(i), then allocations.
+
+    Allocations come from a second, shorter pass under tracemalloc, which
+    slows every call down: the peak traced memory a call adds, and the
+    memory blocks still held once all calls returned (caches, leaks).
+    """
+    for i in range(min(50, calls)):  # warm the connection and caches
+        fn(i)
+    latencies = []
+    cpu, wall = time.thread_time(), time.perf_counter()
+    for i in range(calls):
+        started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - started)
+    cpu, wall = time.thread_time() - cpu, time.perf_counter() - wall
+
+    peaks = 0
+    tracemalloc.start()
+    try:
+        blocks = len(tracemalloc.take_snapshot().traces)
+        for i in range(traced_calls):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            fn(calls + i)
+            peaks += tracemalloc.get_traced_memory()[1] - current
+        retained = len(tracemalloc.take_snapshot().traces) - blocks
+    finally:
+        tracemalloc.stop()
+
+    metrics = {'cpu_us': round(cpu / calls * 1e6, 1)}
+    metrics.update(latency_metrics('latency', latencies))
+    metrics.update({'orders_per_s': round(calls / wall, 1),
+                    'alloc_peak_kib': round(peaks / traced_calls / 1024, 2),
+                    'retained_blocks': round(max(retained, 0) / traced_calls, 2)})
+    return metrics
+
+
+def check_running(task):
+    if task.done():
+        raise RuntimeError(f"Strategy stopped early: {task.exception()!r}")
+
+
+async def wait_until(condition, task, interval):
+    """Polls condition() every interval seconds; fails instead of hanging once the strategy task has ended."""
+    while not condition():
+        check_running(task)
+        await asyncio.sleep(interval)
+
+
+# --- Benchmarks ---
+def market_params(i):
+    return {'symbol': SYMBOL, 'side': 'BUY' if i % 2 else 'SELL', 'type': 'MARKET', 'quantity': 0.003}
+
+
+def limit_params(i):
+    return {'symbol': SYMBOL, 'side': 'BUY', 'type': 'LIMIT', 'timeInForce': 'GTC', 'quantity': 0.003,
+            'price': 40000 + i % 100}
+
+
+def bench_order_path(sim, counts):
+    """What market_orders.py and limit_orders.py do per order, minus process start: filters, then the request."""
+    bot = sim.bot()
+    results = {}
+    for name, params in (('market', market_params), ('limit', limit_params)):
+        metrics = measure_calls(lambda i: bot.client.futures_create_order(**bot.filters.prepare_order(params(i))),
+                                counts['orders'], counts['traced_orders'])
+        results.update({f"{name}_{metric}": value for metric, value in metrics.items()})
+    bot.close()
+    return results
+
+
+def bench_entry_points(sim, counts):
+    """Each script as a fresh process per order: interpreter start, imports, client setup and one order."""
+    home = tempfile.mkdtemp(prefix='binance-bot-bench-')
+    # A throwaway home keeps the exchangeInfo cache and bot.log out of the user's; the first run warms the cache.
+    env = dict(os.environ, HOME=home, BINANCE_API_KEY=API_KEY, BINANCE_API_SECRET=API_SECRET,
+               BINANCE_BASE_URL=sim.url)
+    env.pop('BINANCE_BOT_SOCKET', None)
+    src = os.path.join(REPO_ROOT, 'src')
+    commands = {
+        'python': ['-c', 'pass'],
+        'market_orders': [os.path.join(src, 'market_orders.py'), SYMBOL, 'BUY', '0.003'],
+        'limit_orders': [os.path.join(src, 'limit_orders.py'), SYMBOL, 'BUY', '0.003', '40000'],
+        'cli_market': [os.path.join(src, 'cli.py'), 'market', SYMBOL, 'BUY', '0.003'],
+        'cli_limit': [os.path.join(src, 'cli.py'), 'limit', SYMBOL, 'BUY', '0.003', '40000'],
+    }
+    results = {}
+    for name, args in commands.items():
+        subprocess.run([sys.executable] + args, env=env, cwd=home, check=True, capture_output=True)
+        walls, cpu = [], 0.0
+        for _ in range(counts['process_runs']):
+            before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            started = time.perf_counter()
+            subprocess.run([sys.executable] + args, env=env, cwd=home, check=True, capture_output=True)
+            walls.append(time.perf_counter() - started)
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu += after.ru_utime - before.ru_utime + after.ru_stime - before.ru_stime
+        results.update(latency_metrics(f"{name}_wall", walls))
+        results[f"{name}_cpu_ms"] = round(cpu / counts['process_runs'] * 1000, 1)
+    return results
+
+
+def bench_concurrency(sim, counts):
+    """Async limit orders with 1, 16 and 64 in flight on one connection pool."""
+    bot = sim.bot()
+    orders = counts['async_orders']
+
+    async def run(concurrency):
+        async_client = await bot.create_async_client()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def place(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await async_client.futures_create_order(**limit_params(i))
+                latencies.append(time.perf_counter() - started)
+        try:
+            await asyncio.gather(*(place(i) for i in range(min(50, orders))))
+            latencies.clear()
+            cpu, wall = time.process_time(), time.perf_counter()
+            await asyncio.gather(*(place(i) for i in range(orders)))
+            return latencies, time.process_time() - cpu, time.perf_counter() - wall
+        finally:
+            await async_client.close_connection()
+
+    results = {}
+    for concurrency in CONCURRENCY:
+        latencies, cpu, wall = asyncio.run(run(concurrency))
+        results[f"c{concurrency}_orders_per_s"] = round(orders / wall, 1)
+        results[f"c{concurrency}_cpu_us"] = round(cpu / orders * 1e6, 1)
+        results.update(latency_metrics(f"c{concurrency}_latency", latencies))
+    bot.close()
+    return results
+
+
+def bench_grid(sim, counts):
+    """Median ladder build time both ways, then fill-to-refill: trade through a level until its refill is on the book."""
+    bot = sim.bot()
+    levels = counts['grid_levels']
+    results = {}
+
+    def build_sequential():
+        engine = GridEngine(bot.client, SYMBOL, 40000, 50000, levels, 0.003)
+        cpu, started = time.thread_time(), time.perf_counter()
+        engine.place_initial_orders()
+        return time.perf_counter() - started, time.thread_time() - cpu
+
+    async def build_batched():
+        async_client = await bot.create_async_client()
+        engine = GridEngine(bot.client, SYMBOL, 70000, 80000, levels, 0.003)
+        try:
+            cpu, started = time.process_time(), time.perf_counter()
+            await engine.place_initial_orders_batched(async_client)
+            return time.perf_counter() - started, time.process_time() - cpu
+        finally:
+            await async_client.close_connection()
+
+    for name, build in (('sequential', build_sequential), ('batched', lambda: asyncio.run(build_batched()))):
+        walls, cpus = zip(*(build() for _ in range(counts['grid_builds'])))
+        results[f"{name}_build_ms"] = round(statistics.median(walls) * 1000, 1)
+        results[f"{name}_build_cpu_ms"] = round(statistics.median(cpus) * 1000, 1)
+
+    async def refills():
+        engine = GridEngine(bot.client, SYMBOL, START_PRICE - 1000, START_PRICE + 1000, 200, 0.003)
+        stream = UserDataStream(bot.client, bot.stream_url)
+        stream_task = asyncio.create_task(stream.run())
+        task = asyncio.create_task(engine.run(stream))
+        latencies = []
+        async with aiohttp.ClientSession() as session:
+            try:
+                await wait_until(lambda: len(engine.order_ids) >= engine.grids, task, 0.01)
+                price = START_PRICE
+                for _ in range(counts['grid_fills']):
+                    price -= float(engine.price_step)
+                    before = await sim.orders_placed(session)
+                    started = time.perf_counter()
+                    await sim.trade(session, round(price, 1))
+                    while await sim.orders_placed(session) == before:
+                        check_running(task)
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                task.cancel()
+                await stream.stop()
+                stream_task.cancel()
+                await asyncio.gather(task, stream_task, return_exceptions=True)
+        return latencies
+    results.update(latency_metrics('fill_to_refill', asyncio.run(refills())))
+    bot.close()
+    return results
+
+
+def bench_oco(sim, counts):
+    """Trade through the take-profit until the stop-loss is cancelled, over fresh brackets on one stream."""
+    bot = sim.bot()
+
+    async def run():
+        stream = UserDataStream(bot.client, bot.stream_url)
+        stream_task = asyncio.create_task(stream.run())
+        reactions, exchange = [], []
+        async with aiohttp.ClientSession() as session:
+            try:
+                for _ in range(counts['oco_rounds']):
+                    await sim.trade(session, START_PRICE)
+                    engine = OcoEngine(bot.client, SYMBOL, 'BUY', 0.003, START_PRICE + 100, START_PRICE - 1000)
+                    task = asyncio.create_task(engine.run(stream))
+                    await wait_until(lambda: len(engine.placed) == 2, task, 0.005)
+                    started = time.perf_counter()
+                    await sim.trade(session, START_PRICE + 100)
+                    await wait_until(lambda: engine.fill_to_cancel_ms is not None, task, 0.0002)
+                    reactions.append(time.perf_counter() - started)
+                    exchange.append(engine.fill_to_cancel_ms / 1000)
+                    await task
+            finally:
+                await stream.stop()
+                stream_task.cancel()
+                await asyncio.gather(stream_task, return_exceptions=True)
+        return reactions, exchange
+    reactions, exchange = asyncio.run(run())
+    bot.close()
+    results = latency_metrics('trade_to_cancel', reactions)
+    results.update(latency_metrics('exchange_fill_to_cancel', exchange))
+    return results
+
+
+def bench_twap(sim, counts):
+    """Each slice's exchange execution time against start + i * interval, relative to the first slice."""
+    bot = sim.bot()
+    slices = counts['twap_slices']
+    engine = TwapEngine(bot.client, SYMBOL, 'BUY', 0.003 * slices, slices * TWAP_INTERVAL / 60, slices=slices)
+    asyncio.run(engine.run())
+    bot.close()
+    times = sorted(order['updateTime'] for order in engine.orders)
+    if len(times) != slices:
+        raise RuntimeError(f"TWAP sent {len(times)} of {slices} slices.")
+    drift = [abs(t - times[0] - i * TWAP_INTERVAL * 1000) / 1000 for i, t in enumerate(times)]
+    results = latency_metrics('slice_drift', drift)
+    results['schedule_lag_ms_max'] = round(engine.max_lag * 1000, 3)
+    return results
+
+
+def bench_trailing(sim, counts):
+    """Move the mark price until every position's replacement stop is on the book; the amend limit is off."""
+    bot = sim.bot()
+    positions = counts['trailing_positions']
+    engine = TrailingStopEngine(bot.client, [{'symbol': SYMBOL, 'side': 'BUY', 'quantity': 0.003, 'trail_percent': 2,
+                                              'threshold_percent': 0.1} for _ in range(positions)], min_interval=0)
+
+    async def run():
+        stream = UserDataStream(bot.client, bot.stream_url)
+        stream_task = asyncio.create_task(stream.run())
+        task = asyncio.create_task(engine.run(stream))
+        latencies = []
+        async with aiohttp.ClientSession() as session:
+            try:
+                await wait_until(lambda: all(position.stop_price for position in engine.positions), task, 0.01)
+                await asyncio.sleep(0.2)  # the engine's price feed connects after placement
+                price = START_PRICE
+                for move in range(1, counts['trailing_moves'] + 1):
+                    price *= 1.005
+                    started = time.perf_counter()
+                    await sim.trade(session, round(price, 1))
+                    await wait_until(lambda: all(position.amends >= move for position in engine.positions), task,
+                                     0.0002)
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                task.cancel()
+                await stream.stop()
+                stream_task.cancel()
+                await asyncio.gather(task, stream_task, return_exceptions=True)
+        return latencies
+    latencies = asyncio.run(run())
+    bot.close()
+    results = latency_metrics('move_to_all_replaced', latencies)
+    results['replacements_per_s'] = round(positions * len(latencies) / sum(latencies), 1)
+    return results
+
+
+def bench_fanout(sim, counts):
+    """One market order sent to every account of a pool at once."""
+    pool = AccountPool([Account(f"account-{i}", sim.bot(f"{API_KEY}-{i}"), 1.0)
+                        for i in range(counts['fanout_accounts'])])
+    pool.warm_up()
+    elapsed = []
+    try:
+        for i in range(counts['fanout_rounds']):
+            report = pool.place_order(market_params(i))
+            if report['failed']:
+                raise RuntimeError(f"Fan-out order failed: {report['results']}")
+            elapsed.append(report['elapsed_ms'] / 1000)
+    finally:
+        pool.close()
+    return latency_metrics('elapsed', elapsed)
+
+
+BENCHMARKS = {
+    'order_path': bench_order_path,
+    'entry_points': bench_entry_points,
+    'concurrency': bench_concurrency,
+    'grid': bench_grid,
+    'oco': bench_oco,
+    'twap': bench_twap,
+    'trailing': bench_trailing,
+    'fanout': bench_fanout,
+}
+
+
+# --- Results ---
+def git_version():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                               check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def median_results(runs):
+    """Per-metric median of several runs' results."""
+    return {name: {metric: round(statistics.median(run[name][metric] for run in runs), 3) for metric in metrics}
+            for name, metrics in runs[0].items()}
+
+
+def compare(results, baseline, threshold):
+    """Metrics present in both runs as (benchmark, metric, old, new, change, regressed); change > 0 is worse.
+
+    Tail metrics (p99, max) are shown but never count as regressions: over a
+    few dozen samples they move by more than any useful threshold from one
+    run of the same code to the next.
+    """
+    rows = []
+    for name, metrics in results.items():
+        for metric, new in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if metric.endswith('_per_s'):
+                change = -change
+            gated = not metric.endswith(TAIL_SUFFIXES)
+            rows.append((name, metric, old, new, change, gated and change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite against a local exchange simulator")
+    parser.add_argument('--only', help=f"comma-separated benchmarks (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument('--quick', action='store_true', help=f"{QUICK_DIVISOR}x fewer iterations")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="latency the simulator adds to each request")
+    parser.add_argument('--repeat', type=int, default=1, help="run everything this many times and keep the medians")
+    parser.add_argument('--out', help="write the JSON results here instead of stdout")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON results of an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="worst allowed change against the baseline, as a fraction (default 0.2)")
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    counts = {key: max(3, value // QUICK_DIVISOR) if args.quick else value for key, value in COUNTS.items()}
+
+    runs = []
+    for run in range(args.repeat):
+        results = {}
+        for name in names:
+            print(f"{name}{f' (run {run + 1}/{args.repeat})' if args.repeat > 1 else ''}...", file=sys.stderr,
+                  flush=True)
+            with SimProcess(args.latency_ms) as sim:
+                results[name] = BENCHMARKS[name](sim, counts)
+        runs.append(results)
+    results = median_results(runs)
+    for name, metrics in results.items():
+        print(name, file=sys.stderr)
+        for metric, value in metrics.items():
+            print(f"  {metric:<36} {value:>12}", file=sys.stderr)
+
+    document = {
+        'version': git_version(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'options': {'quick': args.quick, 'latency_ms': args.latency_ms, 'repeat': args.repeat},
+        'results': results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+
+    if not args.compare:
+        return 0
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    if baseline.get('options') != document['options']:
+        print(f"Warning: baseline options {baseline.get('options')} differ from {document['options']}.",
+              file=sys.stderr)
+    rows = compare(results, baseline.get('results', {}), args.threshold)
+    regressions = [row for row in rows if row[5]]
+    print(f"\nAgainst {baseline.get('version')} ({len(rows)} metrics, threshold {args.threshold:.0%}):", file=sys.stderr)
+    for name, metric, old, new, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"  {name + '.' + metric:<48} {old:>12} -> {new:>12} {change:>+8.1%}{flag}", file=sys.stderr)
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
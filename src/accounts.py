@@ -0,0 +1,202 @@
+# src/accounts.py
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+try:
+    from src.bot_client import BasicBot
+    from src.rate_limiter import RateLimiter
+    from src.symbol_filters import FilterError
+except ImportError:  # run as a script from src/
+    from bot_client import BasicBot
+    from rate_limiter import RateLimiter
+    from symbol_filters import FilterError
+
+KEYRING_PATH = os.path.join(os.path.expanduser("~"), ".config", "binance-bot", "accounts.json")
+# Connections per account: fan-out sends one request per account at a time, plus room for a stream's REST calls.
+ACCOUNT_POOL_SIZE = 4
+IP_WEIGHT_LIMIT = 2400
+
+
+def load_keyring(path=KEYRING_PATH):
+    """Reads a keyring file. Returns [{'name', 'api_key', 'api_secret', 'scale'}].
+
+    The file holds {"accounts": [{"name": ..., "api_key": ..., "api_secret": ...,
+    "scale": 1.0}, ...]}. api_key_env / api_secret_env name environment
+    variables to read the key and secret from instead, so the file itself
+    need not hold secrets. scale multiplies every quantity sent for that
+    account (default 1).
+    """
+    with open(path) as f:
+        entries = json.load(f).get('accounts') or []
+    if not entries:
+        raise ValueError(f"Keyring {path} has no accounts.")
+    accounts, names = [], set()
+    for i, entry in enumerate(entries):
+        name = entry.get('name') or f"account-{i + 1}"
+        if name in names:
+            raise ValueError(f"Duplicate account name '{name}' in {path}.")
+        names.add(name)
+        api_key = entry.get('api_key') or os.getenv(entry.get('api_key_env', ''))
+        api_secret = entry.get('api_secret') or os.getenv(entry.get('api_secret_env', ''))
+        if not api_key or not api_secret:
+            raise ValueError(f"Account '{name}' has no API key or secret (check api_key_env/api_secret_env).")
+        scale = float(entry.get('scale', 1.0))
+        if scale <= 0:
+            raise ValueError(f"Account '{name}' scale must be positive, got {scale}.")
+        accounts.append({'name': name, 'api_key': api_key, 'api_secret': api_secret, 'scale': scale})
+    return accounts
+
+
+class Account:
+    """One keyring entry with its own BasicBot: pooled session, clock offset and order-rate limits."""
+
+    def __init__(self, name, bot, scale=1.0):
+        self.name = name
+        self.bot = bot
+        self.scale = scale
+
+    def quantity(self, quantity):
+        """quantity scaled for this account; the filters round it to the step size when the order is prepared."""
+        return Decimal(str(quantity)) * Decimal(str(self.scale))
+
+
+class AccountPool:
+    """Sends the same logical order, or grid, to every account of a keyring at once.
+
+    Each account keeps its own BasicBot, so its keep-alive connections, clock
+    offset and per-account order limits stay separate, and one account being
+    throttled or rejected never holds up the others. Order-count limits are
+    per account, but request weight is counted per IP, so each account's
+    limiter gets an equal share of ip_weight_limit. Requests go out from one
+    worker thread per account; results come back per account, in keyring
+    order, with each account's request latency, alongside totals.
+    """
+
+    def __init__(self, accounts, max_workers=None):
+        if not accounts:
+            raise ValueError("AccountPool needs at least one account.")
+        self.accounts = accounts
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(accounts), thread_name_prefix='account')
+
+    @classmethod
+    def from_keyring(cls, path=KEYRING_PATH, testnet=True, base_url=None, sync_time=False,
+                     pool_size=ACCOUNT_POOL_SIZE, ip_weight_limit=IP_WEIGHT_LIMIT):
+        """Builds one BasicBot per keyring account; with sync_time each measures its own clock offset."""
+        entries = load_keyring(path)
+        weight_share = max(1, ip_weight_limit // len(entries))
+        pool = cls([Account(entry['name'], None, entry['scale']) for entry in entries])
+
+        def build(entry):
+            return BasicBot(entry['api_key'], entry['api_secret'], testnet=testnet, base_url=base_url,
+                            pool_size=pool_size, sync_time=sync_time,
+                            rate_limiter=RateLimiter(weight_limit=weight_share))
+
+        try:
+            for account, bot in zip(pool.accounts, pool.executor.map(build, entries)):
+                account.bot = bot
+        except Exception:
+            pool.close()
+            raise
+        return pool
+
+    def warm_up(self):
+        """Opens every account's pooled connection ahead of the first order."""
+        list(self.executor.map(lambda account: account.bot.warm_up(), self.accounts))
+
+    def place_order(self, params):
+        """Places futures_create_order params on every account with its scaled quantity. Returns the report."""
+        started = time.perf_counter()
+        results = list(self.executor.map(lambda account: self._place(account, params), self.accounts))
+        return self._report(params, results, started)
+
+    def place_grid(self, symbol, lower, upper, grids, quantity):
+        """Places the same grid ladder (quantity scaled per account) on every account through batchOrders.
+
+        Only the initial ladder is placed; keeping the grids running is up to
+        a per-account runtime. Returns the report, with each account's
+        placed order count.
+        """
+        from src.advanced.grid_engine import place_grid_batched
+        started = time.perf_counter()
+
+        def place(account):
+            begun = time.perf_counter()
+            try:
+                orders = place_grid_batched(account.bot, symbol, lower, upper, grids,
+                                            float(account.quantity(quantity)))
+            except Exception as e:  # Binance, aiohttp or connection errors alike stay with this account
+                logging.error(f"Account {account.name}: grid failed: {getattr(e, 'message', e)}")
+                return self._result(account, begun, error=getattr(e, 'message', None) or str(e) or type(e).__name__,
+                                    code=getattr(e, 'code', None))
+            result = self._result(account, begun, quantity=account.quantity(quantity))
+            result['orders'] = len(orders)
+            if not orders:
+                result['error'] = "no grid order was placed"
+            return result
+
+        results = list(self.executor.map(place, self.accounts))
+        return self._report({'symbol': symbol, 'type': 'GRID', 'quantity': quantity}, results, started)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for account in self.accounts:
+            if account.bot is not None:
+                account.bot.close()
+
+    def _place(self, account, params):
+        begun = time.perf_counter()
+        quantity = account.quantity(params['quantity'])
+        try:
+            prepared = account.bot.filters.prepare_order(dict(params, quantity=quantity))
+            quantity = prepared['quantity']
+            order = account.bot.client.futures_create_order(**prepared)
+        except FilterError as e:
+            return self._result(account, begun, quantity, error=f"rejected before sending: {e}")
+        except (BinanceAPIException, BinanceRequestException) as e:
+            logging.error(f"Account {account.name}: order failed: {getattr(e, 'message', e)}")
+            return self._result(account, begun, quantity, error=getattr(e, 'message', str(e)),
+                                code=getattr(e, 'code', None))
+        except Exception as e:  # a timeout or dropped connection fails this account only
+            logging.error(f"Account {account.name}: order failed: {e!r}")
+            return self._result(account, begun, quantity, error=str(e) or type(e).__name__)
+        result = self._result(account, begun, quantity)
+        result.update(order_id=order.get('orderId'), status=order.get('status'),
+                      executed=order.get('executedQty'), avg_price=order.get('avgPrice'))
+        return result
+
+    @staticmethod
+    def _result(account, begun, quantity=None, error=None, code=None):
+        result = {'account': account.name, 'quantity': str(quantity) if quantity is not None else None,
+                  'latency_ms': round((time.perf_counter() - begun) * 1000, 3)}
+        if error is not None:
+            result.update(error=error, code=code)
+        return result
+
+    @staticmethod
+    def _report(params, results, started):
+        placed = [result for result in results if 'error' not in result]
+        latencies = sorted(result['latency_ms'] for result in results)
+        report = {
+            'symbol': params.get('symbol'),
+            'side': params.get('side'),
+            'type': params.get('type'),
+            'accounts': len(results),
+            'placed': len(placed),
+            'failed': len(results) - len(placed),
+            'total_quantity': str(sum((Decimal(result['quantity']) for result in placed), Decimal(0))),
+            'executed_quantity': str(sum((Decimal(result.get('executed') or '0') for result in placed), Decimal(0))),
+            'latency_ms': {'min': latencies[0], 'median': latencies[len(latencies) // 2], 'max': latencies[-1]},
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+            'results': results,
+        }
+        logging.info("Fanned out %s %s %s to %d accounts: %d placed, %d failed, latency %.1f-%.1f ms "
+                     "(%.1f ms wall).", report['type'], report['side'] or '', report['symbol'], report['accounts'],
+                     report['placed'], report['failed'], latencies[0], latencies[-1], report['elapsed_ms'])
+        return report
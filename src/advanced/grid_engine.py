@@ -0,0 +1,518 @@
+# advanced/grid_engine.py
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+from binance.enums import *
+from binance.exceptions import BinanceAPIException
+
+from src.batch_orders import (place_orders_batched, place_orders_batched_sync, cancel_orders_batched, is_rejected,
+                              DEFAULT_WEIGHT_BUDGET)
+from src.symbol_filters import SymbolFilterCache, FilterError, FILTER_ERROR_CODES
+from src.latency import record_tick_to_order
+from src.order_store import OrderStore
+from src.user_stream import UserDataStream
+
+# Terminal statuses that remove an order from the grid without refilling it.
+CLOSED_STATUSES = {'CANCELED', 'EXPIRED', 'REJECTED', 'EXPIRED_IN_MATCH'}
+UNKNOWN_ORDER_CODE = -2013
+
+
+class GridEngine:
+    """Event-driven grid driven by ORDER_TRADE_UPDATE events.
+
+    Each fill places the opposite-side order one grid step away as soon as the
+    event arrives. REST is only used to place orders and to reconcile after a
+    stream reconnect. Prices and quantities are rounded to the symbol's
+    tick and step size before any order is sent.
+
+    With a Journal every order is recorded before it is sent and every fill or
+    cancel as it is seen, so a restarted engine with the same parameters
+    replays its ladder from disk and reconciles it with one open-orders call
+    instead of placing every level again.
+
+    With auto_recenter, a fill that uses up one side of the ladder moves the
+    range to centre on the market price (see recenter()).
+    """
+
+    def __init__(self, client, symbol, lower, upper, grids, quantity, journal=None, auto_recenter=False):
+        self.client = client
+        self.symbol = symbol
+        self.lower = lower
+        self.upper = upper
+        self.grids = grids
+        self.quantity = quantity
+        self.price_step = (Decimal(str(upper)) - Decimal(str(lower))) / grids
+        self.auto_recenter = auto_recenter
+        # The launch parameters identify the grid in the journal, wherever recentering has moved it since.
+        self.config = {'symbol': symbol, 'lower': lower, 'upper': upper, 'grids': grids, 'quantity': quantity}
+        self._recenter_lock = threading.Lock()
+        self.filters = SymbolFilterCache.for_client(client)
+        # Keyed by our own client order ID, which is known before the request is
+        # sent, so a fill event that beats the REST response is still matched.
+        self.order_ids = {}  # clientOrderId -> (side, price)
+        self.store = None
+        self.market = None
+        # Part of every client order ID, so our orders can be told apart on the book after a restart.
+        self.instance_id = uuid.uuid4().hex[:8]
+        self.journal = journal
+        self.restored = False
+        if journal is not None:
+            self._restore()
+
+    def _journal_config(self):
+        return self.config
+
+    def _journal_state(self):
+        return {'config': self._journal_config(), 'instance': self.instance_id,
+                'bounds': [self.lower, self.upper],
+                'orders': {client_id: [side, str(price)] for client_id, (side, price) in list(self.order_ids.items())}}
+
+    def _restore(self):
+        """Loads the journaled ladder if it was started with the same parameters."""
+        started = time.perf_counter()
+        state, records = self.journal.replay()
+        config, instance, orders, bounds = None, None, {}, None
+        if state is not None:
+            config, instance, bounds = state['config'], state['instance'], state.get('bounds')
+            orders = {client_id: (side, Decimal(price)) for client_id, (side, price) in state['orders'].items()}
+        for record in records:
+            op = record['op']
+            if op == 'add':
+                orders[record['c']] = (record['side'], Decimal(record['price']))
+            elif op == 'remove':
+                orders.pop(record['c'], None)
+            elif op == 'recenter':
+                bounds = record['bounds']
+            elif op == 'start':
+                config, instance, orders, bounds = record['config'], record['instance'], {}, None
+
+        if config == self._journal_config():
+            self.instance_id = instance
+            self.order_ids = orders
+            if bounds:
+                self.lower, self.upper = bounds
+            self.restored = True
+            logging.info(f"Restored {len(orders)} grid orders from the journal in "
+                         f"{(time.perf_counter() - started) * 1000:.1f} ms.")
+        else:
+            if config is not None:
+                logging.warning(f"Journal holds a grid with other parameters ({config}); its orders are left as they are.")
+            self.journal.reset()
+            self.journal.append({'op': 'start', 'config': self._journal_config(), 'instance': self.instance_id})
+            self.journal.flush()
+        self.journal.state_fn = self._journal_state
+
+    def _track(self, client_id, side, price):
+        self.order_ids[client_id] = (side, price)
+        if self.journal is not None:
+            self.journal.append({'op': 'add', 'c': client_id, 'side': side, 'price': str(price)})
+
+    def _untrack(self, client_id):
+        """Removes an order from the grid. Returns its (side, price), or None if another caller got there first."""
+        # pop() is atomic, so a concurrent reconcile cannot refill the same level twice.
+        entry = self.order_ids.pop(client_id, None)
+        if entry is not None and self.journal is not None:
+            self.journal.append({'op': 'remove', 'c': client_id})
+        return entry
+
+    def current_price(self):
+        """The live market-data price when the stream has a fresh one, else the REST ticker price."""
+        if self.market is not None:
+            price = self.market.price(self.symbol)
+            if price is not None:
+                return price
+        return float(self.client.futures_symbol_ticker(symbol=self.symbol)['price'])
+
+    def place_initial_orders(self):
+        """Places the initial ladder: buys below the current price, sells above."""
+        current_price = self.current_price()
+
+        for side, grid_price in self.levels(current_price):
+            self._place(side, grid_price, "initial")
+
+    async def place_initial_orders_batched(self, async_client, max_concurrency=10,
+                                           weight_budget=DEFAULT_WEIGHT_BUDGET):
+        """Places the initial ladder through concurrent batchOrders calls."""
+        current_price = self.market.price(self.symbol) if self.market is not None else None
+        if current_price is None:
+            current_price = float((await async_client.futures_symbol_ticker(symbol=self.symbol))['price'])
+
+        orders = []
+        for side, grid_price in await asyncio.to_thread(self.levels, current_price):
+            client_id = self._new_client_id()
+            try:
+                orders.append(self._order_params(side, grid_price, client_id))
+            except FilterError as e:
+                logging.error("Skipping grid level at %s: %s", grid_price, e)
+                continue
+            self._track(client_id, side, grid_price)
+
+        results = await place_orders_batched(async_client, orders, max_concurrency, weight_budget)
+        for order, result in zip(orders, results):
+            if is_rejected(result):
+                self._untrack(order['newClientOrderId'])
+                logging.error("API Error placing order at %s: %s", order['price'], result['msg'],
+                              extra={'symbol': self.symbol, 'code': result.get('code')})
+                if result.get('code') in FILTER_ERROR_CODES:
+                    self.filters.invalidate()
+        return results
+
+    def levels(self, current_price):
+        """The grid levels as (side, price), with prices rounded to the symbol's tick size."""
+        sides, prices = zip(*grid_levels(self.lower, self.upper, self.grids, current_price))
+        return list(zip(sides, self.filters.get(self.symbol).round_prices(prices)))
+
+    def handle_order_update(self, event):
+        """Applies one ORDER_TRADE_UPDATE event to the grid."""
+        order = event['o']
+        status = order['X']
+        if order['s'] != self.symbol or (status != 'FILLED' and status not in CLOSED_STATUSES):
+            return
+        if self._untrack(order['c']) is None:
+            return
+
+        if status == 'FILLED':
+            logging.info("Order ID %s (%s at %s) was filled.", order['i'], order['S'], order['p'],
+                         extra={'symbol': self.symbol, 'order_id': order['i']})
+            if self._refill(order['S'], Decimal(order['p'])) is not None:
+                record_tick_to_order(self.client, event, symbol=self.symbol)
+            if self.auto_recenter and not any(side == order['S'] for side, _ in list(self.order_ids.values())):
+                logging.info("The %s side of the grid is used up. Recentering on the market price.", order['S'],
+                             extra={'symbol': self.symbol})
+                self.recenter()
+        else:
+            logging.warning("Order ID %s is %s. Removed from grid.", order['i'], status,
+                            extra={'symbol': self.symbol, 'order_id': order['i']})
+
+    def reconcile(self, store=None):
+        """Resyncs with the exchange after a reconnect, refilling any fills missed meanwhile.
+
+        With an OrderStore (already resynced) the open orders are read locally.
+        """
+        if store is None:
+            open_orders = self.client.futures_get_open_orders(symbol=self.symbol)
+            current_open_ids = {o['clientOrderId'] for o in open_orders}
+            missing_ids = set(self.order_ids) - current_open_ids
+        else:
+            missing_ids = set()
+            for client_id in list(self.order_ids):
+                record = store.get(client_order_id=client_id)
+                if record is None or not record.is_open:
+                    missing_ids.add(client_id)
+        if missing_ids:
+            logging.info(f"Reconcile found {len(missing_ids)} orders no longer open.")
+
+        for client_id in missing_ids:
+            if self._untrack(client_id) is None:
+                continue
+            record = store.get(client_order_id=client_id) if store is not None else None
+            if record is not None:
+                order_id, status, side, price = record.order_id, record.status, record.side, record.price
+            else:
+                try:
+                    order = self.client.futures_get_order(symbol=self.symbol, origClientOrderId=client_id)
+                except BinanceAPIException as e:
+                    logging.error(f"API Error checking order {client_id}: {e.message}")
+                    continue
+                order_id, status, side, price = order['orderId'], order['status'], order['side'], Decimal(order['price'])
+            if status == 'FILLED':
+                logging.info(f"Order ID {order_id} ({side} at {price}) was filled while disconnected.")
+                self._refill(side, price)
+
+    def recover(self):
+        """Restart path: reconciles the journaled ladder with one open-orders call instead of re-placing it.
+
+        Our orders on the book that the journal never saw (sent just before a
+        crash) are adopted. Journaled orders no longer open are looked up in one
+        all-orders call: fills are refilled, and intents that never reached the
+        exchange are placed again.
+        """
+        prefix = f"grid-{self.instance_id}-"
+        open_ids, adopted = set(), 0
+        for order in self.client.futures_get_open_orders(symbol=self.symbol):
+            client_id = order['clientOrderId']
+            if not client_id.startswith(prefix):
+                continue
+            open_ids.add(client_id)
+            if client_id not in self.order_ids:
+                self._track(client_id, order['side'], Decimal(order['price']))
+                adopted += 1
+        missing_ids = set(self.order_ids) - open_ids
+        logging.info(f"Resumed grid: {len(open_ids)} orders still open ({adopted} adopted), "
+                     f"{len(missing_ids)} closed while down.")
+        if not missing_ids:
+            return
+
+        history = {o['clientOrderId']: o for o in self.client.futures_get_all_orders(symbol=self.symbol, limit=1000)}
+        for client_id in missing_ids:
+            entry = self._untrack(client_id)
+            if entry is None:
+                continue
+            side, price = entry
+            order = history.get(client_id)
+            if order is None:
+                try:
+                    order = self.client.futures_get_order(symbol=self.symbol, origClientOrderId=client_id)
+                except BinanceAPIException as e:
+                    if e.code != UNKNOWN_ORDER_CODE:
+                        logging.error(f"API Error checking order {client_id}: {e.message}")
+                        continue
+                    # Journaled, but the engine died before the order reached the exchange.
+                    self._place(side, price, "restored")
+                    continue
+            if order['status'] == 'FILLED':
+                logging.info(f"Order ID {order['orderId']} ({side} at {price}) was filled while down.")
+                self._refill(side, price)
+            else:
+                logging.warning(f"Order ID {order['orderId']} is {order['status']}. Removed from grid.")
+
+    def recenter(self, center_price=None):
+        """Moves the ladder to a range of the same width centred on center_price (default: the market price).
+
+        The range moves in whole grid steps, so levels that are in both ladders
+        keep their orders and queue priority. Leftover orders are moved to
+        missing levels on the same side with the order-modify endpoint, and
+        only the rest are cancelled and placed, through batch calls. Returns
+        the applied (keep, amend, cancel, create) diff, or None if nothing moved.
+        """
+        if not self._recenter_lock.acquire(blocking=False):
+            return None
+        try:
+            if center_price is None:
+                center_price = self.current_price()
+            center_price = Decimal(str(center_price))
+            lower, upper = Decimal(str(self.lower)), Decimal(str(self.upper))
+            shift = ((center_price - (lower + upper) / 2) / self.price_step).to_integral_value() * self.price_step
+            if not shift:
+                return None
+            if lower + shift <= 0:
+                logging.warning("Cannot recenter the grid on %s: its lower bound would fall to %s.",
+                                center_price, lower + shift)
+                return None
+
+            new_lower, new_upper = lower + shift, upper + shift
+            sides, prices = zip(*grid_levels(new_lower, new_upper, self.grids, center_price))
+            desired = list(zip(sides, self.filters.get(self.symbol).round_prices(prices)))
+            diff = ladder_diff(dict(self.order_ids), desired)
+            # Refills from here on stay inside the new range.
+            self.lower, self.upper = float(new_lower), float(new_upper)
+            if self.journal is not None:
+                self.journal.append({'op': 'recenter', 'bounds': [self.lower, self.upper]})
+            self._apply_diff(*diff)
+            keep, amend, cancel, create = diff
+            logging.info("Recentered grid to %s - %s: %d kept, %d amended, %d cancelled, %d placed.",
+                         new_lower, new_upper, len(keep), len(amend), len(cancel), len(create),
+                         extra={'symbol': self.symbol})
+            return diff
+        finally:
+            self._recenter_lock.release()
+
+    def _apply_diff(self, keep, amend, cancel, create):
+        # Cancels go first, so the account never holds more orders than both ladders share.
+        for client_id, result in zip(cancel, cancel_orders_batched(self.client, self.symbol, cancel)):
+            if is_rejected(result):
+                # Most likely filled meanwhile: the level stays tracked, so its fill event refills it as usual.
+                logging.warning("Could not cancel %s while recentering: %s", client_id, result['msg'],
+                                extra={'symbol': self.symbol, 'code': result.get('code')})
+            else:
+                self._untrack(client_id)
+
+        # Orders moving away from the other side go first, so none is moved onto an order still waiting to move.
+        for client_id, side, price in sorted(amend, key=lambda move: not self._moves_outward(*move)):
+            previous = self.order_ids.get(client_id)
+            # Tracked at the new price first, so a fill event racing the response refills from the right level.
+            self._track(client_id, side, price)
+            try:
+                params = self._order_params(side, price, client_id)
+                self.client.futures_modify_order(symbol=self.symbol, origClientOrderId=client_id, side=side,
+                                                 quantity=params['quantity'], price=params['price'])
+            except (BinanceAPIException, FilterError) as e:
+                # The order kept its old price (or filled there), so track it at that price again.
+                if previous is not None and self.order_ids.get(client_id) == (side, price):
+                    self._track(client_id, *previous)
+                if isinstance(e, BinanceAPIException):
+                    logging.error("API Error moving order %s to %s: %s", client_id, price, e.message,
+                                  extra={'symbol': self.symbol, 'code': e.code})
+                else:
+                    logging.error("Skipping move of %s to %s: %s", client_id, price, e)
+
+        orders = []
+        for side, price in create:
+            client_id = self._new_client_id()
+            try:
+                orders.append(self._order_params(side, price, client_id))
+            except FilterError as e:
+                logging.error("Skipping grid level at %s: %s", price, e)
+                continue
+            self._track(client_id, side, price)
+        for order, result in zip(orders, place_orders_batched_sync(self.client, orders)):
+            if is_rejected(result):
+                self._untrack(order['newClientOrderId'])
+                logging.error("API Error placing order at %s: %s", order['price'], result['msg'],
+                              extra={'symbol': self.symbol, 'code': result.get('code')})
+
+    def _moves_outward(self, client_id, side, price):
+        """True if the move takes a buy lower or a sell higher."""
+        entry = self.order_ids.get(client_id)
+        if entry is None:
+            return True
+        return price < entry[1] if side == SIDE_BUY else price > entry[1]
+
+    async def run(self, stream, async_client=None):
+        """Attaches to a running user-data stream, places the ladder once it is live and runs until cancelled.
+
+        With an AsyncClient the initial ladder goes out through batchOrders.
+        """
+        self.store = stream.order_store
+        self.market = getattr(stream, 'market_data', None)
+        stream.on('ORDER_TRADE_UPDATE', self._on_order_update, symbol=self.symbol)
+        stream.on_reconnect(self._on_reconnect)
+        try:
+            # Subscribe before placing, so no fill can land between placement and subscription.
+            await stream.connected.wait()
+            if self.restored:
+                await asyncio.to_thread(self.recover)
+            elif async_client is not None:
+                await self.place_initial_orders_batched(async_client)
+            else:
+                await asyncio.to_thread(self.place_initial_orders)
+            logging.info("Grid trading strategy is now active. Listening for fills...")
+            await asyncio.Event().wait()
+        finally:
+            stream.off('ORDER_TRADE_UPDATE', self._on_order_update, symbol=self.symbol)
+            stream.off_reconnect(self._on_reconnect)
+
+    async def _on_order_update(self, event):
+        await asyncio.to_thread(self.handle_order_update, event)
+
+    async def _on_reconnect(self):
+        await asyncio.to_thread(self.reconcile, self.store)
+
+    def _refill(self, filled_side, filled_price):
+        if filled_side == SIDE_BUY:
+            # Buy filled -> place a new sell order one grid up
+            new_price, new_side = filled_price + self.price_step, SIDE_SELL
+        else:
+            # Sell filled -> place a new buy order one grid down
+            new_price, new_side = filled_price - self.price_step, SIDE_BUY
+        new_price = self.filters.get(self.symbol).round_price(new_price)
+
+        if self.lower <= new_price <= self.upper:
+            return self._place(new_side, new_price, "new")
+        logging.warning("New order price %s is outside the grid range. Skipping.", new_price)
+        return None
+
+    def _new_client_id(self):
+        return f"grid-{self.instance_id}-{uuid.uuid4().hex[:16]}"
+
+    def _order_params(self, side, price, client_id):
+        return self.filters.prepare_order({
+            'symbol': self.symbol,
+            'side': side,
+            'type': ORDER_TYPE_LIMIT,
+            'quantity': self.quantity,
+            'price': price,
+            'timeInForce': TIME_IN_FORCE_GTC,
+            'newClientOrderId': client_id,
+        })
+
+    def _place(self, side, price, label):
+        client_id = self._new_client_id()
+        self._track(client_id, side, price)
+        try:
+            order = self.client.futures_create_order(**self._order_params(side, price, client_id))
+        except BinanceAPIException as e:
+            self._untrack(client_id)
+            logging.error("API Error placing order at %s: %s", price, e.message,
+                          extra={'symbol': self.symbol, 'code': e.code})
+            return None
+        except FilterError as e:
+            self._untrack(client_id)
+            logging.error("Skipping order at %s: %s", price, e)
+            return None
+        logging.info("Placed %s %s order at %s. Order ID: %s", label, side, price, order['orderId'],
+                     extra={'symbol': self.symbol, 'order_id': order['orderId']})
+        return order
+
+
+def grid_levels(lower, upper, grids, current_price):
+    """Yields (side, price) for each grid level: buys below the current price, sells above."""
+    price_step = (upper - lower) / grids
+    for i in range(grids):
+        grid_price = lower + (i + 1) * price_step
+        yield (SIDE_BUY if grid_price < current_price else SIDE_SELL), grid_price
+
+
+def ladder_diff(current, desired):
+    """The fewest order changes that turn the current ladder into the desired one.
+
+    current maps client order ID -> (side, price); desired is a list of
+    (side, price). Returns (keep, amend, cancel, create): client IDs left as
+    they are, (client_id, side, new_price) moves, client IDs to cancel and
+    (side, price) levels to place. Orders are matched on side and price first;
+    leftovers are paired with missing levels on the same side, lowest first.
+    """
+    wanted = Counter(desired)
+    keep, leftover, missing = [], {SIDE_BUY: [], SIDE_SELL: []}, {SIDE_BUY: [], SIDE_SELL: []}
+    for client_id, (side, price) in sorted(current.items(), key=lambda item: item[1][1]):
+        if wanted[(side, price)] > 0:
+            wanted[(side, price)] -= 1
+            keep.append(client_id)
+        else:
+            leftover[side].append((price, client_id))
+    for (side, price), count in wanted.items():
+        missing[side].extend([price] * count)
+
+    amend, cancel, create = [], [], []
+    for side in (SIDE_BUY, SIDE_SELL):
+        old, new = leftover[side], sorted(missing[side])
+        amend.extend((client_id, side, price) for (_, client_id), price in zip(old, new))
+        cancel.extend(client_id for _, client_id in old[len(new):])
+        create.extend((side, price) for price in new[len(old):])
+    return keep, amend, cancel, create
+
+
+def run_stream_grid(bot, symbol, lower, upper, grids, quantity, batch=False, journal=None, auto_recenter=False):
+    """Runs an event-driven grid on the bot's user-data stream (blocks until interrupted)."""
+    engine = GridEngine(bot.client, symbol, lower, upper, grids, quantity, journal=journal,
+                        auto_recenter=auto_recenter)
+    stream = UserDataStream(bot.client, bot.stream_url)
+    store = OrderStore(bot.client)
+    store.attach(stream)
+
+    async def main():
+        async_client = await bot.create_async_client() if batch else None
+        stream_task = asyncio.create_task(stream.run())
+        store_task = asyncio.create_task(store.run(stream))
+        try:
+            await engine.run(stream, async_client)
+        finally:
+            await stream.stop()
+            stream_task.cancel()
+            store_task.cancel()
+            if async_client is not None:
+                await async_client.close_connection()
+
+    asyncio.run(main())
+    return engine
+
+
+def place_grid_batched(bot, symbol, lower, upper, grids, quantity, max_concurrency=10,
+                       weight_budget=DEFAULT_WEIGHT_BUDGET):
+    """Places a grid ladder through batchOrders and returns the successfully placed orders."""
+    engine = GridEngine(bot.client, symbol, lower, upper, grids, quantity)
+
+    async def main():
+        async_client = await bot.create_async_client()
+        try:
+            return await engine.place_initial_orders_batched(async_client, max_concurrency, weight_budget)
+        finally:
+            await async_client.close_connection()
+
+    results = asyncio.run(main())
+    return [result for result in results if not is_rejected(result)]
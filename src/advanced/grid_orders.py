@@ -10,16 +10,12 @@ from binance.exceptions import BinanceAPIException, BinanceRequestException
 # Correctly set the path for absolute imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from src.bot_client import BasicBot
+from src.bot_logging import setup_logging
+from src.symbol_filters import FilterError
+from src.journal import Journal, journal_name
 
 # --- Logging Setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()
 
 # --- API Key Loading ---
 api_key = os.getenv("BINANCE_API_KEY")
@@ -30,8 +26,16 @@ if not api_key or not api_secret:
     sys.exit(1)
 
 # --- Argument Parsing ---
-if len(sys.argv) < 5:
-    logging.info("Usage: python advanced/grid_orders.py <symbol> <lower_price> <upper_price> <num_grids> <quantity_per_grid>")
+# --stream: react to fills from the user-data stream instead of polling REST
+# --batch: place the initial ladder through concurrent batchOrders calls
+# --recenter: with --stream, move the grid onto the market price when it runs out of one side
+use_stream = '--stream' in sys.argv
+use_batch = '--batch' in sys.argv
+use_recenter = '--recenter' in sys.argv
+sys.argv = [arg for arg in sys.argv if arg not in ('--stream', '--batch', '--recenter')]
+
+if len(sys.argv) < 6:
+    logging.info("Usage: python advanced/grid_orders.py <symbol> <lower_price> <upper_price> <num_grids> <quantity_per_grid> [--stream] [--batch] [--recenter]")
     sys.exit(1)
 
 symbol = sys.argv[1].upper()
@@ -75,19 +79,23 @@ def create_grid_orders(symbol, lower, upper, grids, quantity, client):
             side = SIDE_SELL
         
         try:
-            order = client.futures_create_order(
+            params = bot.filters.prepare_order(dict(
                 symbol=symbol,
                 side=side,
                 type=ORDER_TYPE_LIMIT,
                 quantity=quantity,
                 price=grid_price,
                 timeInForce=TIME_IN_FORCE_GTC
-            )
+            ))
+            order = client.futures_create_order(**params)
             orders.append(order)
-            logging.info(f"Placed initial {side} order at {grid_price}. Order ID: {order['orderId']}")
+            logging.info(f"Placed initial {side} order at {params['price']}. Order ID: {order['orderId']}")
         except BinanceAPIException as e:
             logging.error(f"API Error placing order at {grid_price}: {e.message}")
             continue
+        except FilterError as e:
+            logging.error(f"Skipping order at {grid_price}: {e}")
+            continue
 
     return orders
 
@@ -128,14 +136,14 @@ def run_grid_strategy(orders, symbol, lower, upper, grids, quantity, client):
 
                     # Place the new order
                     if lower <= new_price <= upper:
-                        new_order = client.futures_create_order(
+                        new_order = client.futures_create_order(**bot.filters.prepare_order(dict(
                             symbol=symbol,
                             side=new_side,
                             type=ORDER_TYPE_LIMIT,
                             quantity=quantity,
                             price=new_price,
                             timeInForce=TIME_IN_FORCE_GTC
-                        )
+                        )))
                         order_ids[new_order['orderId']] = new_order
                         logging.info(f"Placed new {new_side} order at {new_price}. ID: {new_order['orderId']}")
                     else:
@@ -152,8 +160,22 @@ def run_grid_strategy(orders, symbol, lower, upper, grids, quantity, client):
 
 # --- Main Execution ---
 try:
-    initial_orders = create_grid_orders(symbol, lower_price, upper_price, num_grids, quantity_per_grid, client)
-    run_grid_strategy(initial_orders, symbol, lower_price, upper_price, num_grids, quantity_per_grid, client)
+    if use_stream:
+        from src.advanced.grid_engine import run_stream_grid
+        # The journal lets a restarted grid with the same parameters pick up its orders on the book.
+        run_stream_grid(bot, symbol, lower_price, upper_price, num_grids, quantity_per_grid, batch=use_batch,
+                        journal=Journal.for_strategy(journal_name('grid', symbol, [lower_price, upper_price, num_grids,
+                                                                                    quantity_per_grid])),
+                        auto_recenter=use_recenter)
+    else:
+        if use_recenter:
+            logging.warning("--recenter needs --stream; the polling grid keeps its range.")
+        if use_batch:
+            from src.advanced.grid_engine import place_grid_batched
+            initial_orders = place_grid_batched(bot, symbol, lower_price, upper_price, num_grids, quantity_per_grid)
+        else:
+            initial_orders = create_grid_orders(symbol, lower_price, upper_price, num_grids, quantity_per_grid, client)
+        run_grid_strategy(initial_orders, symbol, lower_price, upper_price, num_grids, quantity_per_grid, client)
 
 except BinanceAPIException as e:
     logging.error(f"Binance API Error (Code {e.code}): {e.message}")
@@ -2,22 +2,17 @@
 import sys
 import os
 import logging
-import time
+import asyncio
 from binance.enums import *
 from binance.exceptions import BinanceAPIException, BinanceRequestException
 
-ORDER_TYPE_STOP_MARKET = "STOP_MARKET"
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from src.bot_client import BasicBot  
+from src.bot_client import BasicBot
+from src.bot_logging import setup_logging
+from src.advanced.oco_engine import OcoEngine, run_stream_oco
+from src.journal import Journal, journal_name
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()
 
 api_key = os.getenv("BINANCE_API_KEY")
 api_secret = os.getenv("BINANCE_API_SECRET")
@@ -27,8 +22,12 @@ if not api_key or not api_secret:
     sys.exit(1)
 
 # --- CLI Args ---
+# --stream: cancel the sibling on the user-data stream fill event instead of polling REST
+use_stream = '--stream' in sys.argv
+sys.argv = [arg for arg in sys.argv if arg != '--stream']
+
 if len(sys.argv) < 6:
-    logging.info("Usage: python advanced/oco.py <symbol> <side> <quantity> <take_profit_price> <stop_loss_price>")
+    logging.info("Usage: python advanced/oco.py <symbol> <side> <quantity> <take_profit_price> <stop_loss_price> [--stream]")
     sys.exit(1)
 
 symbol = sys.argv[1].upper()
@@ -41,13 +40,7 @@ except ValueError:
     logging.error("Error: Quantity, Take Profit Price, and Stop Loss Price must be numbers.")
     sys.exit(1)
 
-if side_str == 'BUY':
-    take_profit_side = SIDE_SELL
-    stop_loss_side = SIDE_SELL
-elif side_str == 'SELL':
-    take_profit_side = SIDE_BUY
-    stop_loss_side = SIDE_BUY
-else:
+if side_str not in (SIDE_BUY, SIDE_SELL):
     logging.error("Error: Side must be 'BUY' or 'SELL'.")
     sys.exit(1)
 
@@ -59,50 +52,13 @@ except Exception as e:
     sys.exit(1)
 
 try:
-    logging.info(f"Placing simulated OCO for {quantity} {symbol}")
-    logging.info(f"  - Take-Profit Limit Price: {take_profit_price}")
-    logging.info(f"  - Stop-Loss Trigger Price: {stop_loss_price}")
-
-    tp_order = client.futures_create_order(
-        symbol=symbol,
-        side=take_profit_side,
-        type=ORDER_TYPE_LIMIT,
-        quantity=quantity,
-        price=take_profit_price,
-        timeInForce=TIME_IN_FORCE_GTC
-    )
-    logging.info("Take-Profit order placed successfully! ")
-    logging.info(f"  - Order ID: {tp_order.get('orderId')}")
-
-    sl_order = client.futures_create_order(
-        symbol=symbol,
-        side=stop_loss_side,
-        type=ORDER_TYPE_STOP_MARKET,
-        quantity=quantity,
-        stopPrice=stop_loss_price
-    )
-    logging.info("Stop-Loss order placed successfully! ")
-    logging.info(f"  - Order ID: {sl_order.get('orderId')}")
-
-    logging.info("Simulated OCO orders are now active. Monitoring for fill status...")
-
-    while True:
-        tp_status = client.futures_get_order(symbol=symbol, orderId=tp_order.get('orderId'))['status']
-        sl_status = client.futures_get_order(symbol=symbol, orderId=sl_order.get('orderId'))['status']
-
-        if tp_status == 'FILLED':
-            logging.info("✅ Take-Profit order filled! Canceling Stop-Loss order...")
-            client.futures_cancel_order(symbol=symbol, orderId=sl_order.get('orderId'))
-            logging.info("Simulated OCO strategy complete.")
-            break
-        
-        if sl_status == 'FILLED':
-            logging.info("❌ Stop-Loss order filled! Canceling Take-Profit order...")
-            client.futures_cancel_order(symbol=symbol, orderId=tp_order.get('orderId'))
-            logging.info("Simulated OCO strategy complete.")
-            break
-            
-        time.sleep(5)  
+    # A restarted OCO with the same parameters takes over its legs instead of placing new ones.
+    journal = Journal.for_strategy(journal_name('oco', symbol, [side_str, quantity, take_profit_price, stop_loss_price]))
+    if use_stream:
+        run_stream_oco(bot, symbol, side_str, quantity, take_profit_price, stop_loss_price, journal=journal)
+    else:
+        engine = OcoEngine(client, symbol, side_str, quantity, take_profit_price, stop_loss_price, journal=journal)
+        asyncio.run(engine.run())
 
 except BinanceAPIException as e:
     logging.error(f"Binance API Error (Code {e.code}): {e.message}")
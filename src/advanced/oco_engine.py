@@ -0,0 +1,404 @@
+# advanced/oco_engine.py
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from binance.enums import *
+from binance.exceptions import BinanceAPIException
+
+from src.symbol_filters import FilterError, SymbolFilterCache
+from src.latency import record_tick_to_order
+from src.order_store import OrderStore
+from src.user_stream import UserDataStream
+
+ORDER_TYPE_STOP_MARKET = "STOP_MARKET"
+UNKNOWN_ORDER_CODE = -2011
+ORDER_NOT_FOUND_CODE = -2013
+FILL_TO_CANCEL_ALERT_MS = 500
+RECONCILE_INTERVAL = 60
+CANCEL_ATTEMPTS = 5
+CANCEL_BACKOFF = 0.5
+CANCEL_RETRY_DELAY = 1.0
+PLACE_ATTEMPTS = 3
+
+
+class OcoEngine:
+    """Simulated OCO: a take-profit LIMIT and a STOP_MARKET stop-loss; the first fill cancels the other.
+
+    With a user-data stream the sibling is cancelled as soon as the fill event
+    arrives, and the legs are reconciled after reconnects and every
+    reconcile_interval seconds in case an event was missed: from the stream's
+    OrderStore when one is attached, else with one open-orders call. Without a stream both
+    legs are polled every poll_interval seconds. Either way fill_to_cancel_ms
+    records how long the sibling stayed live after the fill, and a warning is
+    logged when it exceeds latency_alert_ms. A failed sibling cancel is
+    retried with backoff; the bracket only counts as done once the sibling is
+    cancelled or known to be gone, and until then it is retried every
+    CANCEL_RETRY_DELAY seconds (on the stream) or on the next poll.
+
+    If the stop-loss cannot be placed after the take-profit is live, the
+    take-profit is cancelled before the error is raised, so no leg is left
+    on the book without its stop.
+
+    With a Journal the bracket's ids and placed legs are recorded, so an engine
+    restarted with the same parameters takes over the legs already on the book
+    (checked with one open-orders call) instead of placing a second bracket.
+    """
+
+    def __init__(self, client, symbol, side, quantity, take_profit_price, stop_loss_price, poll_interval=5,
+                 latency_alert_ms=FILL_TO_CANCEL_ALERT_MS, reconcile_interval=RECONCILE_INTERVAL, journal=None):
+        self.client = client
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.take_profit_price = take_profit_price
+        self.stop_loss_price = stop_loss_price
+        self.poll_interval = poll_interval
+        self.latency_alert_ms = latency_alert_ms
+        self.reconcile_interval = reconcile_interval
+        self.filters = SymbolFilterCache.for_client(client)
+        # Both legs close the position, so they trade against the entry side.
+        self.exit_side = SIDE_SELL if side == SIDE_BUY else SIDE_BUY
+        # Our own ids are known before sending, so a fill event can never beat the REST response.
+        bracket_id = uuid.uuid4().hex[:20]
+        self._set_bracket(bracket_id)
+        self.placed = set()  # client ids of the legs known to be on the book
+        self.tp_order = None
+        self.sl_order = None
+        self.done = False
+        self._completing = False
+        self._retry = None  # _complete arguments of a close whose sibling cancel has not gone through
+        self.filled_leg = None
+        self.fill_to_cancel_ms = None
+        self._lock = threading.Lock()
+        self._wakeup = None
+        self.store = None
+        self.journal = journal
+        self.restored = False
+        if journal is not None:
+            self._restore(bracket_id)
+
+    def _set_bracket(self, bracket_id):
+        self.bracket_id = bracket_id
+        self.tp_client_id = f"oco-{bracket_id}-tp"
+        self.sl_client_id = f"oco-{bracket_id}-sl"
+
+    def _journal_config(self):
+        return {'symbol': self.symbol, 'side': self.side, 'quantity': self.quantity,
+                'take_profit_price': self.take_profit_price, 'stop_loss_price': self.stop_loss_price}
+
+    def _journal_state(self):
+        return {'config': self._journal_config(), 'bracket': self.bracket_id, 'placed': sorted(self.placed)}
+
+    def _restore(self, bracket_id):
+        """Takes over the journaled bracket if it was started with the same parameters."""
+        state, records = self.journal.replay()
+        state = dict(state or {})
+        placed = set(state.get('placed', ()))
+        for record in records:
+            if record['op'] == 'start':
+                state = {'config': record['config'], 'bracket': record['bracket']}
+                placed = set()
+            elif record['op'] == 'placed':
+                placed.add(record['leg'])
+
+        if state.get('config') == self._journal_config():
+            self._set_bracket(state['bracket'])
+            self.placed = placed
+            self.restored = True
+            logging.info(f"Resuming OCO {self.bracket_id} from the journal ({len(placed)} legs placed).")
+        else:
+            if state.get('config'):
+                logging.warning(f"Journal holds an unfinished OCO with other parameters ({state['config']}); "
+                                f"its legs are left as they are.")
+            self.journal.reset()
+            self.journal.append({'op': 'start', 'config': self._journal_config(), 'bracket': bracket_id})
+            self.journal.flush()
+        self.journal.state_fn = self._journal_state
+
+    def _mark_placed(self, client_id):
+        self.placed.add(client_id)
+        if self.journal is not None:
+            self.journal.append({'op': 'placed', 'leg': client_id})
+
+    def resume(self):
+        """Restart path: one open-orders call shows which journaled legs are still live; places the rest."""
+        open_ids = {o['clientOrderId'] for o in self.client.futures_get_open_orders(symbol=self.symbol)}
+        for client_id in (self.tp_client_id, self.sl_client_id):
+            if client_id in open_ids and client_id not in self.placed:
+                self._mark_placed(client_id)
+
+        closed = [client_id for client_id in self.placed if client_id not in open_ids]
+        if closed:
+            logging.info(f"The {self._leg_name(closed[0])} leg closed while the engine was down.")
+            sibling_id = self.sl_client_id if closed[0] == self.tp_client_id else self.tp_client_id
+            if len(closed) == 1 and sibling_id in open_ids:
+                self._complete(closed[0], filled=False)
+            else:
+                self.done = True
+                self._finish_journal()
+            return
+        if len(self.placed) < 2:
+            self.place_orders()
+
+    def place_orders(self):
+        """Places the take-profit and stop-loss legs."""
+        logging.info(f"Placing simulated OCO for {self.quantity} {self.symbol}")
+        logging.info(f"  - Take-Profit Limit Price: {self.take_profit_price}")
+        logging.info(f"  - Stop-Loss Trigger Price: {self.stop_loss_price}")
+
+        if self.tp_client_id not in self.placed:
+            self.tp_order = self.client.futures_create_order(**self.filters.prepare_order(dict(
+                symbol=self.symbol,
+                side=self.exit_side,
+                type=ORDER_TYPE_LIMIT,
+                quantity=self.quantity,
+                price=self.take_profit_price,
+                timeInForce=TIME_IN_FORCE_GTC,
+                newClientOrderId=self.tp_client_id
+            )))
+            self._mark_placed(self.tp_client_id)
+            logging.info("Take-Profit order placed successfully! Order ID: %s", self.tp_order.get('orderId'),
+                         extra={'symbol': self.symbol, 'order_id': self.tp_order.get('orderId')})
+
+        if self.sl_client_id not in self.placed:
+            try:
+                self.sl_order = self._place_stop_loss()
+            except BaseException:
+                self._unwind_take_profit()
+                raise
+            self._mark_placed(self.sl_client_id)
+            logging.info("Stop-Loss order placed successfully! Order ID: %s", self.sl_order.get('orderId'),
+                         extra={'symbol': self.symbol, 'order_id': self.sl_order.get('orderId')})
+
+    def _place_stop_loss(self):
+        """Places the stop-loss leg, retrying with backoff unless the order was refused outright."""
+        params = self.filters.prepare_order(dict(
+            symbol=self.symbol,
+            side=self.exit_side,
+            type=ORDER_TYPE_STOP_MARKET,
+            quantity=self.quantity,
+            stopPrice=self.stop_loss_price,
+            newClientOrderId=self.sl_client_id
+        ))
+        for attempt in range(PLACE_ATTEMPTS):
+            try:
+                return self.client.futures_create_order(**params)
+            except FilterError:
+                raise
+            except Exception as e:
+                if attempt == PLACE_ATTEMPTS - 1:
+                    raise
+                logging.error("Error placing stop-loss leg: %s; retrying.", getattr(e, 'message', e))
+            time.sleep(CANCEL_BACKOFF * 2 ** attempt)
+            # A request that failed without an answer may still have placed the order.
+            placed = self._find_leg(self.sl_client_id)
+            if placed is not None:
+                return placed
+
+    def _find_leg(self, client_id):
+        """The leg as the exchange has it, or None if it was never placed or cannot be looked up."""
+        try:
+            return self.client.futures_get_order(symbol=self.symbol, origClientOrderId=client_id)
+        except BinanceAPIException as e:
+            if e.code != ORDER_NOT_FOUND_CODE:
+                logging.error("API Error looking up %s leg: %s", self._leg_name(client_id), e.message)
+        except Exception as e:
+            logging.error("Error looking up %s leg: %s", self._leg_name(client_id), e)
+        return None
+
+    def _unwind_take_profit(self):
+        """Cancels the take-profit leg when its stop-loss could not be placed."""
+        if self.tp_client_id not in self.placed:
+            return
+        logging.error("Stop-loss leg could not be placed; canceling the take-profit leg.")
+        _, gone = self._cancel_sibling(self.tp_client_id)
+        if gone:
+            self.placed.discard(self.tp_client_id)
+            self._finish_journal()
+        else:
+            logging.critical("Take-profit leg %s is live without a stop-loss.", self.tp_client_id,
+                             extra={'symbol': self.symbol})
+
+    def check(self):
+        """Polls both legs and cancels the sibling of a filled one. Returns True once complete."""
+        tp = self.client.futures_get_order(symbol=self.symbol, origClientOrderId=self.tp_client_id)
+        sl = self.client.futures_get_order(symbol=self.symbol, origClientOrderId=self.sl_client_id)
+
+        if tp['status'] == 'FILLED':
+            self._complete(self.tp_client_id, tp.get('updateTime'))
+        elif sl['status'] == 'FILLED':
+            self._complete(self.sl_client_id, sl.get('updateTime'))
+        return self.done
+
+    def handle_order_update(self, event):
+        """Handles one ORDER_TRADE_UPDATE event; a filled leg cancels its sibling."""
+        order = event['o']
+        if order['c'] in (self.tp_client_id, self.sl_client_id) and order['X'] == 'FILLED':
+            if self._complete(order['c'], order.get('T')):
+                record_tick_to_order(self.client, event, symbol=self.symbol)
+
+    def reconcile(self, store=None):
+        """If a leg is no longer open it filled (or was cancelled), so cancel the other.
+
+        Reads the legs from an OrderStore when given, else makes one open-orders call.
+        """
+        if self.done or len(self.placed) < 2:
+            return
+        if store is not None:
+            legs = {client_id: store.get(client_order_id=client_id) for client_id in (self.tp_client_id, self.sl_client_id)}
+            missing = [client_id for client_id, record in legs.items() if record is not None and not record.is_open]
+            filled = [client_id for client_id in missing if legs[client_id].status == 'FILLED']
+            if filled:
+                logging.info(f"Reconcile found the {self._leg_name(filled[0])} leg filled.")
+                self._complete(filled[0], legs[filled[0]].update_time)
+                return
+        else:
+            open_ids = {o['clientOrderId'] for o in self.client.futures_get_open_orders(symbol=self.symbol)}
+            missing = [client_id for client_id in (self.tp_client_id, self.sl_client_id) if client_id not in open_ids]
+        if len(missing) == 1:
+            logging.info(f"Reconcile found the {self._leg_name(missing[0])} leg no longer open.")
+            self._complete(missing[0], filled=False)
+        elif len(missing) == 2:
+            with self._lock:
+                if self.done:
+                    return
+                self.done = True
+            self._finish_journal()
+            logging.warning(f"Reconcile found neither OCO leg open for {self.symbol}; nothing left to cancel.")
+
+    def _complete(self, closed_id, fill_time_ms=None, filled=True):
+        """Cancels the sibling of a closed leg. Returns True if this call cancelled it."""
+        with self._lock:
+            if self.done or self._completing:
+                return False
+            self._completing = True
+        sibling_id = self.sl_client_id if closed_id == self.tp_client_id else self.tp_client_id
+        if not filled:
+            logging.info("Canceling %s order...", self._leg_name(sibling_id))
+        elif closed_id == self.tp_client_id:
+            self.filled_leg = self._leg_name(closed_id)
+            logging.info("✅ Take-Profit order filled! Canceling Stop-Loss order...")
+        else:
+            self.filled_leg = self._leg_name(closed_id)
+            logging.info("❌ Stop-Loss order filled! Canceling Take-Profit order...")
+
+        started = time.monotonic()
+        try:
+            cancelled, gone = self._cancel_sibling(sibling_id)
+        finally:
+            with self._lock:
+                self._completing = False
+        if not gone:
+            logging.error("%s leg may still be live; retrying the cancel.", self._leg_name(sibling_id))
+            self._retry = (closed_id, fill_time_ms, filled)
+            return False
+        with self._lock:
+            self._retry = None
+            self.done = True
+        # Only now: a journal reset before the cancel would let a restart place a second bracket.
+        self._finish_journal()
+
+        # Exchange timestamps on both ends include stream delivery; fall back to the local cancel round trip.
+        if fill_time_ms and cancelled and cancelled.get('updateTime'):
+            self.fill_to_cancel_ms = cancelled['updateTime'] - fill_time_ms
+        else:
+            self.fill_to_cancel_ms = (time.monotonic() - started) * 1000
+        if self.fill_to_cancel_ms > self.latency_alert_ms:
+            logging.warning("OCO %s fill-to-cancel latency %.0f ms exceeds %s ms", self.symbol, self.fill_to_cancel_ms,
+                            self.latency_alert_ms, extra={'fill_to_cancel_ms': self.fill_to_cancel_ms})
+        else:
+            logging.info("Fill-to-cancel latency: %.0f ms", self.fill_to_cancel_ms,
+                         extra={'fill_to_cancel_ms': self.fill_to_cancel_ms})
+        logging.info("Simulated OCO strategy complete.")
+        return cancelled is not None
+
+    def _cancel_sibling(self, sibling_id):
+        """Cancels the sibling leg, retrying with backoff. Returns (cancel response, whether it is gone)."""
+        for attempt in range(CANCEL_ATTEMPTS):
+            try:
+                return self.client.futures_cancel_order(symbol=self.symbol, origClientOrderId=sibling_id), True
+            except BinanceAPIException as e:
+                if e.code == UNKNOWN_ORDER_CODE:
+                    logging.error("%s leg was no longer open; both legs may have filled.", self._leg_name(sibling_id))
+                    return None, True
+                logging.error("API Error canceling %s leg: %s", self._leg_name(sibling_id), e.message)
+            except Exception as e:
+                logging.error("Error canceling %s leg: %s", self._leg_name(sibling_id), e)
+            if attempt < CANCEL_ATTEMPTS - 1:
+                time.sleep(CANCEL_BACKOFF * 2 ** attempt)
+        return None, False
+
+    def _finish_journal(self):
+        # A finished bracket has nothing to resume; the next run starts a new one.
+        if self.journal is not None:
+            self.journal.reset()
+
+    def _leg_name(self, client_id):
+        return 'take-profit' if client_id == self.tp_client_id else 'stop-loss'
+
+    async def run(self, stream=None):
+        """Places both legs and waits until one fills: on stream events if a stream is given, else by polling."""
+        start = self.resume if self.restored else self.place_orders
+        if stream is None:
+            await asyncio.to_thread(start)
+            logging.info("Simulated OCO orders are now active. Monitoring for fill status...")
+            while not self.done and not await asyncio.to_thread(self.check):
+                await asyncio.sleep(self.poll_interval)
+            return
+
+        self._wakeup = asyncio.Event()
+        self.store = stream.order_store
+        stream.on('ORDER_TRADE_UPDATE', self._on_order_update, symbol=self.symbol)
+        stream.on_reconnect(self._on_reconnect)
+        try:
+            # Subscribe before placing, so no fill can land between placement and subscription.
+            await stream.connected.wait()
+            await asyncio.to_thread(start)
+            logging.info("Simulated OCO orders are now active. Listening for fills...")
+            while not self.done:
+                if self._retry is not None:
+                    await asyncio.sleep(CANCEL_RETRY_DELAY)
+                    await asyncio.to_thread(self._complete, *self._retry)
+                    continue
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.reconcile_interval)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self.reconcile, self.store)
+                self._wakeup.clear()
+        finally:
+            stream.off('ORDER_TRADE_UPDATE', self._on_order_update, symbol=self.symbol)
+            stream.off_reconnect(self._on_reconnect)
+
+    async def _on_order_update(self, event):
+        await asyncio.to_thread(self.handle_order_update, event)
+        if self.done or self._retry is not None:
+            self._wakeup.set()
+
+    async def _on_reconnect(self):
+        await asyncio.to_thread(self.reconcile, self.store)
+        if self.done or self._retry is not None:
+            self._wakeup.set()
+
+
+def run_stream_oco(bot, symbol, side, quantity, take_profit_price, stop_loss_price, journal=None):
+    """Runs an event-driven OCO on the bot's user-data stream until one leg fills."""
+    engine = OcoEngine(bot.client, symbol, side, quantity, take_profit_price, stop_loss_price, journal=journal)
+    stream = UserDataStream(bot.client, bot.stream_url)
+    store = OrderStore(bot.client)
+    store.attach(stream)
+
+    async def main():
+        stream_task = asyncio.create_task(stream.run())
+        store_task = asyncio.create_task(store.run(stream))
+        try:
+            await engine.run(stream)
+        finally:
+            await stream.stop()
+            stream_task.cancel()
+            store_task.cancel()
+
+    asyncio.run(main())
+    return engine
@@ -7,16 +7,11 @@ from binance.exceptions import BinanceAPIException, BinanceRequestException
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from src.bot_client import BasicBot
+from src.bot_logging import setup_logging
+from src.symbol_filters import FilterError
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()
 
 api_key = os.getenv("BINANCE_API_KEY")
 api_secret = os.getenv("BINANCE_API_SECRET")
@@ -60,7 +55,7 @@ try:
     logging.info(f"  - Stop Price: {stop_price}")
     logging.info(f"  - Limit Price: {limit_price}")
 
-    order = client.futures_create_order(
+    order = client.futures_create_order(**bot.filters.prepare_order(dict(
         symbol=symbol,
         side=side,
         type=ORDER_TYPE_STOP,
@@ -68,7 +63,7 @@ try:
         quantity=quantity,
         price=limit_price,
         stopPrice=stop_price
-    )
+    )))
 
 
     logging.info("Order placed successfully! ")
@@ -84,5 +79,7 @@ except BinanceAPIException as e:
     logging.error(f"Binance API Error (Code {e.code}): {e.message}")
 except BinanceRequestException as e:
     logging.error(f"Binance Request Error: {e.message}")
+except FilterError as e:
+    logging.error(f"Order rejected before sending: {e}")
 except Exception as e:
     logging.error(f"An unexpected error occurred: {e}")
\ No newline at end of file
@@ -0,0 +1,418 @@
+# advanced/trailing_engine.py
+
+import asyncio
+import itertools
+import logging
+import uuid
+from decimal import ROUND_DOWN, ROUND_UP
+from binance.enums import *
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+from src.market_data import MarketData
+from src.order_store import OrderStore
+from src.symbol_filters import SymbolFilterCache, FilterError
+from src.user_stream import UserDataStream
+
+ORDER_TYPE_STOP_MARKET = "STOP_MARKET"
+UNKNOWN_ORDER_CODE = -2011
+# Minimum seconds between two replacements of one stop; moves in between are coalesced into the next one.
+MIN_AMEND_INTERVAL = 1.0
+# A stop is only moved once the trailed level has improved by this share of the price.
+THRESHOLD_PERCENT = 0.1
+MAX_CONCURRENT_AMENDS = 8
+PRICE_TIMEOUT = 10.0
+# Feed event and STOP_MARKET workingType for each price source.
+PRICE_SOURCES = {
+    'mark': ('markPriceUpdate', 'markPrice@1s', 'MARK_PRICE'),
+    'last': ('aggTrade', 'aggTrade', 'CONTRACT_PRICE'),
+}
+
+
+class TrailingPosition:
+    """One open position's trailing stop: its watermark, the stop on the exchange and the pending target."""
+    __slots__ = ('key', 'symbol', 'side', 'exit_side', 'quantity', 'trail_percent', 'trail_amount',
+                 'threshold_percent', 'activation_price', 'initial_stop', 'take_profit_price', 'active',
+                 'watermark', 'stop_price', 'target', 'stop_client_id', 'tp_client_id', 'stop_ids', 'amends',
+                 'last_amend', 'amending', 'done', 'exit')
+
+    def __init__(self, key, symbol, side, quantity, trail_percent=None, trail_amount=None,
+                 threshold_percent=THRESHOLD_PERCENT, activation_price=None, stop_price=None, take_profit_price=None):
+        if side not in (SIDE_BUY, SIDE_SELL):
+            raise ValueError(f"Side must be 'BUY' or 'SELL', got '{side}'.")
+        if not trail_percent and not trail_amount:
+            raise ValueError(f"{symbol} trailing stop needs trail_percent or trail_amount.")
+        self.key = key
+        self.symbol = symbol.upper()
+        # side is the position's direction; the stop and take-profit trade against it.
+        self.side = side
+        self.exit_side = SIDE_SELL if side == SIDE_BUY else SIDE_BUY
+        self.quantity = quantity
+        self.trail_percent = trail_percent
+        self.trail_amount = trail_amount
+        self.threshold_percent = threshold_percent
+        self.activation_price = activation_price
+        self.initial_stop = stop_price
+        self.take_profit_price = take_profit_price
+        self.active = activation_price is None
+        self.watermark = None
+        self.stop_price = None  # float, as placed on the exchange
+        self.target = None  # latest stop level not yet on the exchange
+        self.stop_client_id = None
+        self.tp_client_id = None
+        self.stop_ids = itertools.count(1)
+        self.amends = 0
+        self.last_amend = 0.0
+        self.amending = False
+        self.done = False
+        self.exit = None
+
+    def trailed_stop(self, watermark):
+        distance = self.trail_amount or watermark * self.trail_percent / 100
+        return watermark - distance if self.side == SIDE_BUY else watermark + distance
+
+    def update(self, price):
+        """Moves the watermark with price. Returns the new stop target if it improved enough to send, else None."""
+        long = self.side == SIDE_BUY
+        if not self.active:
+            if (price < self.activation_price) if long else (price > self.activation_price):
+                return None
+            self.active = True
+            self.watermark = price
+        elif (price <= self.watermark) if long else (price >= self.watermark):
+            return None
+        else:
+            self.watermark = price
+        stop = self.trailed_stop(price)
+        current = self.target if self.target is not None else self.stop_price
+        if current is not None:
+            improvement = stop - current if long else current - stop
+            if improvement < current * self.threshold_percent / 100:
+                return None
+        self.target = stop
+        return stop
+
+    def report(self):
+        return {'symbol': self.symbol, 'side': self.side, 'quantity': self.quantity, 'stop_price': self.stop_price,
+                'watermark': self.watermark, 'amends': self.amends, 'exit': self.exit}
+
+
+class TrailingStopEngine:
+    """Trailing stops, optionally bracketed with a take-profit, for many open positions at once.
+
+    Each position's high (long) or low (short) watermark follows the streamed
+    mark price (or last trade, price_source='last') in-process, and the
+    exchange holds a reduce-only STOP_MARKET triggered on the same price. The
+    stop is only moved once the trailed level has improved by
+    threshold_percent, and at most once per min_interval seconds per position:
+    moves in between are coalesced into the next replacement, which carries
+    the latest level. At most max_concurrency replacements are in flight
+    across all positions, so a fast market costs a bounded number of requests
+    however many positions are tracked; a price tick itself is a few float
+    comparisons per position of that symbol.
+
+    Stop orders cannot be modified in place, so the new stop is placed before
+    the old one is cancelled and a position is never left unprotected. With a
+    take_profit_price the position also gets a reduce-only LIMIT; whichever
+    leg fills cancels the other, as in OcoEngine.
+
+    positions is a list of dicts with the TrailingPosition arguments: symbol,
+    side (of the position), quantity, trail_percent or trail_amount, and
+    optionally threshold_percent, activation_price (trailing starts once the
+    price gets there), stop_price (initial stop, default: trailed from the
+    current price) and take_profit_price.
+    """
+
+    def __init__(self, client, positions, min_interval=MIN_AMEND_INTERVAL, max_concurrency=MAX_CONCURRENT_AMENDS,
+                 price_source='mark'):
+        if price_source not in PRICE_SOURCES:
+            raise ValueError(f"Unknown price_source '{price_source}'. Expected one of: {', '.join(PRICE_SOURCES)}")
+        if not positions:
+            raise ValueError("TrailingStopEngine needs at least one position.")
+        self.client = client
+        self.min_interval = min_interval
+        self.max_concurrency = max_concurrency
+        self.event_type, self.stream_name, self.working_type = PRICE_SOURCES[price_source]
+        self.price_source = price_source
+        self.filters = SymbolFilterCache.for_client(client)
+        self.instance_id = uuid.uuid4().hex[:8]
+        self.positions = [TrailingPosition(i, **spec) for i, spec in enumerate(positions)]
+        self.by_symbol = {}
+        for position in self.positions:
+            self.by_symbol.setdefault(position.symbol, []).append(position)
+        self.by_client_id = {}  # every stop and take-profit client id -> TrailingPosition
+        self.market = None
+        self.store = None
+        self._semaphore = None
+        self._finished = None
+        self._tasks = set()
+
+    @property
+    def symbols(self):
+        return list(self.by_symbol)
+
+    # --- Placement ---
+    def place_position(self, position, price):
+        """Places a position's initial stop (trailed from price unless given) and its take-profit."""
+        position.watermark = price
+        stop = position.initial_stop or position.trailed_stop(price)
+        self._place_stop(position, stop)
+        if position.stop_price is None or position.take_profit_price is None or position.done:
+            return
+        client_id = f"trl-{self.instance_id}-{position.key}-tp"
+        self.by_client_id[client_id] = position
+        try:
+            order = self.client.futures_create_order(**self.filters.prepare_order(dict(
+                symbol=position.symbol,
+                side=position.exit_side,
+                type=ORDER_TYPE_LIMIT,
+                timeInForce=TIME_IN_FORCE_GTC,
+                quantity=position.quantity,
+                price=position.take_profit_price,
+                reduceOnly='true',
+                newClientOrderId=client_id,
+            )))
+        except (BinanceAPIException, BinanceRequestException, FilterError) as e:
+            # The stop still protects the position; it just trails without a take-profit.
+            self.by_client_id.pop(client_id, None)
+            logging.error("Could not place the %s take-profit: %s", position.symbol, getattr(e, 'message', e),
+                          extra={'symbol': position.symbol, 'code': getattr(e, 'code', None)})
+            return
+        position.tp_client_id = client_id
+        logging.info("Take-profit for %s %s placed at %s. Order ID: %s", position.symbol, position.side,
+                     position.take_profit_price, order.get('orderId'),
+                     extra={'symbol': position.symbol, 'order_id': order.get('orderId')})
+
+    def _place_stop(self, position, stop):
+        """Sends a stop at the given level, replacing the current one. Returns the placed order, or None."""
+        long = position.side == SIDE_BUY
+        # Rounded away from the price, so a rounded stop never sits closer than the trail asked for.
+        stop_price = self.filters.get(position.symbol).round_price(stop, rounding=ROUND_DOWN if long else ROUND_UP)
+        if position.stop_price is not None and \
+                ((float(stop_price) <= position.stop_price) if long else (float(stop_price) >= position.stop_price)):
+            return None
+        client_id = f"trl-{self.instance_id}-{position.key}-{next(position.stop_ids)}"
+        self.by_client_id[client_id] = position
+        try:
+            order = self.client.futures_create_order(**self.filters.prepare_order(dict(
+                symbol=position.symbol,
+                side=position.exit_side,
+                type=ORDER_TYPE_STOP_MARKET,
+                quantity=position.quantity,
+                stopPrice=stop_price,
+                reduceOnly='true',
+                workingType=self.working_type,
+                newClientOrderId=client_id,
+            )))
+        except (BinanceAPIException, BinanceRequestException, FilterError) as e:
+            self.by_client_id.pop(client_id, None)
+            logging.error("Could not move the %s stop to %s: %s", position.symbol, stop_price,
+                          getattr(e, 'message', e), extra={'symbol': position.symbol, 'code': getattr(e, 'code', None)})
+            return None
+
+        old_client_id = position.stop_client_id
+        position.stop_client_id, position.stop_price = client_id, float(stop_price)
+        if old_client_id is None:
+            logging.info("Trailing stop for %s %s placed at %s. Order ID: %s", position.symbol, position.side,
+                         stop_price, order.get('orderId'), extra={'symbol': position.symbol, 'order_id': order.get('orderId')})
+            return order
+        position.amends += 1
+        if position.done:
+            # The position closed while this replacement was in flight.
+            self._cancel(position, client_id)
+            return order
+        self._cancel(position, old_client_id)
+        logging.info("Trailing stop for %s %s moved to %s (watermark %s).", position.symbol, position.side,
+                     stop_price, position.watermark, extra={'symbol': position.symbol, 'order_id': order.get('orderId')})
+        return order
+
+    def _cancel(self, position, client_id):
+        try:
+            self.client.futures_cancel_order(symbol=position.symbol, origClientOrderId=client_id)
+        except BinanceAPIException as e:
+            # Already triggered, filled or cancelled; its own event settles the position.
+            if e.code != UNKNOWN_ORDER_CODE:
+                logging.error("API Error canceling %s: %s", client_id, e.message,
+                              extra={'symbol': position.symbol, 'code': e.code})
+
+    # --- Prices ---
+    def on_price(self, event_type, quote):
+        """MarketData listener: moves the watermarks of the quote's symbol and schedules stop amendments."""
+        if event_type != self.event_type:
+            return
+        positions = self.by_symbol.get(quote.symbol)
+        if not positions:
+            return
+        price = quote.mark if self.event_type == 'markPriceUpdate' else quote.last
+        for position in positions:
+            if position.done or position.stop_price is None:
+                continue
+            if position.update(price) is not None and not position.amending:
+                position.amending = True
+                self._spawn(self._amend(position))
+
+    async def _amend(self, position):
+        """Sends the position's latest target, at most once per min_interval, until none is pending."""
+        loop = asyncio.get_running_loop()
+        try:
+            while position.target is not None and not position.done:
+                delay = position.last_amend + self.min_interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                target = position.target
+                async with self._semaphore:
+                    if position.done:
+                        break
+                    await asyncio.to_thread(self._place_stop, position, target)
+                position.last_amend = loop.time()
+                # Anything newer arrived while the request was out and goes in the next round.
+                if position.target == target:
+                    position.target = None
+        finally:
+            position.amending = False
+
+    # --- Fills ---
+    def handle_order_update(self, event):
+        """ORDER_TRADE_UPDATE for any symbol: a filled leg closes its position and cancels the other leg."""
+        o = event['o']
+        position = self.by_client_id.get(o['c'])
+        if position is None or position.done:
+            return
+        status = o['X']
+        if status == 'FILLED':
+            self._close(position, o['c'], 'take-profit' if o['c'] == position.tp_client_id else 'stop')
+        elif status in ('CANCELED', 'EXPIRED') and o['c'] in (position.stop_client_id, position.tp_client_id):
+            # We only ever cancel superseded stops; the live legs were cancelled by someone else.
+            logging.warning("%s leg of the %s trailing position was %s outside the engine; no longer managing it.",
+                            'Take-profit' if o['c'] == position.tp_client_id else 'Stop', position.symbol,
+                            status.lower(), extra={'symbol': position.symbol})
+            position.done = True
+            position.exit = 'cancelled'
+            self._check_finished()
+
+    def _close(self, position, filled_client_id, leg):
+        position.done = True
+        position.exit = leg
+        if leg == 'stop':
+            logging.info("Trailing stop hit for %s %s at %s after %d moves (watermark %s).", position.symbol,
+                         position.side, position.stop_price, position.amends, position.watermark,
+                         extra={'symbol': position.symbol})
+        else:
+            logging.info("Take-profit filled for %s %s at %s.", position.symbol, position.side,
+                         position.take_profit_price, extra={'symbol': position.symbol})
+        leftovers = [client_id for client_id in (position.stop_client_id, position.tp_client_id)
+                     if client_id is not None and client_id != filled_client_id]
+        if leftovers:
+            self._spawn(self._cancel_all(position, leftovers))
+        self._check_finished()
+
+    async def _cancel_all(self, position, client_ids):
+        for client_id in client_ids:
+            await asyncio.to_thread(self._cancel, position, client_id)
+
+    def reconcile(self, store):
+        """After a reconnect: settles positions whose legs filled while events were missed."""
+        for position in self.positions:
+            if position.done:
+                continue
+            for client_id, leg in ((position.stop_client_id, 'stop'), (position.tp_client_id, 'take-profit')):
+                record = store.get(client_order_id=client_id) if client_id is not None else None
+                if record is not None and record.status == 'FILLED':
+                    logging.info("Reconcile found the %s %s leg filled.", position.symbol, leg)
+                    self._close(position, client_id, leg)
+                    break
+
+    def _check_finished(self):
+        if self._finished is not None and all(position.done for position in self.positions):
+            self._finished.set()
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def report(self):
+        return [position.report() for position in self.positions]
+
+    # --- Lifecycle ---
+    async def _start_price(self, symbol):
+        """The feed's current price for symbol, waiting up to PRICE_TIMEOUT before asking REST."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PRICE_TIMEOUT
+        while loop.time() < deadline:
+            quote = self.market.get(symbol)
+            price = quote and (quote.mark if self.event_type == 'markPriceUpdate' else quote.last)
+            if price:
+                return price
+            await asyncio.sleep(0.05)
+        if self.event_type == 'markPriceUpdate':
+            return float((await asyncio.to_thread(self.client.futures_mark_price, symbol=symbol))['markPrice'])
+        return float((await asyncio.to_thread(self.client.futures_symbol_ticker, symbol=symbol))['price'])
+
+    async def _start_position(self, position):
+        price = await self._start_price(position.symbol)
+        async with self._semaphore:
+            await asyncio.to_thread(self.place_position, position, price)
+        if position.stop_price is None and not position.done:
+            position.done = True
+            position.exit = 'failed'
+
+    async def run(self, stream):
+        """Places every position's legs, trails their stops until each position is closed and returns the report.
+
+        Prices come from the stream's MarketData when it carries this engine's
+        price stream for every symbol, else from a feed of the engine's own.
+        """
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._finished = asyncio.Event()
+        self.store = stream.order_store
+        market = getattr(stream, 'market_data', None)
+        market_task = None
+        if market is None or not market.covers(self.symbols, self.stream_name):
+            market = MarketData(stream.stream_url, self.symbols, streams=(self.stream_name,))
+            market_task = asyncio.create_task(market.run())
+        self.market = market
+        stream.on('ORDER_TRADE_UPDATE', self.handle_order_update)
+        stream.on_reconnect(self._on_reconnect)
+        market.on_update(self.on_price)
+        try:
+            await stream.connected.wait()
+            await asyncio.gather(*(self._start_position(position) for position in self.positions))
+            live = sum(1 for position in self.positions if not position.done)
+            logging.info(f"Trailing {live} of {len(self.positions)} positions on the {self.price_source} price.")
+            self._check_finished()
+            await self._finished.wait()
+        finally:
+            market.off_update(self.on_price)
+            stream.off('ORDER_TRADE_UPDATE', self.handle_order_update)
+            stream.off_reconnect(self._on_reconnect)
+            for task in list(self._tasks):
+                task.cancel()
+            if market_task is not None:
+                await market.stop()
+                market_task.cancel()
+                await asyncio.gather(market_task, return_exceptions=True)
+        return self.report()
+
+    async def _on_reconnect(self):
+        if self.store is not None:
+            self.reconcile(self.store)
+
+
+def run_stream_trailing(bot, positions, **options):
+    """Runs a TrailingStopEngine on the bot's user-data stream until every position is closed."""
+    engine = TrailingStopEngine(bot.client, positions, **options)
+    stream = UserDataStream(bot.client, bot.stream_url)
+    store = OrderStore(bot.client)
+    store.attach(stream)
+
+    async def main():
+        stream_task = asyncio.create_task(stream.run())
+        store_task = asyncio.create_task(store.run(stream))
+        try:
+            return await engine.run(stream)
+        finally:
+            await stream.stop()
+            stream_task.cancel()
+            store_task.cancel()
+
+    return asyncio.run(main())
@@ -0,0 +1,65 @@
+
+import sys
+import os
+import logging
+from binance.enums import *
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.bot_client import BasicBot
+from src.bot_logging import setup_logging
+from src.advanced.trailing_engine import run_stream_trailing, THRESHOLD_PERCENT
+
+setup_logging()
+
+api_key = os.getenv("BINANCE_API_KEY")
+api_secret = os.getenv("BINANCE_API_SECRET")
+
+if not api_key or not api_secret:
+    logging.error("BINANCE_API_KEY and BINANCE_API_SECRET environment variables must be set.")
+    sys.exit(1)
+
+# --- CLI Args ---
+# side is the side of the open position: BUY protects a long, SELL a short.
+if len(sys.argv) < 5:
+    logging.info("Usage: python advanced/trailing_stop.py <symbol> <side> <quantity> <trail_percent> "
+                 "[take_profit_price] [threshold_percent]")
+    sys.exit(1)
+
+symbol = sys.argv[1].upper()
+side_str = sys.argv[2].upper()
+try:
+    quantity = float(sys.argv[3])
+    trail_percent = float(sys.argv[4])
+    take_profit_price = float(sys.argv[5]) if len(sys.argv) > 5 and sys.argv[5] != '-' else None
+    threshold_percent = float(sys.argv[6]) if len(sys.argv) > 6 else THRESHOLD_PERCENT
+except ValueError:
+    logging.error("Error: Quantity, Trail Percent, Take Profit Price and Threshold Percent must be numbers.")
+    sys.exit(1)
+
+if side_str not in (SIDE_BUY, SIDE_SELL):
+    logging.error("Error: Side must be 'BUY' or 'SELL'.")
+    sys.exit(1)
+
+if not 0 < trail_percent < 100:
+    logging.error("Error: Trail Percent must be between 0 and 100.")
+    sys.exit(1)
+
+try:
+    bot = BasicBot(api_key, api_secret, testnet=True)
+except Exception as e:
+    logging.error(f"Failed to initialize Binance client: {e}")
+    sys.exit(1)
+
+try:
+    position = {'symbol': symbol, 'side': side_str, 'quantity': quantity, 'trail_percent': trail_percent,
+                'threshold_percent': threshold_percent, 'take_profit_price': take_profit_price}
+    for result in run_stream_trailing(bot, [position]):
+        logging.info(f"Trailing position closed: {result}")
+
+except BinanceAPIException as e:
+    logging.error(f"Binance API Error (Code {e.code}): {e.message}")
+except BinanceRequestException as e:
+    logging.error(f"Binance Request Error: {e.message}")
+except Exception as e:
+    logging.error(f"An unexpected error occurred: {e}")
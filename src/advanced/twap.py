@@ -3,21 +3,16 @@
 import sys
 import os
 import logging
-import time
+import asyncio
 from binance.enums import *
 from binance.exceptions import BinanceAPIException, BinanceRequestException
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 from src.bot_client import BasicBot
+from src.bot_logging import setup_logging
+from src.advanced.twap_engine import TwapEngine, NUMBER_OF_SUB_ORDERS
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),
-        logging.StreamHandler()
-    ]
-)
+setup_logging()
 
 api_key = os.getenv("BINANCE_API_KEY")
 api_secret = os.getenv("BINANCE_API_SECRET")
@@ -26,8 +21,14 @@ if not api_key or not api_secret:
     logging.error("BINANCE_API_KEY and BINANCE_API_SECRET environment variables must be set.")
     sys.exit(1)
 
+# --vwap: size slices from the historical volume profile instead of equally
+use_vwap = '--vwap' in sys.argv
+# --smart: route each slice across the live depth book as IOC limit children instead of one MARKET order
+use_smart = '--smart' in sys.argv
+sys.argv = [arg for arg in sys.argv if arg not in ('--vwap', '--smart')]
+
 if len(sys.argv) < 5:
-    logging.info("Usage: python advanced/twap_orders.py <symbol> <side> <total_quantity> <duration_minutes>")
+    logging.info("Usage: python advanced/twap_orders.py <symbol> <side> <total_quantity> <duration_minutes> [slices] [--vwap] [--smart]")
     sys.exit(1)
 
 symbol = sys.argv[1].upper()
@@ -35,8 +36,9 @@ side_str = sys.argv[2].upper()
 try:
     total_quantity = float(sys.argv[3])
     duration_minutes = float(sys.argv[4])
+    slices = int(sys.argv[5]) if len(sys.argv) > 5 else NUMBER_OF_SUB_ORDERS
 except ValueError:
-    logging.error("Error: Total quantity and duration must be numbers.")
+    logging.error("Error: Total quantity, duration and slices must be numbers.")
     sys.exit(1)
 
 if side_str == 'BUY':
@@ -48,10 +50,6 @@ else:
     sys.exit(1)
 
 
-NUMBER_OF_SUB_ORDERS = 10
-delay_seconds = (duration_minutes * 60) / NUMBER_OF_SUB_ORDERS
-sub_order_quantity = total_quantity / NUMBER_OF_SUB_ORDERS
-
 try:
     bot = BasicBot(api_key, api_secret, testnet=True)
     client = bot.client
@@ -60,29 +58,10 @@ except Exception as e:
     sys.exit(1)
 
 try:
-    logging.info(f"Starting TWAP order for {total_quantity} {symbol} over {duration_minutes} minutes.")
-    logging.info(f"Splitting into {NUMBER_OF_SUB_ORDERS} orders of {sub_order_quantity} each, with a delay of {delay_seconds:.2f} seconds.")
-
-    for i in range(NUMBER_OF_SUB_ORDERS):
-        logging.info(f"Placing sub-order {i+1}/{NUMBER_OF_SUB_ORDERS}")
-        
-        order = client.futures_create_order(
-            symbol=symbol,
-            side=side,
-            type=ORDER_TYPE_MARKET,
-            quantity=sub_order_quantity
-        )
-        
-        logging.info("Sub-order placed successfully! ")
-        logging.info(f"  - Order ID: {order.get('orderId')}")
-        logging.info(f"  - Status: {order.get('status')}")
-        logging.info(f"  - Executed Quantity: {order.get('executedQty')}")
-        
-        if i < NUMBER_OF_SUB_ORDERS - 1:
-            logging.info(f"Waiting for {delay_seconds:.2f} seconds before next order-")
-            time.sleep(delay_seconds)
-
-    logging.info("TWAP order strategy completed. All sub-orders have been placed.")
+    engine = TwapEngine(client, symbol, side, total_quantity, duration_minutes, slices,
+                        mode='vwap' if use_vwap else 'twap', market_stream_url=bot.stream_url,
+                        execution='smart' if use_smart else 'market')
+    asyncio.run(engine.run())
 
 except BinanceAPIException as e:
     logging.error(f"Binance API Error (Code {e.code}): {e.message}")
@@ -0,0 +1,348 @@
+# advanced/twap_engine.py
+
+import asyncio
+import json
+import logging
+import math
+import time
+from decimal import Decimal
+
+import requests
+import websockets
+from binance.enums import *
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+from src.depth_book import DepthBook
+from src.order_router import SmartOrderRouter
+from src.symbol_filters import FilterError, SymbolFilterCache
+
+NUMBER_OF_SUB_ORDERS = 10
+VWAP_LOOKBACK_DAYS = 5
+DAY_MS = 24 * 60 * 60 * 1000
+MAX_KLINES = 1500
+
+
+def profile_weights(per_minute, duration_seconds, slices):
+    """Spreads a per-minute volume profile over equal-length slices. Returns weights summing to 1."""
+    slice_seconds = duration_seconds / slices
+    weights = []
+    for i in range(slices):
+        begin, end = i * slice_seconds, (i + 1) * slice_seconds
+        volume = 0.0
+        minute = int(begin // 60)
+        while minute * 60 < end and minute < len(per_minute):
+            overlap = min(end, (minute + 1) * 60) - max(begin, minute * 60)
+            volume += per_minute[minute] * overlap / 60
+            minute += 1
+        weights.append(volume)
+
+    total = sum(weights)
+    if total <= 0:
+        return [1 / slices] * slices
+    return [weight / total for weight in weights]
+
+
+def vwap_weights(client, symbol, duration_seconds, slices, days=VWAP_LOOKBACK_DAYS, now_ms=None):
+    """Slice weights from the 1m volume traded in the same time-of-day window on the previous days."""
+    minutes = min(MAX_KLINES, max(1, math.ceil(duration_seconds / 60)))
+    now_ms = now_ms or int(time.time() * 1000)
+    per_minute = [0.0] * minutes
+    for day in range(1, days + 1):
+        start = now_ms - day * DAY_MS
+        for kline in client.futures_klines(symbol=symbol, interval='1m', startTime=start, limit=minutes):
+            index = (kline[0] - start) // 60000
+            if 0 <= index < minutes:
+                per_minute[index] += float(kline[5])
+    return profile_weights(per_minute, duration_seconds, slices)
+
+
+class MarketVolume:
+    """Running traded volume and VWAP of one symbol from its <symbol>@aggTrade market stream."""
+
+    def __init__(self, stream_url, symbol, reconnect_delay=1.0):
+        self.url = f"{stream_url}/ws/{symbol.lower()}@aggTrade"
+        self.reconnect_delay = reconnect_delay
+        self.volume = 0.0
+        self.notional = 0.0
+
+    @property
+    def vwap(self):
+        return self.notional / self.volume if self.volume else None
+
+    async def run(self):
+        while True:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    async for message in ws:
+                        trade = json.loads(message)
+                        qty = float(trade['q'])
+                        self.volume += qty
+                        self.notional += qty * float(trade['p'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.warning(f"Market volume stream error: {e}. Reconnecting in {self.reconnect_delay:.0f}s.")
+                await asyncio.sleep(self.reconnect_delay)
+
+
+class TwapEngine:
+    """Executes a parent order as MARKET slices on a drift-free schedule.
+
+    mode='twap' sizes the slices equally; mode='vwap' sizes them from the volume
+    traded in the same window on previous days, read from REST klines at the
+    start. The live aggTrade stream only covers the run itself, so it cannot
+    predict how volume will be spread over the window; it feeds the
+    participation rate and cap instead. Slice i is due at start + i *
+    delay_seconds on the monotonic clock, so slow order calls never push the
+    schedule back, and each slice is sent from a worker thread while the
+    scheduler times the next one.
+
+    With a market stream URL (the user-data stream's host when run with a
+    stream) live aggTrade volume gives the participation rate, and
+    max_participation caps each slice to that share of market volume so far;
+    the last slice always sends whatever is left. Whatever failed slices
+    (API errors, risk refusals) left unsent goes out once more in a catch-up
+    slice after the last one; the report's unfilled is what never executed,
+    and the run is logged as partially filled when it is not zero. A stream with shared market
+    data covering the symbol supplies both the volume and the arrival price
+    instead of a socket and a REST call of the engine's own.
+
+    execution='smart' sends each slice through a SmartOrderRouter over a local
+    depth book instead of as one MARKET order; what a slice leaves unfilled
+    goes back into the schedule, and the last slice finishes with MARKET.
+    """
+
+    def __init__(self, client, symbol, side, total_quantity, duration_minutes, slices=NUMBER_OF_SUB_ORDERS,
+                 mode='twap', max_participation=None, market_stream_url=None, execution='market'):
+        if mode not in ('twap', 'vwap'):
+            raise ValueError(f"Unknown mode '{mode}'. Expected 'twap' or 'vwap'.")
+        if execution not in ('market', 'smart'):
+            raise ValueError(f"Unknown execution '{execution}'. Expected 'market' or 'smart'.")
+        self.client = client
+        self.symbol = symbol
+        self.side = side
+        self.total_quantity = Decimal(str(total_quantity))
+        self.duration_minutes = duration_minutes
+        self.slices = slices
+        self.mode = mode
+        self.max_participation = max_participation
+        self.market_stream_url = market_stream_url
+        self.execution = execution
+        self.router = None
+        self.delay_seconds = (duration_minutes * 60) / slices
+        self.filters = SymbolFilterCache.for_client(client)
+        self.orders = []
+
+        self.symbol_filters = None
+        self.arrival_price = None
+        self.market = None
+        self.market_data = None
+        self.weights = None
+        self.submitted = Decimal(0)
+        self.executed = Decimal(0)
+        self.executed_quote = Decimal(0)
+        self.max_lag = 0.0
+
+    def place_slice(self, i, quantity):
+        """Places sub-order i as a MARKET order."""
+        order = self.client.futures_create_order(
+            symbol=self.symbol,
+            side=self.side,
+            type=ORDER_TYPE_MARKET,
+            quantity=str(quantity),
+            newOrderRespType='RESULT'
+        )
+        self.orders.append(order)
+
+        logging.info("Sub-order %d/%d placed. Order ID: %s, status %s, executed %s", i + 1, self.slices,
+                     order.get('orderId'), order.get('status'), order.get('executedQty'),
+                     extra={'symbol': self.symbol, 'order_id': order.get('orderId')})
+        return order
+
+    def prepare(self, now_ms=None):
+        """Loads the symbol filters, the arrival price and, for VWAP, the volume profile.
+
+        now_ms (default: the wall clock) anchors the VWAP lookback window.
+        """
+        self.symbol_filters = self.filters.get(self.symbol)
+        price = self.market_data.price(self.symbol) if self.market_data is not None else None
+        if price is None:
+            price = self.client.futures_symbol_ticker(symbol=self.symbol)['price']
+        self.arrival_price = Decimal(str(price))
+        if self.mode == 'vwap':
+            self.weights = vwap_weights(self.client, self.symbol, self.duration_minutes * 60, self.slices,
+                                        now_ms=now_ms)
+        else:
+            self.weights = [1 / self.slices] * self.slices
+
+    def slice_quantity(self, i):
+        """Quantity for slice i: the schedule's cumulative target minus what was already sent."""
+        if i == self.slices - 1:
+            target = self.total_quantity
+        else:
+            target = self.total_quantity * Decimal(str(sum(self.weights[:i + 1])))
+            if self.max_participation and self.market is not None:
+                allowed = Decimal(str(self.max_participation * self.market.volume))
+                target = min(target, allowed)
+        quantity = self.symbol_filters.round_quantity(target - self.submitted, market=True)
+        # Slices below the minimum size or notional are carried over to the next one.
+        if quantity < self.symbol_filters.market_min_qty or \
+                not self.symbol_filters.meets_min_notional(quantity, self.arrival_price):
+            return Decimal(0)
+        return min(quantity, self.symbol_filters.market_max_qty or quantity)
+
+    async def run(self, stream=None):
+        """Sends every slice on schedule and waits for the last one to complete."""
+        logging.info(f"Starting {self.mode.upper()} order for {self.total_quantity} {self.symbol} over {self.duration_minutes} minutes.")
+        logging.info(f"Splitting into {self.slices} orders with a delay of {self.delay_seconds:.2f} seconds.")
+        market_data = getattr(stream, 'market_data', None)
+        if market_data is not None and market_data.get(self.symbol) is not None:
+            self.market_data = market_data
+        await asyncio.to_thread(self.prepare)
+        logging.info(f"Arrival price: {self.arrival_price}")
+
+        market_stream_url = self.market_stream_url or getattr(stream, 'stream_url', None)
+        depth_book = depth_task = None
+        if self.execution == 'smart':
+            if not market_stream_url:
+                raise ValueError("execution='smart' needs a market stream URL for the depth book.")
+            depth_book = DepthBook(self.client, market_stream_url, self.symbol)
+            depth_task = asyncio.create_task(depth_book.run())
+            self.router = SmartOrderRouter(self.client, depth_book)
+        market_task = None
+        if self.market_data is not None:
+            self.market = self.market_data.volume_window(self.symbol)
+        elif market_stream_url:
+            self.market = MarketVolume(market_stream_url, self.symbol)
+            market_task = asyncio.create_task(self.market.run())
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        pending = set()
+        try:
+            for i in range(self.slices):
+                due = start + i * self.delay_seconds
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                self.max_lag = max(self.max_lag, loop.time() - due)
+
+                quantity = self.slice_quantity(i)
+                if quantity <= 0:
+                    logging.info("Sub-order %d/%d skipped: nothing tradable due yet.", i + 1, self.slices)
+                    continue
+                self.submitted += quantity
+                task = asyncio.create_task(self._send_slice(i, quantity))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+
+            await asyncio.gather(*pending)
+            await self._catch_up()
+        finally:
+            for task in pending:
+                task.cancel()
+            if market_task is not None:
+                market_task.cancel()
+                await asyncio.gather(market_task, return_exceptions=True)
+            if depth_task is not None:
+                await depth_book.stop()
+                depth_task.cancel()
+                await asyncio.gather(depth_task, return_exceptions=True)
+
+        report = self.report()
+        outcome = "completed" if not self.unfilled else f"partially filled, {report['unfilled']} unfilled"
+        logging.info(f"{self.mode.upper()} order strategy {outcome}. Executed {report['executed']} of "
+                     f"{self.total_quantity} at avg {report['avg_price']}, slippage {report['slippage_bps']} bps "
+                     f"vs arrival, max schedule lag {self.max_lag * 1000:.1f} ms.")
+        return report
+
+    async def _catch_up(self):
+        """Sends what failed slices left unsent once more, since no later slice is left to pick it up."""
+        quantity = self.symbol_filters.round_quantity(self.total_quantity - self.submitted, market=True)
+        if quantity < self.symbol_filters.market_min_qty or \
+                not self.symbol_filters.meets_min_notional(quantity, self.arrival_price):
+            return
+        quantity = min(quantity, self.symbol_filters.market_max_qty or quantity)
+        logging.info("Catch-up slice for %s left unsent by failed sub-orders.", quantity, extra={'symbol': self.symbol})
+        self.submitted += quantity
+        await self._send_slice(self.slices - 1, quantity)
+
+    async def _send_slice(self, i, quantity):
+        if self.router is not None:
+            await self._route_slice(i, quantity)
+            return
+        try:
+            order = await asyncio.to_thread(self.place_slice, i, quantity)
+        except (BinanceAPIException, BinanceRequestException, FilterError, requests.RequestException) as e:
+            # Unsent quantity (a refusal by the filters or the risk gate included) stays in the
+            # schedule's target for later slices, or the catch-up slice after the last one.
+            self.submitted -= quantity
+            logging.error("Sub-order %d/%d failed: %s", i + 1, self.slices, getattr(e, 'message', e),
+                          extra={'symbol': self.symbol, 'code': getattr(e, 'code', None)})
+            return
+        self.record_fill(order)
+
+    async def _route_slice(self, i, quantity):
+        try:
+            report = await self.router.execute(self.side, quantity, finish_market=i == self.slices - 1)
+        except (ValueError, asyncio.TimeoutError) as e:
+            self.submitted -= quantity
+            logging.error("Sub-order %d/%d not routed: %s", i + 1, self.slices, e or "depth book not synced",
+                          extra={'symbol': self.symbol})
+            return
+        self.orders.append(report)
+        # What the children left unfilled goes back into the schedule.
+        self.submitted -= quantity - Decimal(report['executed'])
+        logging.info("Sub-order %d/%d routed in %d children, executed %s of %s, slippage %s bps vs mid",
+                     i + 1, self.slices, len(report['children']), report['executed'], quantity,
+                     report['slippage_bps'], extra={'symbol': self.symbol})
+        self.record_fill({'executedQty': report['executed'], 'avgPrice': report['avg_price']})
+
+    def record_fill(self, order):
+        """Adds a placed slice's execution to the running totals and logs progress."""
+        executed = Decimal(order.get('executedQty') or '0')
+        if executed:
+            self.executed += executed
+            self.executed_quote += executed * Decimal(order.get('avgPrice') or '0')
+        participation = self.participation_rate
+        if participation is None:
+            logging.info("  - Progress: %s/%s, slippage %s bps", self.executed, self.total_quantity, self.slippage_bps)
+        else:
+            logging.info("  - Progress: %s/%s, slippage %s bps, participation %.2f%%", self.executed,
+                         self.total_quantity, self.slippage_bps, participation * 100)
+
+    @property
+    def unfilled(self):
+        return max(self.total_quantity - self.executed, Decimal(0))
+
+    @property
+    def avg_price(self):
+        return self.executed_quote / self.executed if self.executed else None
+
+    @property
+    def slippage_bps(self):
+        """Average fill price against the arrival price, in basis points; positive means worse."""
+        if not self.executed or not self.arrival_price:
+            return None
+        slippage = (self.avg_price - self.arrival_price) / self.arrival_price * 10000
+        return round(float(slippage if self.side == SIDE_BUY else -slippage), 2)
+
+    @property
+    def participation_rate(self):
+        """Our executed quantity as a share of market volume since the start."""
+        if self.market is None or not self.market.volume:
+            return None
+        return float(self.executed) / self.market.volume
+
+    def report(self):
+        return {
+            'symbol': self.symbol,
+            'side': self.side,
+            'mode': self.mode,
+            'executed': str(self.executed),
+            'unfilled': str(self.unfilled),
+            'avg_price': str(self.avg_price) if self.avg_price is not None else None,
+            'arrival_price': str(self.arrival_price),
+            'slippage_bps': self.slippage_bps,
+            'participation_rate': self.participation_rate,
+            'market_vwap': self.market.vwap if self.market is not None else None,
+            'max_schedule_lag': self.max_lag,
+        }
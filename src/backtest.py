@@ -0,0 +1,656 @@
+# src/backtest.py
+#
+# Offline backtester: replays historical trades through the same strategy
+# engines that trade live (grid, OCO, TWAP, stop-limit), against the
+# ExchangeSimulator's matching engine running on the tape's clock.
+#
+# Usage:
+#   python src/backtest.py import <tape_dir> <csv> [<csv> ...] [--klines]
+#   python src/backtest.py run <strategy> <tape_dir> --symbol BTCUSDT \
+#       --set lower=55000 upper=65000 grids=10 quantity=0.01
+#   python src/backtest.py sweep <strategy> <tape_dir> --symbol BTCUSDT \
+#       --set lower=55000 upper=65000 quantity=0.01 --vary grids=10,20,40 [--processes 8]
+#
+# A tape is a directory of three .npy columns, memory-mapped on load: time
+# (epoch ms, int64), price and qty (float64). `import` builds one from the
+# aggTrades (or, with --klines, klines) CSV files published on
+# data.binance.vision. A Parquet file with the same columns can be used instead
+# when pyarrow is installed.
+#
+# Only trades that can change something go through the matching engine: NumPy
+# finds the next trade at or through a resting order or stop price, and the
+# trades in between only move the mark-to-market equity. A month of BTCUSDT
+# trades replays in seconds.
+#
+# Fill model: a resting order fills at its own price when a trade prints at or
+# through it, up to that trade's size. MARKET orders and triggered stops fill
+# at the last trade price. Fills pay maker_fee or taker_fee on their notional.
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from binance.enums import *
+from binance.exceptions import BinanceAPIException
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.advanced.grid_engine import GridEngine
+from src.advanced.oco_engine import OcoEngine, ORDER_TYPE_STOP_MARKET
+from src.advanced.twap_engine import TwapEngine, NUMBER_OF_SUB_ORDERS
+from src.bot_logging import setup_logging
+from src.exchange_sim import DEFAULT_SYMBOLS, KLINE_MINUTES, OPEN_STATUSES, ExchangeSimulator, SimError
+from src.symbol_filters import SymbolFilterCache
+
+COLUMNS = ('time', 'price', 'qty')
+# Binance USD-M futures base tier.
+MAKER_FEE = 0.0002
+TAKER_FEE = 0.0005
+# Trades compared per NumPy call when looking for the next order-triggering trade; doubles up to the max.
+SCAN_CHUNK = 1 << 16
+MAX_SCAN_CHUNK = 1 << 22
+ORDER_TYPE_STOP = "STOP"
+
+
+# --- Trade tapes ---
+class TradeTape:
+    """One symbol's trades in time order, as time (epoch ms), price and qty arrays."""
+
+    def __init__(self, time_ms, price, qty):
+        self.time = time_ms
+        self.price = price
+        self.qty = qty
+
+    def __len__(self):
+        return len(self.price)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-maps a tape directory of .npy columns, or reads a .parquet file (needs pyarrow)."""
+        if path.endswith('.parquet'):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise RuntimeError("Reading Parquet tapes requires pyarrow (pip install pyarrow).")
+            table = pq.read_table(path, columns=list(COLUMNS))
+            return cls(np.ascontiguousarray(table.column('time').to_numpy(), dtype=np.int64),
+                       np.ascontiguousarray(table.column('price').to_numpy(), dtype=np.float64),
+                       np.ascontiguousarray(table.column('qty').to_numpy(), dtype=np.float64))
+        return cls(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in COLUMNS))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in COLUMNS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    def window(self, start_ms=None, end_ms=None):
+        """The trades in [start_ms, end_ms), sharing this tape's memory."""
+        first = 0 if start_ms is None else int(np.searchsorted(self.time, start_ms, 'left'))
+        last = len(self) if end_ms is None else int(np.searchsorted(self.time, end_ms, 'left'))
+        return TradeTape(self.time[first:last], self.price[first:last], self.qty[first:last])
+
+
+def read_csv(path, klines=False):
+    """Reads one data.binance.vision aggTrades CSV file (or klines CSV file) into a TradeTape.
+
+    Each kline becomes four trades spread over its interval: open, then low
+    and high (high first on a down candle), then close, each with a quarter
+    of the volume.
+    """
+    with open(path) as f:
+        header = 0 if f.readline()[:1].isdigit() else 1
+    if klines:
+        rows = np.loadtxt(path, delimiter=',', skiprows=header, usecols=(0, 1, 2, 3, 4, 5, 6), ndmin=2)
+        open_time, open_, high, low, close, volume, close_time = rows.T
+        rising = close >= open_
+        price = np.stack([open_, np.where(rising, low, high), np.where(rising, high, low), close], axis=1).ravel()
+        times = (open_time[:, None] + (close_time - open_time)[:, None] * np.array([0, 1 / 3, 2 / 3, 1])).ravel()
+        qty = np.repeat(volume / 4, 4)
+    else:
+        rows = np.loadtxt(path, delimiter=',', skiprows=header, usecols=(1, 2, 5), ndmin=2)
+        price, qty, times = rows.T
+    times = times.astype(np.int64)
+    if len(times) and times[0] > 10 ** 14:
+        # Newer files stamp microseconds.
+        times //= 1000
+    return TradeTape(times, np.ascontiguousarray(price), np.ascontiguousarray(qty))
+
+
+def import_csv(paths, out, klines=False):
+    """Converts CSV files (e.g. one per day) into one tape directory. Returns the number of trades."""
+    tapes = [read_csv(path, klines) for path in paths]
+    times = np.concatenate([tape.time for tape in tapes])
+    order = np.argsort(times, kind='stable')
+    TradeTape(times[order], np.concatenate([tape.price for tape in tapes])[order],
+              np.concatenate([tape.qty for tape in tapes])[order]).save(out)
+    return len(order)
+
+
+# --- Replay ---
+class _EventQueue:
+    """Collects the simulator's user-data events where a socket's asyncio.Queue would."""
+
+    def __init__(self):
+        self.messages = deque()
+
+    def put_nowait(self, message):
+        self.messages.append(message)
+
+
+class Backtest:
+    """Replays a TradeTape through an in-process ExchangeSimulator running on the tape's clock.
+
+    Strategies trade through `client` and get ORDER_TRADE_UPDATE events from
+    handlers added with on_order_update(), right after the call or trade that
+    caused them, as the user-data stream would deliver them. Equity (realized
+    and unrealized PnL less fees) is marked at every trade for the drawdown.
+    """
+
+    def __init__(self, tape, symbol, tick_size=None, step_size=None, min_notional=None,
+                 maker_fee=MAKER_FEE, taker_fee=TAKER_FEE):
+        if not len(tape):
+            raise ValueError("The tape holds no trades in the selected window.")
+        spec = dict(DEFAULT_SYMBOLS.get(symbol, {}))
+        for key, value in (('tick_size', tick_size), ('step_size', step_size), ('min_notional', min_notional)):
+            if value is not None:
+                spec[key] = str(value)
+        spec['price'] = str(float(tape.price[0]))
+
+        self.tape = tape
+        self.symbol = symbol
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.cursor = 0  # index of the next trade to replay
+        self.now = int(tape.time[0])
+        self.sim = ExchangeSimulator(symbols={symbol: spec}, clock=lambda: self.now)
+        self.account = self.sim.account('backtest')
+        self.events = _EventQueue()
+        self.account.subscribers.add(self.events)
+        self.handlers = []
+        self.client = BacktestClient(self)
+        self._dispatching = False
+
+        self.matched = 0  # trades sent through the matching engine
+        self.fills = 0
+        self.maker_fills = 0
+        self.volume = 0.0
+        self.fees = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        self._base = 0.0  # equity = _base + _amount * price until the position changes
+        self._amount = 0.0
+
+    def on_order_update(self, handler):
+        self.handlers.append(handler)
+
+    def run(self, until_ms=None, stop=None):
+        """Replays trades stamped before until_ms (default: to the end of the tape).
+
+        stop() is checked before each order-triggering trade; the replay returns as soon as it is true.
+        """
+        times, prices, quantities = self.tape.time, self.tape.price, self.tape.qty
+        end = len(self.tape) if until_ms is None else int(np.searchsorted(times, until_ms, 'left'))
+        while self.cursor < end:
+            if stop is not None and stop():
+                return
+            low, high = self._triggers()
+            index = self._scan(self.cursor, end, low, high)
+            if index == end:
+                # Nothing left to trigger; the last trade still sets the price market orders fill at.
+                index = end - 1
+            self.now = int(times[index])
+            self.sim.trade(self.symbol, float(prices[index]), float(quantities[index]))
+            self.matched += 1
+            self.cursor = index + 1
+            self._dispatch()
+            self._mark(prices[index:index + 1])
+        if until_ms is not None:
+            self.now = max(self.now, int(until_ms))
+
+    def _triggers(self):
+        """(low, high): a trade at or below low, or at or above high, can fill an order or fire a stop."""
+        book = self.sim.books[self.symbol]
+        bid, ask = book.best('BUY'), book.best('SELL')
+        low = float(bid) if bid is not None else -math.inf
+        high = float(ask) if ask is not None else math.inf
+        for order in self.sim.stops[self.symbol]:
+            if order.status not in OPEN_STATUSES:
+                continue
+            rising = order.side == SIDE_BUY if order.type in (ORDER_TYPE_STOP, ORDER_TYPE_STOP_MARKET) \
+                else order.side == SIDE_SELL
+            if rising:
+                high = min(high, float(order.stop_price))
+            else:
+                low = max(low, float(order.stop_price))
+        return low, high
+
+    def _scan(self, start, end, low, high):
+        """Index of the first trade in [start, end) at or through low/high, or end. Marks the trades before it."""
+        prices = self.tape.price
+        if low == -math.inf and high == math.inf and not self._amount:
+            self._mark(prices[start:end])
+            return end
+        size = SCAN_CHUNK
+        while start < end:
+            stop = min(end, start + size)
+            chunk = prices[start:stop]
+            hits = (chunk <= low) | (chunk >= high)
+            first = int(hits.argmax())
+            if hits[first]:
+                self._mark(chunk[:first])
+                return start + first
+            self._mark(chunk)
+            start = stop
+            size = min(size * 2, MAX_SCAN_CHUNK)
+        return end
+
+    def _mark(self, prices):
+        if not self._amount:
+            self.peak = max(self.peak, self._base)
+            self.max_drawdown = max(self.max_drawdown, self.peak - self._base)
+            return
+        if not len(prices):
+            return
+        equity = self._base + self._amount * prices
+        running = np.maximum.accumulate(equity)
+        np.maximum(running, self.peak, out=running)
+        self.max_drawdown = max(self.max_drawdown, float((running - equity).max()))
+        self.peak = float(running[-1])
+
+    def _dispatch(self):
+        """Delivers queued user-data events. Events raised by the handlers' own orders join the queue."""
+        if self._dispatching:
+            return
+        self._dispatching = True
+        try:
+            messages = self.events.messages
+            while messages:
+                event = json.loads(messages.popleft())
+                if event['e'] != 'ORDER_TRADE_UPDATE':
+                    continue
+                order = event['o']
+                if order['x'] == 'TRADE':
+                    notional = float(order['L']) * float(order['l'])
+                    self.fills += 1
+                    self.maker_fills += order['m']
+                    self.volume += notional
+                    self.fees += notional * (self.maker_fee if order['m'] else self.taker_fee)
+                for handler in self.handlers:
+                    try:
+                        handler(event)
+                    except Exception as e:
+                        logging.error(f"Error in ORDER_TRADE_UPDATE handler: {e}")
+        finally:
+            self._dispatching = False
+        amount, entry, realized = self.account.positions.get(self.symbol, (0, 0, 0))
+        self._amount = float(amount)
+        self._base = float(realized) - self.fees - float(amount * entry)
+
+    def klines(self, interval='1m', start_time=None, end_time=None, limit=500):
+        """Candles built from the trades replayed so far, in the futures klines row format."""
+        if interval not in KLINE_MINUTES:
+            raise SimError(-1120, "Invalid interval.")
+        step = KLINE_MINUTES[interval] * 60000
+        limit = min(int(limit), 1500)
+        end = self.now if end_time is None else min(int(end_time), self.now)
+        if start_time is not None:
+            first = -(-int(start_time) // step) * step
+        else:
+            first = (end // step - limit + 1) * step
+        edges = np.arange(first, first + (limit + 1) * step, step, dtype=np.int64)
+        edges = edges[edges <= end + step]
+        # Only trades already replayed, so a strategy never sees the future.
+        bounds = np.minimum(np.searchsorted(self.tape.time, edges, 'left'), self.cursor)
+        candles = []
+        for open_time, a, b in zip(edges[:-1].tolist(), bounds[:-1].tolist(), bounds[1:].tolist()):
+            if a == b:
+                continue
+            prices, quantities = self.tape.price[a:b], self.tape.qty[a:b]
+            candles.append([open_time, str(float(prices[0])), str(float(prices.max())), str(float(prices.min())),
+                            str(float(prices[-1])), str(float(quantities.sum())), open_time + step - 1,
+                            str(float(np.dot(prices, quantities))), b - a, '0', '0', '0'])
+        return candles
+
+    def report(self):
+        amount, entry, realized = self.account.positions.get(self.symbol, (0, 0, 0))
+        unrealized = float(amount) * (float(self.sim.last_prices[self.symbol]) - float(entry))
+        return {
+            'symbol': self.symbol,
+            'start': int(self.tape.time[0]),
+            'end': self.now,
+            'trades': self.cursor,
+            'matched_trades': self.matched,
+            'fills': self.fills,
+            'maker_fills': self.maker_fills,
+            'volume': round(self.volume, 2),
+            'fees': round(self.fees, 4),
+            'realized_pnl': round(float(realized), 4),
+            'unrealized_pnl': round(unrealized, 4),
+            'net_pnl': round(float(realized) + unrealized - self.fees, 4),
+            'max_drawdown': round(self.max_drawdown, 4),
+            'position': float(amount),
+        }
+
+
+class BacktestClient:
+    """The part of python-binance's Client the strategy engines use, served by a Backtest's simulator.
+
+    Simulator errors are raised as BinanceAPIException with the same codes the exchange returns.
+    """
+
+    testnet = False
+    FUTURES_URL = 'backtest'
+
+    def __init__(self, backtest):
+        self.backtest = backtest
+        self.sim = backtest.sim
+        self.account = backtest.account
+        self.timestamp_offset = 0
+        # Filters come from the simulated exchangeInfo; nothing is cached on disk.
+        self.symbol_filters = SymbolFilterCache(self, path=None)
+
+    def _call(self, fn):
+        try:
+            return fn()
+        except SimError as e:
+            raise BinanceAPIException(None, e.status, json.dumps({'code': e.code, 'msg': e.msg}))
+        finally:
+            self.backtest._dispatch()
+
+    def futures_create_order(self, **params):
+        return self._call(lambda: self.sim.new_order(self.account, params).to_dict())
+
+    def futures_cancel_order(self, **params):
+        return self._call(lambda: self.sim.cancel_order(self.account, params).to_dict())
+
+    def futures_modify_order(self, **params):
+        return self._call(lambda: self.sim.modify_order(self.account, params).to_dict())
+
+    def futures_place_batch_order(self, **params):
+        return [self._batch_entry(lambda: self.sim.new_order(self.account, order).to_dict())
+                for order in params['batchOrders']]
+
+    def futures_cancel_orders(self, **params):
+        return [self._batch_entry(lambda: self.sim.cancel_order(
+                    self.account, {'symbol': params.get('symbol'), 'origClientOrderId': client_id}).to_dict())
+                for client_id in params.get('origclientorderidlist', [])]
+
+    def _batch_entry(self, fn):
+        try:
+            return self._call(fn)
+        except BinanceAPIException as e:
+            return {'code': e.code, 'msg': e.message}
+
+    def futures_cancel_all_open_orders(self, **params):
+        self._call(lambda: self.sim.cancel_all(self.account, self.sim._symbol(params)))
+        return {'code': 200, 'msg': 'The operation of cancel all open order is done.'}
+
+    def futures_get_order(self, **params):
+        return self._call(lambda: self.sim.find_order(self.account, params).to_dict())
+
+    def futures_get_open_orders(self, **params):
+        return [o.to_dict() for o in self.sim.open_orders(self.account, params.get('symbol'))]
+
+    def futures_get_all_orders(self, **params):
+        orders = [o.to_dict() for o in self.sim.orders.values()
+                  if o.account is self.account and o.symbol == params.get('symbol')]
+        return orders[-int(params.get('limit', 500)):]
+
+    def futures_position_information(self, **params):
+        return [{'symbol': symbol, 'positionAmt': str(amount), 'entryPrice': str(entry),
+                 'unRealizedProfit': str((self.sim.last_prices[symbol] - entry) * amount), 'positionSide': 'BOTH'}
+                for symbol, (amount, entry, _) in self.account.positions.items()
+                if params.get('symbol') in (None, symbol)]
+
+    def futures_symbol_ticker(self, **params):
+        symbol = self._call(lambda: self.sim._symbol(params))
+        return {'symbol': symbol, 'price': str(self.sim.last_prices[symbol]), 'time': self.backtest.now}
+
+    def futures_exchange_info(self):
+        return self.sim.exchange_info()
+
+    def futures_klines(self, **params):
+        self._call(lambda: self.sim._symbol(params))
+        return self._call(lambda: self.backtest.klines(params.get('interval', '1m'), params.get('startTime'),
+                                                       params.get('endTime'), params.get('limit', 500)))
+
+
+class TapeVolume:
+    """Stands in for MarketVolume: volume and VWAP of the tape replayed since it was created."""
+
+    def __init__(self, backtest):
+        self.backtest = backtest
+        self.start = backtest.cursor
+
+    @property
+    def volume(self):
+        return float(self.backtest.tape.qty[self.start:self.backtest.cursor].sum())
+
+    @property
+    def vwap(self):
+        quantities = self.backtest.tape.qty[self.start:self.backtest.cursor]
+        volume = float(quantities.sum())
+        if not volume:
+            return None
+        return float(np.dot(self.backtest.tape.price[self.start:self.backtest.cursor], quantities)) / volume
+
+
+# --- Strategies ---
+def run_grid(backtest, lower, upper, grids, quantity, auto_recenter=False):
+    """Places the grid ladder at the start of the tape and refills it on every fill until the end."""
+    engine = GridEngine(backtest.client, backtest.symbol, lower, upper, grids, quantity, auto_recenter=auto_recenter)
+    backtest.on_order_update(engine.handle_order_update)
+    engine.place_initial_orders()
+    backtest.run()
+    return {'open_orders': len(engine.order_ids), 'lower': engine.lower, 'upper': engine.upper}
+
+
+def run_oco(backtest, side, quantity, take_profit_price, stop_loss_price):
+    """Opens the position with a MARKET order, then brackets it with the OCO legs until one fills."""
+    client = backtest.client
+    client.futures_create_order(**client.symbol_filters.prepare_order(dict(
+        symbol=backtest.symbol, side=side, type=ORDER_TYPE_MARKET, quantity=quantity)))
+    engine = OcoEngine(client, backtest.symbol, side, quantity, take_profit_price, stop_loss_price)
+    backtest.on_order_update(engine.handle_order_update)
+    engine.place_orders()
+    backtest.run(stop=lambda: engine.done)
+    return {'filled_leg': engine.filled_leg}
+
+
+def run_twap(backtest, side, total_quantity, duration_minutes, slices=NUMBER_OF_SUB_ORDERS, mode='twap',
+             max_participation=None):
+    """Sends the TWAP/VWAP slices on the tape's clock. Participation is measured against the tape's volume."""
+    engine = TwapEngine(backtest.client, backtest.symbol, side, total_quantity, duration_minutes, slices,
+                        mode, max_participation)
+    engine.prepare(now_ms=backtest.now)
+    engine.market = TapeVolume(backtest)
+    start = backtest.now
+    for i in range(engine.slices):
+        backtest.run(until_ms=start + int(i * engine.delay_seconds * 1000))
+        quantity = engine.slice_quantity(i)
+        if quantity <= 0:
+            continue
+        engine.submitted += quantity
+        try:
+            order = engine.place_slice(i, quantity)
+        except BinanceAPIException as e:
+            engine.submitted -= quantity
+            logging.error("Sub-order %d/%d failed: %s", i + 1, engine.slices, e.message)
+            continue
+        engine.record_fill(order)
+    return engine.report()
+
+
+def run_stop_limit(backtest, side, quantity, stop_price, limit_price):
+    """Places one STOP (stop-limit) order and replays until it is no longer open."""
+    client = backtest.client
+    order = client.futures_create_order(**client.symbol_filters.prepare_order(dict(
+        symbol=backtest.symbol, side=side, type=ORDER_TYPE_STOP, timeInForce=TIME_IN_FORCE_GTC,
+        quantity=quantity, price=limit_price, stopPrice=stop_price)))
+
+    def closed():
+        return client.futures_get_order(symbol=backtest.symbol, orderId=order['orderId'])['status'] not in OPEN_STATUSES
+
+    backtest.run(stop=closed)
+    final = client.futures_get_order(symbol=backtest.symbol, orderId=order['orderId'])
+    return {'status': final['status'], 'executed': final['executedQty'], 'avg_price': final['avgPrice'],
+            'filled_at': final['updateTime'] if final['status'] == 'FILLED' else None}
+
+
+STRATEGIES = {
+    'grid': run_grid,
+    'oco': run_oco,
+    'twap': run_twap,
+    'stop_limit': run_stop_limit,
+}
+
+
+def run_backtest(strategy, tape, symbol, params, start_ms=None, end_ms=None, **options):
+    """Backtests one strategy over the tape's trades in [start_ms, end_ms). Returns its report.
+
+    options go to Backtest (tick_size, step_size, min_notional, maker_fee, taker_fee).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}'. Expected one of: {', '.join(STRATEGIES)}")
+    started = time.perf_counter()
+    backtest = Backtest(tape.window(start_ms, end_ms), symbol, **options)
+    details = STRATEGIES[strategy](backtest, **params)
+    report = {'strategy': strategy, 'params': params}
+    report.update(backtest.report())
+    report['details'] = details
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+# --- Parameter sweeps ---
+_tapes = {}  # path -> TradeTape, loaded once per worker process
+
+
+def _sweep_job(job):
+    strategy, path, symbol, params, start_ms, end_ms, options = job
+    tape = _tapes.get(path)
+    if tape is None:
+        tape = _tapes[path] = TradeTape.load(path)
+    try:
+        return run_backtest(strategy, tape, symbol, params, start_ms, end_ms, **options)
+    except Exception as e:
+        return {'strategy': strategy, 'params': params, 'error': str(e)}
+
+
+def _init_worker():
+    # Engines log every order at INFO; workers only report errors.
+    logging.basicConfig(level=logging.ERROR, force=True)
+
+
+def sweep(strategy, path, symbol, params, grid, processes=None, start_ms=None, end_ms=None, sort_key='net_pnl',
+          **options):
+    """Backtests every combination of grid ({param: [values]}) over params, spread over a process pool.
+
+    Workers memory-map the tape, so they share one copy through the page
+    cache. Returns the reports best first by sort_key; failed runs come last
+    with an 'error'.
+    """
+    names = list(grid)
+    jobs = [(strategy, path, symbol, dict(params, **dict(zip(names, values))), start_ms, end_ms, options)
+            for values in itertools.product(*(grid[name] for name in names))]
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker) as pool:
+        reports = list(pool.map(_sweep_job, jobs))
+    reports.sort(key=lambda report: report.get(sort_key, -math.inf), reverse=True)
+    return reports
+
+
+# --- CLI ---
+def _value(text):
+    for parse in (int, float):
+        try:
+            return parse(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _assignments(items, many=False):
+    values = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"Expected KEY=VALUE, got '{item}'")
+        values[key] = [_value(v) for v in value.split(',')] if many else _value(value)
+    return values
+
+
+def parse_time_ms(text):
+    """Epoch ms, or an ISO date/time (UTC unless it has an offset)."""
+    if text is None or text.isdigit():
+        return int(text) if text else None
+    moment = datetime.fromisoformat(text)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest the bot's strategies on historical trades")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help="Convert data.binance.vision CSV files into a tape")
+    importer.add_argument('out', help="Tape directory to write")
+    importer.add_argument('csv', nargs='+')
+    importer.add_argument('--klines', action='store_true', help="The files hold klines instead of aggTrades")
+
+    for name in ('run', 'sweep'):
+        command = commands.add_parser(name)
+        command.add_argument('strategy', choices=sorted(STRATEGIES))
+        command.add_argument('tape', help="Tape directory or .parquet file")
+        command.add_argument('--symbol', required=True)
+        command.add_argument('--set', nargs='*', default=[], metavar='KEY=VALUE', help="Strategy parameters")
+        command.add_argument('--start', help="Epoch ms or ISO date/time (UTC)")
+        command.add_argument('--end', help="Epoch ms or ISO date/time (UTC)")
+        command.add_argument('--tick-size')
+        command.add_argument('--step-size')
+        command.add_argument('--min-notional')
+        command.add_argument('--maker-fee', type=float, default=MAKER_FEE)
+        command.add_argument('--taker-fee', type=float, default=TAKER_FEE)
+        command.add_argument('--verbose', action='store_true', help="Log every order the strategy sends")
+        if name == 'sweep':
+            command.add_argument('--vary', nargs='+', required=True, metavar='KEY=V1,V2,...')
+            command.add_argument('--processes', type=int, help="Worker processes (default: one per CPU)")
+            command.add_argument('--sort', default='net_pnl', help="Report field to rank by")
+            command.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        started = time.perf_counter()
+        count = import_csv(args.csv, args.out, args.klines)
+        print(f"Wrote {count} trades to {args.out} in {time.perf_counter() - started:.1f}s")
+        return
+
+    setup_logging(log_file="backtest.log", level=logging.INFO if args.verbose else logging.ERROR)
+    params = _assignments(args.set)
+    options = {'tick_size': args.tick_size, 'step_size': args.step_size, 'min_notional': args.min_notional,
+               'maker_fee': args.maker_fee, 'taker_fee': args.taker_fee}
+    symbol = args.symbol.upper()
+    start_ms, end_ms = parse_time_ms(args.start), parse_time_ms(args.end)
+    if args.command == 'run':
+        report = run_backtest(args.strategy, TradeTape.load(args.tape), symbol, params, start_ms, end_ms, **options)
+        print(json.dumps(report, indent=2))
+        return
+
+    started = time.perf_counter()
+    reports = sweep(args.strategy, args.tape, symbol, params, _assignments(args.vary, many=True), args.processes,
+                    start_ms, end_ms, args.sort, **options)
+    for report in reports[:args.top]:
+        print(json.dumps(report))
+    print(f"{len(reports)} runs in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# src/batch_orders.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+# The futures batchOrders endpoint accepts at most 5 orders per call and costs 5 weight.
+BATCH_SIZE = 5
+BATCH_ORDER_WEIGHT = 5
+# Batch cancel takes up to 10 orders per call.
+BATCH_CANCEL_SIZE = 10
+# Half of the 2400/minute futures IP limit, leaving room for monitoring and other scripts.
+DEFAULT_WEIGHT_BUDGET = 1200
+WEIGHT_WINDOW_SECONDS = 60
+
+
+class WeightBudget:
+    """Sliding one-minute window that delays callers once the weight budget is spent."""
+
+    def __init__(self, budget=DEFAULT_WEIGHT_BUDGET, window=WEIGHT_WINDOW_SECONDS):
+        self.budget = budget
+        self.window = window
+        self.spent = deque()  # (monotonic time, weight)
+        self.used = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, weight):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self.spent and now - self.spent[0][0] >= self.window:
+                    self.used -= self.spent.popleft()[1]
+                if self.used + weight <= self.budget or not self.spent:
+                    break
+                await asyncio.sleep(self.window - (now - self.spent[0][0]))
+            self.spent.append((now, weight))
+            self.used += weight
+
+
+def chunk_orders(orders, size=BATCH_SIZE):
+    """Splits a list of order params into batchOrders-sized chunks."""
+    return [orders[i:i + size] for i in range(0, len(orders), size)]
+
+
+async def place_orders_batched(async_client, orders, max_concurrency=10, weight_budget=DEFAULT_WEIGHT_BUDGET):
+    """Places orders through concurrent batchOrders calls.
+
+    Returns one result per input order, in input order: the exchange's order
+    dict on success or a {'code', 'msg'} dict when that order was rejected.
+    """
+    budget = weight_budget if isinstance(weight_budget, WeightBudget) else WeightBudget(weight_budget)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    chunks = chunk_orders(orders)
+
+    async def send(chunk):
+        # batchOrders expects every value as a string
+        batch = [{key: str(value) for key, value in order.items()} for order in chunk]
+        await budget.acquire(BATCH_ORDER_WEIGHT)
+        async with semaphore:
+            try:
+                return await async_client.futures_place_batch_order(batchOrders=batch)
+            except BinanceAPIException as e:
+                return [{'code': e.code, 'msg': e.message}] * len(chunk)
+            except BinanceRequestException as e:
+                return [{'code': None, 'msg': e.message}] * len(chunk)
+
+    responses = await asyncio.gather(*(send(chunk) for chunk in chunks))
+
+    results = [result for response in responses for result in response]
+    failed = sum(1 for result in results if is_rejected(result))
+    logging.info(f"Batch placement done: {len(results) - failed} placed, {failed} rejected, {len(chunks)} requests.")
+    return results
+
+
+def place_orders_batched_sync(client, orders):
+    """Places orders through sequential batchOrders calls on a sync Client. Results as place_orders_batched."""
+    results = []
+    for chunk in chunk_orders(orders):
+        batch = [{key: str(value) for key, value in order.items()} for order in chunk]
+        try:
+            results.extend(client.futures_place_batch_order(batchOrders=batch))
+        except BinanceAPIException as e:
+            results.extend([{'code': e.code, 'msg': e.message}] * len(chunk))
+        except BinanceRequestException as e:
+            results.extend([{'code': None, 'msg': e.message}] * len(chunk))
+    return results
+
+
+def cancel_orders_batched(client, symbol, client_ids):
+    """Cancels orders by client order ID through batch cancel calls on a sync Client.
+
+    Returns one result per ID, in order: the cancelled order or a {'code', 'msg'} dict.
+    """
+    results = []
+    for chunk in chunk_orders(client_ids, BATCH_CANCEL_SIZE):
+        try:
+            results.extend(client.futures_cancel_orders(symbol=symbol, origclientorderidlist=chunk))
+        except BinanceAPIException as e:
+            results.extend([{'code': e.code, 'msg': e.message}] * len(chunk))
+        except BinanceRequestException as e:
+            results.extend([{'code': None, 'msg': e.message}] * len(chunk))
+    return results
+
+
+def is_rejected(result):
+    """True if a batch result is an error entry rather than an order."""
+    return 'orderId' not in result
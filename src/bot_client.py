@@ -1,9 +1,449 @@
 # src/bot_client.py
 
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import os
+import time
+from decimal import Decimal
+from urllib.parse import quote
+
+import requests
+from requests.adapters import HTTPAdapter
 from binance.client import Client
+from binance.async_client import AsyncClient
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # optional: the standard parser is slower, not different
+    _loads = json.loads
+
+try:
+    from src.rate_limiter import RateLimiter
+    from src.symbol_filters import SymbolFilterCache, FILTER_ERROR_CODES
+    from src.latency import LatencyRecorder
+except ImportError:  # run as a script from src/, e.g. python src/market_orders.py
+    from rate_limiter import RateLimiter
+    from symbol_filters import SymbolFilterCache, FILTER_ERROR_CODES
+    from latency import LatencyRecorder
+
+STREAM_URL = "wss://fstream.binance.com"
+STREAM_TESTNET_URL = "wss://stream.binancefuture.com"
+
+# Server-time offset is cached on disk so one-shot scripts can sign requests
+# correctly without an extra round trip.
+TIME_OFFSET_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "binance-bot", "time_offset.json")
+TIME_OFFSET_TTL = 60 * 60
+
+# Order params that differ from one order to the next. The rest (symbol, side,
+# type, timeInForce, reduceOnly, ...) is encoded once per combination.
+VARIABLE_ORDER_PARAMS = frozenset({'quantity', 'price', 'stopPrice', 'activationPrice', 'callbackRate',
+                                   'newClientOrderId'})
+MAX_ORDER_PREFIXES = 4096
+FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+# perf_counter stamps of the request in flight. A context variable rather than
+# a thread-local, so concurrent AsyncClient requests on one thread stay apart.
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _futures_path(uri):
+    """'https://fapi.binance.com/fapi/v1/ticker/price' -> 'ticker/price'; None outside the futures API."""
+    _, found, rest = uri.partition("/fapi/")
+    if not found:
+        return None
+    return rest.split("/", 1)[-1]
+
+
+class OrderEncoder:
+    """Builds signed futures order bodies, doing per order only the work that changes per order.
+
+    The HMAC-SHA256 is keyed with the secret once and each signature copies
+    that keyed state rather than hashing the key pads again. The constant
+    params of an order are encoded once per combination and kept as bytes, so
+    a burst of orders on one symbol only formats quantity, price, client ID
+    and timestamp. Params go out sorted by name (constant ones, then the
+    variable ones) and URL-encoded; numbers are written in fixed point, since
+    Binance rejects exponents such as 1e-05.
+    """
+
+    def __init__(self, secret, recv_window=None):
+        self._keyed = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+        self.recv_window = recv_window
+        self._prefixes = {}
+
+    def sign(self, payload):
+        mac = self._keyed.copy()
+        mac.update(payload)
+        return mac.hexdigest()
+
+    def encode(self, params, timestamp):
+        """The unsigned body of params at timestamp, as bytes."""
+        constant, variable = [], []
+        for key, value in params.items():
+            if value is not None:
+                (variable if key in VARIABLE_ORDER_PARAMS else constant).append((key, value))
+        constant = tuple(sorted(constant))
+        prefix = self._prefixes.get(constant)
+        if prefix is None:
+            if len(self._prefixes) >= MAX_ORDER_PREFIXES:
+                self._prefixes.clear()
+            prefix = self._prefixes[constant] = "".join(
+                f"{key}={_encode_value(value)}&" for key, value in constant).encode()
+        variable.sort()
+        tail = "".join(f"{key}={_encode_value(value)}&" for key, value in variable)
+        if self.recv_window:
+            tail += f"recvWindow={self.recv_window}&"
+        return prefix + f"{tail}timestamp={timestamp}".encode()
+
+
+def _encode_value(value):
+    """One param value as sent: fixed-point numbers, lower-case booleans, URL-encoded."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        value = Decimal(repr(value))
+    if isinstance(value, Decimal):
+        return format(value, 'f')
+    return quote(str(value), safe='')
+
+
+class _TimedRequests:
+    """Stamps the build and signing phases of each request for the client's LatencyRecorder."""
+
+    def _get_request_kwargs(self, *args, **kwargs):
+        result = super()._get_request_kwargs(*args, **kwargs)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings['built'] = time.perf_counter()
+        return result
+
+    def _generate_signature(self, *args, **kwargs):
+        started = time.perf_counter()
+        signature = super()._generate_signature(*args, **kwargs)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings['sign'] = timings.get('sign', 0.0) + time.perf_counter() - started
+        return signature
+
+    def _start_timing(self):
+        timings = {'start': time.perf_counter()}
+        return timings, _request_timings.set(timings)
+
+    def _finish_timing(self, method, uri, path, timings, token):
+        _request_timings.reset(token)
+        if self.latency is not None:
+            self.latency.observe_request(method, path or uri, timings, time.perf_counter())
+
+
+class RateLimitedClient(_TimedRequests, Client):
+    """Client whose futures requests wait for a RateLimiter slot and report the usage headers back.
+
+    A filter-related rejection also invalidates the attached SymbolFilterCache.
+    Every request's phases are timed into the attached LatencyRecorder. With a
+    RiskEngine attached (RiskEngine.for_client), new and amended orders pass
+    its check before anything is sent.
+    """
+
+    def __init__(self, *args, rate_limiter=None, latency=None, **kwargs):
+        self.rate_limiter = rate_limiter
+        self.latency = latency
+        self.symbol_filters = None
+        self.risk = None
+        super().__init__(*args, **kwargs)
+        self.order_encoder = OrderEncoder(self.API_SECRET, self.REQUEST_RECVWINDOW) if self.API_SECRET else None
+        self._order_templates = {}
+
+    def futures_create_order(self, **params):
+        """Places an order through the OrderEncoder fast path (HMAC keys; RSA/Ed25519 keys take the library's).
+
+        Same params, errors and response as the library method. An order the
+        RiskEngine refuses raises RiskError without a request.
+        """
+        risk = self.risk
+        if risk is not None:
+            if 'newClientOrderId' not in params:
+                params['newClientOrderId'] = self._new_client_order_id()
+            risk.check(params)
+        try:
+            if self.order_encoder is None or self.PRIVATE_KEY or self._requests_params:
+                order = super().futures_create_order(**params)
+            else:
+                order = self._create_order_fast(params)
+        except BaseException as e:
+            if risk is not None:
+                risk.send_failed(params, e)
+            raise
+        return order
+
+    def futures_place_batch_order(self, **params):
+        """Places a batch; with a RiskEngine, refused orders get error entries and the rest are sent."""
+        if self.risk is None:
+            return super().futures_place_batch_order(**params)
+        orders, results = self.risk.screen_batch(params['batchOrders'], self._new_client_order_id)
+        if not orders:
+            return results
+        try:
+            placed = super().futures_place_batch_order(**dict(params, batchOrders=orders))
+        except BaseException as e:
+            for order in orders:
+                self.risk.send_failed(order, e)
+            raise
+        return self.risk.settle_batch(orders, placed, results)
+
+    def futures_modify_order(self, **params):
+        """Amends an order in place; with a RiskEngine the amended order is checked first."""
+        if self.risk is not None:
+            self.risk.check_amend(params)
+        return super().futures_modify_order(**params)
+
+    def _new_client_order_id(self):
+        return self.CONTRACT_ORDER_PREFIX + self.uuid22()
+
+    def _create_order_fast(self, params):
+        if 'newClientOrderId' not in params:
+            params['newClientOrderId'] = self.CONTRACT_ORDER_PREFIX + self.uuid22()
+        uri = self._create_futures_api_uri('order')
+        timings, token = self._start_timing()
+        try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire('POST', 'order')
+            timings['acquired'] = time.perf_counter()
+            body = self.order_encoder.encode(params, int(time.time() * 1000 + self.timestamp_offset))
+            signed = time.perf_counter()
+            body += b"&signature=" + self.order_encoder.sign(body).encode()
+            timings['built'] = time.perf_counter()
+            timings['sign'] = timings['built'] - signed
+            template, settings = self._order_templates.get(uri) or self._order_template(uri)
+            request = template.copy()
+            request.body = body
+            request.headers['Content-Length'] = str(len(body))
+            return self._handle_response(self.session.send(request, timeout=self.REQUEST_TIMEOUT, **settings))
+        finally:
+            self._finish_timing('post', uri, 'order', timings, token)
+
+    def _order_template(self, uri):
+        """A prepared POST to uri and its send settings, built once per endpoint.
+
+        session.post() would merge the session headers and re-read the proxy
+        and CA environment variables for every order; here that happens once.
+        """
+        template = self.session.prepare_request(requests.Request('POST', uri, headers=FORM_HEADERS, data=b"x"))
+        settings = self.session.merge_environment_settings(uri, {}, None, None, None)
+        self._order_templates[uri] = template, settings
+        return template, settings
+
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        path = _futures_path(uri)
+        timings, token = self._start_timing()
+        try:
+            if self.rate_limiter is not None and path is not None:
+                self.rate_limiter.acquire(method.upper(), path, kwargs.get('data'))
+            timings['acquired'] = time.perf_counter()
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        finally:
+            self._finish_timing(method, uri, path, timings, token)
+
+    def _handle_response(self, response):
+        # Called with each thread's own response object, unlike the shared self.response.
+        timings = _request_timings.get()
+        if timings is not None:
+            timings['received'] = time.perf_counter()
+            # requests measures from sending the request to parsing the response headers.
+            timings['first_byte'] = response.elapsed.total_seconds()
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(response.status_code, response.headers)
+        try:
+            if not 200 <= response.status_code < 300:
+                raise BinanceAPIException(response, response.status_code, response.text)
+            if not response.content:
+                return {}
+            try:
+                return _loads(response.content)
+            except ValueError:
+                raise BinanceRequestException(f"Invalid Response: {response.text}")
+        except BinanceAPIException as e:
+            if e.code in FILTER_ERROR_CODES and self.symbol_filters is not None:
+                self.symbol_filters.invalidate()
+            raise
+        finally:
+            if timings is not None:
+                timings['parsed'] = time.perf_counter()
+
+
+class RateLimitedAsyncClient(_TimedRequests, AsyncClient):
+    """AsyncClient counterpart of RateLimitedClient, sharing the same limiter, latency recorder and risk gate.
+
+    aiohttp hands back the response once its headers arrive, so here send ends
+    at the first byte and parse includes reading the body.
+    """
+
+    def __init__(self, *args, rate_limiter=None, latency=None, risk=None, **kwargs):
+        self.rate_limiter = rate_limiter
+        self.latency = latency
+        self.risk = risk
+        super().__init__(*args, **kwargs)
+
+    async def futures_create_order(self, **params):
+        if self.risk is None:
+            return await super().futures_create_order(**params)
+        if 'newClientOrderId' not in params:
+            params['newClientOrderId'] = self._new_client_order_id()
+        self.risk.check(params)
+        try:
+            return await super().futures_create_order(**params)
+        except BaseException as e:
+            self.risk.send_failed(params, e)
+            raise
+
+    async def futures_place_batch_order(self, **params):
+        if self.risk is None:
+            return await super().futures_place_batch_order(**params)
+        orders, results = self.risk.screen_batch(params['batchOrders'], self._new_client_order_id)
+        if not orders:
+            return results
+        try:
+            placed = await super().futures_place_batch_order(**dict(params, batchOrders=orders))
+        except BaseException as e:
+            for order in orders:
+                self.risk.send_failed(order, e)
+            raise
+        return self.risk.settle_batch(orders, placed, results)
+
+    async def futures_modify_order(self, **params):
+        if self.risk is not None:
+            self.risk.check_amend(params)
+        return await super().futures_modify_order(**params)
+
+    def _new_client_order_id(self):
+        return self.CONTRACT_ORDER_PREFIX + self.uuid22()
+
+    async def _request(self, method, uri, signed, force_params=False, **kwargs):
+        path = _futures_path(uri)
+        timings, token = self._start_timing()
+        try:
+            if self.rate_limiter is not None and path is not None:
+                await asyncio.to_thread(self.rate_limiter.acquire, method.upper(), path, kwargs.get('data'))
+            timings['acquired'] = time.perf_counter()
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        finally:
+            self._finish_timing(method, uri, path, timings, token)
+
+    async def _handle_response(self, response):
+        timings = _request_timings.get()
+        if timings is not None:
+            timings['received'] = time.perf_counter()
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(response.status, response.headers)
+        try:
+            return await super()._handle_response(response)
+        finally:
+            if timings is not None:
+                timings['parsed'] = time.perf_counter()
+
 
 class BasicBot:
-   
-    def __init__(self, api_key, api_secret, testnet=True):
-       
-        self.client = Client(api_key, api_secret, testnet=testnet)
\ No newline at end of file
+    """Long-lived futures session: one pooled keep-alive HTTP session and a cached clock offset.
+
+    base_url (or the BINANCE_BASE_URL environment variable) redirects the futures
+    REST API and user-data stream, e.g. to a local exchange_sim.py instance.
+    filters rounds order prices and quantities to the symbol's exchange filters.
+
+    Every futures request, sync or async, goes through one RateLimiter so the
+    bot stays inside the account's weight and order limits; cancels and new
+    orders are let through ahead of status polling when it has to queue. Each
+    request's phases are timed into one LatencyRecorder (bot.latency).
+    """
+
+    def __init__(self, api_key, api_secret, testnet=True, stream_url=None, ping=False,
+                 pool_size=10, sync_time=False, base_url=None, rate_limiter=None, latency=None):
+
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.testnet = testnet
+        self.base_url = base_url or os.getenv("BINANCE_BASE_URL")
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.latency = latency or LatencyRecorder()
+        # python-binance pings the *spot* API on startup, which only warms a host
+        # the futures scripts never talk to, so it is off by default.
+        self.client = self._point_at_base_url(
+            RateLimitedClient(api_key, api_secret, testnet=testnet, ping=ping, rate_limiter=self.rate_limiter,
+                              latency=self.latency))
+        self.filters = SymbolFilterCache.for_client(self.client)
+        if stream_url is None and self.base_url:
+            stream_url = self.base_url.replace("http", "ws", 1)
+        self.stream_url = stream_url or (STREAM_TESTNET_URL if testnet else STREAM_URL)
+
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.client.session.mount("https://", adapter)
+        self.client.session.mount("http://", adapter)
+
+        if sync_time:
+            self.sync_time()
+        else:
+            self.load_time_offset()
+
+    def sync_time(self):
+        """Measures the offset to the futures server clock and caches it on disk."""
+        sent = time.time() * 1000
+        server_time = self.client.futures_time()['serverTime']
+        received = time.time() * 1000
+        offset = int(server_time - (sent + received) / 2)
+        self.client.timestamp_offset = offset
+
+        try:
+            os.makedirs(os.path.dirname(TIME_OFFSET_CACHE), exist_ok=True)
+            with open(TIME_OFFSET_CACHE, "w") as f:
+                json.dump({'endpoint': self.futures_url, 'offset': offset, 'measured_at': time.time()}, f)
+        except OSError:
+            pass
+        return offset
+
+    def load_time_offset(self):
+        """Applies the cached clock offset if it is still fresh. Returns True on success."""
+        try:
+            with open(TIME_OFFSET_CACHE) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if cached.get('endpoint') != self.futures_url or time.time() - cached.get('measured_at', 0) > TIME_OFFSET_TTL:
+            return False
+        self.client.timestamp_offset = cached['offset']
+        return True
+
+    def load_rate_limits(self):
+        """Replaces the default limits with the ones the exchange reports, refreshing the symbol filters too."""
+        exchange_info = self.client.futures_exchange_info()
+        self.rate_limiter.configure(exchange_info)
+        self.filters.update(exchange_info)
+
+    @property
+    def futures_url(self):
+        return self.client.FUTURES_TESTNET_URL if self.testnet else self.client.FUTURES_URL
+
+    def _point_at_base_url(self, client):
+        if self.base_url:
+            client.FUTURES_URL = client.FUTURES_TESTNET_URL = f"{self.base_url.rstrip('/')}/fapi"
+        return client
+
+    def warm_up(self):
+        """Opens the pooled TLS connection to the futures API ahead of the first order."""
+        self.client.futures_ping()
+
+    def close(self):
+        self.client.close_connection()
+
+    async def create_async_client(self):
+        """Creates an AsyncClient with the same credentials and clock offset, for concurrent requests."""
+        # Built directly rather than via AsyncClient.create(), which pings the spot API
+        # and re-measures the clock offset we already have.
+        async_client = self._point_at_base_url(RateLimitedAsyncClient(
+            self.api_key, self.api_secret, testnet=self.testnet, rate_limiter=self.rate_limiter,
+            latency=self.latency, risk=self.client.risk))
+        async_client.timestamp_offset = self.client.timestamp_offset
+        return async_client
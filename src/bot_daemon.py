@@ -0,0 +1,162 @@
+# src/bot_daemon.py
+#
+# Keeps one warm BasicBot and accepts order commands over a Unix socket, so a
+# one-shot script only pays a local round trip plus one warm request.
+#
+# Usage: python src/bot_daemon.py [socket_path]
+# Scripts use the daemon when BINANCE_BOT_SOCKET points at its socket.
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+DEFAULT_SOCKET = "/tmp/binance-bot.sock"
+
+# Only order-path calls are exposed over the socket.
+ALLOWED_METHODS = {
+    'futures_create_order',
+    'futures_cancel_order',
+    'futures_get_order',
+    'futures_get_open_orders',
+    'futures_symbol_ticker',
+}
+
+# Binance rejects requests whose timestamp is outside recvWindow with this code.
+TIMESTAMP_ERROR_CODE = -1021
+# Idle keep-alive connections get dropped server-side, so the daemon pings well within that.
+KEEP_WARM_INTERVAL = 60
+TIME_SYNC_INTERVAL = 30 * 60
+
+
+class DaemonCommandError(Exception):
+    """Raised by send_command when the daemon reports an error."""
+
+    def __init__(self, code, message):
+        super().__init__(f"(Code {code}): {message}")
+        self.code = code
+        self.message = message
+
+
+def send_command(method, socket_path=DEFAULT_SOCKET, **params):
+    """Sends one command to a running daemon and returns the exchange response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({'method': method, 'params': params}).encode() + b"\n")
+        with sock.makefile('rb') as reader:
+            response = json.loads(reader.readline())
+    if not response['ok']:
+        raise DaemonCommandError(response.get('code'), response.get('msg'))
+    return response['result']
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """Serves newline-delimited JSON commands on one connection."""
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.execute(json.loads(line))
+            except ValueError:
+                response = {'ok': False, 'code': None, 'msg': "Malformed command"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class BotDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, bot, socket_path=DEFAULT_SOCKET):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, CommandHandler)
+        os.chmod(socket_path, 0o600)
+        self.bot = bot
+        self.socket_path = socket_path
+
+    def execute(self, command):
+        from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+        method = command.get('method')
+        if method not in ALLOWED_METHODS:
+            return {'ok': False, 'code': None, 'msg': f"Unsupported method: {method}"}
+
+        params = command.get('params', {})
+        try:
+            if method == 'futures_create_order':
+                params = self.bot.filters.prepare_order(params)
+            try:
+                result = getattr(self.bot.client, method)(**params)
+            except BinanceAPIException as e:
+                if e.code != TIMESTAMP_ERROR_CODE:
+                    raise
+                logging.warning("Timestamp rejected. Resyncing clock and retrying once.")
+                self.bot.sync_time()
+                result = getattr(self.bot.client, method)(**params)
+        except BinanceAPIException as e:
+            return {'ok': False, 'code': e.code, 'msg': e.message}
+        except BinanceRequestException as e:
+            return {'ok': False, 'code': None, 'msg': e.message}
+        except Exception as e:
+            return {'ok': False, 'code': None, 'msg': str(e)}
+        return {'ok': True, 'result': result}
+
+    def keep_warm(self):
+        """Keeps the pooled connection open and the clock offset fresh."""
+        last_sync = time.monotonic()
+        while True:
+            time.sleep(KEEP_WARM_INTERVAL)
+            try:
+                if time.monotonic() - last_sync >= TIME_SYNC_INTERVAL:
+                    self.bot.sync_time()
+                    last_sync = time.monotonic()
+                else:
+                    self.bot.warm_up()
+            except Exception as e:
+                logging.error(f"Keep-warm request failed: {e}")
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from src.bot_client import BasicBot
+    from src.bot_logging import setup_logging
+
+    setup_logging()
+
+    api_key = os.getenv("BINANCE_API_KEY")
+    api_secret = os.getenv("BINANCE_API_SECRET")
+    if not api_key or not api_secret:
+        logging.error("BINANCE_API_KEY and BINANCE_API_SECRET environment variables must be set.")
+        sys.exit(1)
+
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else os.getenv("BINANCE_BOT_SOCKET", DEFAULT_SOCKET)
+
+    try:
+        bot = BasicBot(api_key, api_secret, testnet=True, sync_time=True)
+        bot.load_rate_limits()
+    except Exception as e:
+        logging.error(f"Failed to initialize Binance client: {e}")
+        sys.exit(1)
+
+    with BotDaemon(bot, socket_path) as server:
+        threading.Thread(target=server.keep_warm, daemon=True).start()
+        logging.info(f"Bot daemon listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.info("Bot daemon stopped.")
+        finally:
+            bot.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# src/bot_logging.py
+#
+# Logging setup shared by every entry point. A log call only puts the record on
+# a queue; one background thread formats and writes it. bot.log holds one JSON
+# object per line and rotates by size, the console keeps the familiar plain
+# text, and with strategy_logs each strategy also gets its own file. Every
+# script process appends to the same bot.log, so writes and rotation happen
+# under a lock shared between processes.
+#
+# Hot paths should log with %-style arguments (logging.info("... %s", x)) so
+# the message is only built on the writer thread. Arguments are formatted
+# later, so pass values that will not change afterwards.
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so one writing process per log file
+    fcntl = None
+
+LOG_FILE = "bot.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+STRATEGY_LOG_DIR = "logs"
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# The strategy whose code is running. asyncio tasks and asyncio.to_thread calls inherit it.
+current_strategy = contextvars.ContextVar('strategy', default=None)
+
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'strategy'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, strategy, message and any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        strategy = getattr(record, 'strategy', None)
+        if strategy:
+            entry['strategy'] = strategy
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records unformatted; the writer thread builds the message."""
+
+    def prepare(self, record):
+        record.strategy = current_strategy.get()
+        return record
+
+
+class SharedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler for a log file that several processes append to.
+
+    Each record is written under an advisory lock on <file>.lock, and a file
+    another process has rotated away is reopened first, so no process rotates
+    the file while another writes to it or keeps writing into a backup.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._lock_file = open(f"{self.baseFilename}.lock", 'a') if fcntl is not None else None
+
+    def emit(self, record):
+        if self._lock_file is None:
+            return super().emit(record)
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            self._reopen_if_rotated()
+            super().emit(record)
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            on_disk = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            on_disk = None
+        ours = os.fstat(self.stream.fileno())
+        if on_disk is None or (on_disk.st_dev, on_disk.st_ino) != (ours.st_dev, ours.st_ino):
+            self.stream.close()
+            self.stream = self._open()
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class StrategyFileHandler(logging.Handler):
+    """Routes each record tagged with a strategy to <directory>/<strategy>.log, rotated by size."""
+
+    def __init__(self, directory=STRATEGY_LOG_DIR, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+        super().__init__()
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.handlers = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def emit(self, record):
+        name = getattr(record, 'strategy', None)
+        if not name:
+            return
+        handler = self.handlers.get(name)
+        if handler is None:
+            path = os.path.join(self.directory, f"{os.path.basename(name)}.log")
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backups,
+                                                           encoding='utf-8', delay=True)
+            handler.setFormatter(self.formatter)
+            self.handlers[name] = handler
+        handler.handle(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+
+def setup_logging(log_file=LOG_FILE, level=logging.INFO, strategy_logs=False, strategy_dir=STRATEGY_LOG_DIR,
+                  max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS, console=True, caller_info=False):
+    """Routes the root logger through a queue to a background writer. Returns the QueueListener.
+
+    The listener is stopped at exit, which writes out everything still queued.
+    Unless caller_info is set, records skip the stack walk for file and line
+    numbers, which is about a third of the cost of a log call.
+    """
+    if not caller_info:
+        logging._srcfile = None
+    logging.logMultiprocessing = False
+
+    formatter = JsonFormatter()
+    file_handler = SharedRotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+    if strategy_logs:
+        strategy_handler = StrategyFileHandler(strategy_dir, max_bytes, backups)
+        strategy_handler.setFormatter(formatter)
+        handlers.append(strategy_handler)
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,376 @@
+# src/cli.py
+#
+# One entry point for every order type and strategy, runnable from any
+# directory: the binance-bot console script (pip install -e .) or
+# python src/cli.py. Arguments are validated with the standard library only;
+# python-binance, aiohttp and the engines are imported once a command has
+# valid arguments and actually needs them, so --help and usage errors return
+# without paying for them.
+#
+# Usage: binance-bot <command> --help
+#        binance-bot market BTCUSDT BUY 0.01
+#        binance-bot --batch orders.txt
+
+import argparse
+import logging
+import os
+import runpy
+import shlex
+import sys
+import time
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+ADVANCED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'advanced')
+# Order commands allowed in a --batch file.
+BATCH_COMMANDS = ('market', 'limit', 'stop-limit')
+
+
+class UsageError(ValueError):
+    """A command line that does not parse; raised instead of exiting while reading a --batch file."""
+
+
+class _BatchParser(argparse.ArgumentParser):
+    def error(self, message):
+        raise UsageError(message)
+
+
+def _positive(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {value}")
+    return number
+
+
+def _side(value):
+    side = value.upper()
+    if side not in ('BUY', 'SELL'):
+        raise argparse.ArgumentTypeError(f"must be BUY or SELL, got {value}")
+    return side
+
+
+def _add_order(commands, name, help, *prices):
+    command = commands.add_parser(name, help=help)
+    command.add_argument('symbol', type=str.upper)
+    command.add_argument('side', type=_side)
+    command.add_argument('quantity', type=_positive)
+    for price in prices:
+        command.add_argument(price, type=_positive)
+    return command
+
+
+def build_parser(parser_class=argparse.ArgumentParser):
+    parser = parser_class(prog='binance-bot', description="Binance USDT-M futures orders and strategies")
+    if parser_class is argparse.ArgumentParser:
+        parser.add_argument('--batch', metavar='FILE',
+                            help="Place every market/limit/stop-limit line of FILE ('-' for stdin) "
+                                 "through one client, e.g. 'limit BTCUSDT BUY 0.01 58000'")
+        parser.add_argument('--accounts', metavar='KEYRING',
+                            help="Send market/limit/stop-limit orders to every account of a keyring file at once")
+    commands = parser.add_subparsers(dest='command', required=parser_class is not argparse.ArgumentParser)
+
+    market = _add_order(commands, 'market', "MARKET order")
+    market.add_argument('--smart', action='store_true',
+                        help="Split into IOC limit children across the live depth book")
+    _add_order(commands, 'limit', "GTC LIMIT order", 'price')
+    _add_order(commands, 'stop-limit', "STOP order with a limit price", 'stop_price', 'limit_price')
+    if parser_class is not argparse.ArgumentParser:
+        return parser
+
+    oco = _add_order(commands, 'oco', "Take-profit and stop-loss where the first fill cancels the other",
+                     'take_profit_price', 'stop_loss_price')
+    oco.add_argument('--stream', action='store_true', help="Cancel on the user-data fill event instead of polling")
+
+    twap = _add_order(commands, 'twap', "Split an order into slices over time", 'duration_minutes')
+    twap.add_argument('slices', type=int, nargs='?')
+    twap.add_argument('--vwap', action='store_true', help="Size slices from the historical volume profile")
+    twap.add_argument('--smart', action='store_true', help="Route each slice across the depth book")
+
+    grid = commands.add_parser('grid', help="Grid of limit orders between two prices")
+    grid.add_argument('symbol', type=str.upper)
+    grid.add_argument('lower_price', type=_positive)
+    grid.add_argument('upper_price', type=_positive)
+    grid.add_argument('num_grids', type=int)
+    grid.add_argument('quantity_per_grid', type=_positive)
+    grid.add_argument('--stream', action='store_true')
+    grid.add_argument('--batch', action='store_true', dest='batch_orders',
+                      help="Place the ladder through batchOrders")
+    grid.add_argument('--recenter', action='store_true')
+
+    trailing = _add_order(commands, 'trailing', "Trailing stop for an open position (side of the position)",
+                          'trail_percent')
+    trailing.add_argument('take_profit_price', type=_positive, nargs='?')
+    trailing.add_argument('threshold_percent', type=_positive, nargs='?')
+
+    runtime = commands.add_parser('runtime', help="Run the strategies of a config file in one process")
+    runtime.add_argument('config')
+    daemon = commands.add_parser('daemon', help="Keep a warm client behind a Unix socket (BINANCE_BOT_SOCKET)")
+    daemon.add_argument('socket', nargs='?')
+    return parser
+
+
+def order_params(args):
+    """futures_create_order params of a parsed market, limit or stop-limit command."""
+    params = {'symbol': args.symbol, 'side': args.side, 'quantity': args.quantity}
+    if args.command == 'market':
+        params['type'] = 'MARKET'
+    elif args.command == 'limit':
+        params.update(type='LIMIT', timeInForce='GTC', price=args.price)
+    else:
+        params.update(type='STOP', timeInForce='GTC', price=args.limit_price, stopPrice=args.stop_price)
+    return params
+
+
+def read_batch(path):
+    """Parses a batch file into [(line number, order params)]. Raises UsageError naming the first bad line."""
+    parser = build_parser(_BatchParser)
+    with (sys.stdin if path == '-' else open(path)) as f:
+        lines = f.read().splitlines()
+    orders = []
+    for number, line in enumerate(lines, 1):
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        try:
+            args = parser.parse_args(shlex.split(line))
+            if args.command is None:
+                raise UsageError(f"expected one of: {', '.join(BATCH_COMMANDS)}")
+            if getattr(args, 'smart', False):
+                raise UsageError("--smart orders cannot be batched")
+        except (UsageError, ValueError) as e:
+            raise UsageError(f"{path}:{number}: {e}") from None
+        orders.append((number, order_params(args)))
+    return orders
+
+
+def _credentials(daemon_ok=False):
+    api_key = os.getenv("BINANCE_API_KEY")
+    api_secret = os.getenv("BINANCE_API_SECRET")
+    if not (daemon_ok and os.getenv("BINANCE_BOT_SOCKET")) and (not api_key or not api_secret):
+        logging.error("BINANCE_API_KEY and BINANCE_API_SECRET environment variables must be set.")
+        sys.exit(1)
+    return api_key, api_secret
+
+
+def _bot(api_key, api_secret):
+    sys.path.append(REPO_ROOT)
+    from src.bot_client import BasicBot
+    try:
+        return BasicBot(api_key, api_secret, testnet=True)
+    except Exception as e:
+        logging.error(f"Failed to initialize Binance client: {e}")
+        sys.exit(1)
+
+
+def _log_order(order):
+    logging.info("Order placed successfully! ")
+    logging.info(f"  - Order ID: {order.get('orderId')}")
+    logging.info(f"  - Symbol: {order.get('symbol')}")
+    logging.info(f"  - Side: {order.get('side')}")
+    logging.info(f"  - Type: {order.get('type')}")
+    logging.info(f"  - Status: {order.get('status')}")
+    if order.get('type') != 'MARKET':
+        logging.info(f"  - Price: {order.get('price')}")
+    if order.get('type') == 'STOP':
+        logging.info(f"  - Stop Price: {order.get('stopPrice')}")
+    logging.info(f"  - Original Quantity: {order.get('origQty')}")
+    logging.info(f"  - Executed Quantity: {order.get('executedQty')}")
+
+
+def place_order(args):
+    """market, limit and stop-limit: one order, through the daemon when BINANCE_BOT_SOCKET is set."""
+    if args.accounts:
+        return fan_out(args)
+    api_key, api_secret = _credentials(daemon_ok=not getattr(args, 'smart', False))
+    daemon_socket = os.getenv("BINANCE_BOT_SOCKET")
+    params = order_params(args)
+    if daemon_socket and not getattr(args, 'smart', False):
+        # The daemon rounds to the symbol filters itself, and this process never imports python-binance.
+        sys.path.append(REPO_ROOT)
+        from src.bot_daemon import send_command, DaemonCommandError
+        logging.info(f"Placing a {params['type']} {args.side} order for {args.quantity} {args.symbol}")
+        try:
+            _log_order(send_command('futures_create_order', daemon_socket, **params))
+        except DaemonCommandError as e:
+            logging.error(f"Bot Daemon Error (Code {e.code}): {e.message}")
+            sys.exit(1)
+        except OSError as e:
+            logging.error(f"Bot daemon unreachable at {daemon_socket}: {e}")
+            sys.exit(1)
+        return
+
+    bot = _bot(api_key, api_secret)
+    from binance.exceptions import BinanceAPIException, BinanceRequestException
+    from src.symbol_filters import FilterError
+    try:
+        if getattr(args, 'smart', False):
+            import asyncio
+            from src.order_router import route_order
+            logging.info(f"Routing a MARKET {args.side} order for {args.quantity} {args.symbol} across the book")
+            report = asyncio.run(route_order(bot.client, bot.stream_url, args.symbol, args.side, args.quantity))
+            for child in report['children']:
+                logging.info(f"  - Child {child['order_id']} (round {child['round']}): "
+                             f"{child['executed']}/{child['quantity']} at {child['price'] or 'MARKET'}, {child['status']}")
+            logging.info(f"  - Executed Quantity: {report['executed']} of {report['requested']}")
+            logging.info(f"  - Average Price: {report['avg_price']} (mid {report['mid']}, "
+                         f"slippage {report['slippage_bps']} bps)")
+            return
+        logging.info(f"Placing a {params['type']} {args.side} order for {args.quantity} {args.symbol}")
+        _log_order(bot.client.futures_create_order(**bot.filters.prepare_order(params)))
+    except BinanceAPIException as e:
+        logging.error(f"Binance API Error (Code {e.code}): {e.message}")
+        sys.exit(1)
+    except BinanceRequestException as e:
+        logging.error(f"Binance Request Error: {e.message}")
+        sys.exit(1)
+    except FilterError as e:
+        logging.error(f"Order rejected before sending: {e}")
+        sys.exit(1)
+
+
+def fan_out(args):
+    """--accounts: the order on every keyring account, with per-account quantity scaling and latency."""
+    if getattr(args, 'smart', False):
+        logging.error("--smart routes one account's order; it cannot be combined with --accounts.")
+        sys.exit(1)
+    sys.path.append(REPO_ROOT)
+    from src.accounts import AccountPool
+    try:
+        pool = AccountPool.from_keyring(args.accounts)
+    except (OSError, ValueError) as e:
+        logging.error(f"Invalid keyring: {e}")
+        sys.exit(1)
+    try:
+        report = pool.place_order(order_params(args))
+    finally:
+        pool.close()
+    for result in report['results']:
+        if 'error' in result:
+            logging.error(f"  - {result['account']}: {result['quantity']} failed (Code {result['code']}): "
+                          f"{result['error']} ({result['latency_ms']:.1f} ms)")
+        else:
+            logging.info(f"  - {result['account']}: {result['quantity']} {result['status']}, "
+                         f"Order ID: {result['order_id']} ({result['latency_ms']:.1f} ms)")
+    if report['failed']:
+        sys.exit(1)
+
+
+def run_batch(path):
+    """--batch: validates every line first, then places the orders through one client. Returns the failure count."""
+    try:
+        orders = read_batch(path)
+    except (UsageError, OSError) as e:
+        logging.error(f"Invalid batch file: {e}")
+        sys.exit(2)
+    if not orders:
+        logging.info(f"No orders in {path}.")
+        return 0
+    api_key, api_secret = _credentials(daemon_ok=True)
+    daemon_socket = os.getenv("BINANCE_BOT_SOCKET")
+    started = time.perf_counter()
+    results = {}  # line number -> order or {'code', 'msg'}
+    if daemon_socket:
+        from concurrent.futures import ThreadPoolExecutor
+        sys.path.append(REPO_ROOT)
+        from src.bot_daemon import send_command, DaemonCommandError
+
+        def send(params):
+            try:
+                return send_command('futures_create_order', daemon_socket, **params)
+            except DaemonCommandError as e:
+                return {'code': e.code, 'msg': e.message}
+            except OSError as e:
+                return {'code': None, 'msg': f"daemon unreachable: {e}"}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for (number, _), result in zip(orders, pool.map(send, [params for _, params in orders])):
+                results[number] = result
+    else:
+        import asyncio
+        bot = _bot(api_key, api_secret)
+        from src.batch_orders import place_orders_batched
+        from src.symbol_filters import FilterError
+        prepared = []
+        for number, params in orders:
+            try:
+                prepared.append((number, bot.filters.prepare_order(params)))
+            except FilterError as e:
+                results[number] = {'code': None, 'msg': f"rejected before sending: {e}"}
+
+        async def main():
+            async_client = await bot.create_async_client()
+            try:
+                return await place_orders_batched(async_client, [params for _, params in prepared])
+            finally:
+                await async_client.close_connection()
+
+        if prepared:
+            for (number, _), result in zip(prepared, asyncio.run(main())):
+                results[number] = result
+
+    failed = 0
+    for number, params in orders:
+        result = results[number]
+        if 'orderId' in result:
+            logging.info(f"{path}:{number}: {params['type']} {params['side']} {params['quantity']} {params['symbol']} "
+                         f"placed. Order ID: {result['orderId']}, status {result.get('status')}")
+        else:
+            failed += 1
+            logging.error(f"{path}:{number}: {params['type']} {params['side']} {params['quantity']} "
+                          f"{params['symbol']} failed (Code {result.get('code')}): {result.get('msg')}")
+    logging.info(f"Placed {len(orders) - failed} of {len(orders)} orders in "
+                 f"{(time.perf_counter() - started) * 1000:.0f} ms.")
+    return failed
+
+
+def run_script(name, argv):
+    """Hands already-validated arguments to one of the strategy scripts in src/advanced/."""
+    sys.argv = [os.path.join(ADVANCED_DIR, name)] + [str(arg) for arg in argv]
+    runpy.run_path(sys.argv[0], run_name='__main__')
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.accounts and (args.batch or args.command not in BATCH_COMMANDS):
+        build_parser().error("--accounts works with the market, limit and stop-limit commands")
+    if args.batch and args.command:
+        build_parser().error("--batch takes its orders from the file; give no command")
+    if not args.batch and not args.command:
+        build_parser().error("a command or --batch is required")
+
+    sys.path.append(REPO_ROOT)
+    if args.batch or args.command in BATCH_COMMANDS:
+        # The strategy scripts and the runtime set up their own logging.
+        from src.bot_logging import setup_logging
+        setup_logging()
+    if args.batch:
+        sys.exit(1 if run_batch(args.batch) else 0)
+    if args.command in BATCH_COMMANDS:
+        place_order(args)
+    elif args.command == 'oco':
+        run_script('oco.py', [args.symbol, args.side, args.quantity, args.take_profit_price, args.stop_loss_price]
+                   + (['--stream'] if args.stream else []))
+    elif args.command == 'twap':
+        run_script('twap.py', [args.symbol, args.side, args.quantity, args.duration_minutes]
+                   + ([args.slices] if args.slices else [])
+                   + (['--vwap'] if args.vwap else []) + (['--smart'] if args.smart else []))
+    elif args.command == 'grid':
+        run_script('grid_orders.py', [args.symbol, args.lower_price, args.upper_price, args.num_grids,
+                                      args.quantity_per_grid]
+                   + [flag for flag, on in (('--stream', args.stream), ('--batch', args.batch_orders),
+                                            ('--recenter', args.recenter)) if on])
+    elif args.command == 'trailing':
+        run_script('trailing_stop.py', [args.symbol, args.side, args.quantity, args.trail_percent]
+                   + ([args.take_profit_price or '-'] if args.take_profit_price or args.threshold_percent else [])
+                   + ([args.threshold_percent] if args.threshold_percent else []))
+    elif args.command == 'runtime':
+        from src import runtime
+        sys.argv = ['runtime', args.config]
+        runtime.main()
+    elif args.command == 'daemon':
+        from src import bot_daemon
+        sys.argv = ['bot_daemon'] + ([args.socket] if args.socket else [])
+        bot_daemon.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# src/depth_book.py
+
+import asyncio
+import heapq
+import json
+import logging
+import time
+from decimal import Decimal
+
+import websockets
+
+SNAPSHOT_LIMIT = 1000
+DEPTH_SPEED = '100ms'
+
+
+class DepthBook:
+    """Local L2 book of one symbol: a REST snapshot kept current from the <symbol>@depth diff stream.
+
+    Follows the exchange's recipe: events are buffered while the snapshot is
+    fetched, those older than its lastUpdateId are dropped, the first one
+    applied must span it (or start right after it), and every later event
+    must carry the previous one's u as its pu. A gap, or a reconnect, throws
+    the book away and takes a new snapshot. Levels map Decimal price -> Decimal quantity; all updates run on
+    the event loop that runs run(), so readers on that loop never see a
+    half-applied event.
+    """
+
+    def __init__(self, client, stream_url, symbol, snapshot_limit=SNAPSHOT_LIMIT, speed=DEPTH_SPEED,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        self.client = client
+        self.symbol = symbol
+        self.url = f"{stream_url.rstrip('/')}/ws/{symbol.lower()}@depth@{speed}"
+        self.snapshot_limit = snapshot_limit
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.bids = {}
+        self.asks = {}
+        self.last_update_id = None
+        self.updated_at = 0.0  # time.monotonic() of the last applied event
+        self.synced = asyncio.Event()
+        self._change_waiters = set()  # one Event per wait_changed() call, so no waiter clears another's
+        self.resyncs = 0
+        self._buffer = None
+        self._first = False
+        self._sync_task = None
+        self._running = False
+        self._ws = None
+
+    # --- Reads ---
+    def best_bid(self):
+        return max(self.bids) if self.bids else None
+
+    def best_ask(self):
+        return min(self.asks) if self.asks else None
+
+    def mid(self):
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def levels(self, side, depth):
+        """The best depth [price, quantity] levels of 'BUY' (bids, descending) or 'SELL' (asks, ascending)."""
+        if side == 'BUY':
+            return [[price, self.bids[price]] for price in heapq.nlargest(depth, self.bids)]
+        return [[price, self.asks[price]] for price in heapq.nsmallest(depth, self.asks)]
+
+    async def wait_changed(self, timeout, since=None):
+        """Waits up to timeout seconds for an applied event after update ID since (default: from now).
+
+        Returns True if the book has moved on.
+        """
+        if since is not None and self.last_update_id != since:
+            return True
+        changed = asyncio.Event()
+        self._change_waiters.add(changed)
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._change_waiters.discard(changed)
+        return True
+
+    # --- Stream ---
+    async def run(self):
+        """Maintains the book until stop() is called, resyncing after gaps and reconnects."""
+        self._running = True
+        delay = self.reconnect_delay
+        while self._running:
+            try:
+                async with websockets.connect(self.url) as ws:
+                    self._ws = ws
+                    delay = self.reconnect_delay
+                    self._resync()
+                    try:
+                        async for message in ws:
+                            self._on_event(json.loads(message))
+                    finally:
+                        self._ws = None
+                        self._desync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Depth stream error for {self.symbol}: {e}")
+
+            if self._running:
+                logging.warning(f"Depth stream disconnected. Reconnecting in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def stop(self):
+        self._running = False
+        self._desync()
+        if self._ws is not None:
+            await self._ws.close()
+
+    def _on_event(self, event):
+        if self._buffer is not None:
+            self._buffer.append(event)
+        elif not self._apply(event):
+            self.resyncs += 1
+            logging.warning("Depth book for %s out of sequence (pu %s after u %s). Resyncing.",
+                            self.symbol, event.get('pu'), self.last_update_id, extra={'symbol': self.symbol})
+            self._resync()
+
+    def _desync(self):
+        self.synced.clear()
+        self.last_update_id = None
+        self._buffer = None
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+
+    def _resync(self):
+        self._desync()
+        self._buffer = []
+        self._sync_task = asyncio.create_task(self._load_snapshot())
+
+    async def _load_snapshot(self):
+        started = time.perf_counter()
+        try:
+            snapshot = await asyncio.to_thread(self.client.futures_order_book, symbol=self.symbol,
+                                               limit=self.snapshot_limit)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Depth snapshot for {self.symbol} failed: {e}")
+            # Closing the socket brings run() back round to a reconnect and a new snapshot.
+            if self._ws is not None:
+                await self._ws.close()
+            return
+        self.bids = {Decimal(price): Decimal(qty) for price, qty in snapshot['bids']}
+        self.asks = {Decimal(price): Decimal(qty) for price, qty in snapshot['asks']}
+        self.last_update_id = snapshot['lastUpdateId']
+        self._first = True
+        buffered, self._buffer = self._buffer or [], None
+        self._sync_task = None
+        for event in buffered:
+            if not self._apply(event):
+                self.resyncs += 1
+                logging.warning("Depth snapshot for %s does not line up with the stream. Resyncing.", self.symbol,
+                                extra={'symbol': self.symbol})
+                self._resync()
+                return
+        self.synced.set()
+        logging.debug("Depth book for %s synced at update %s in %.1f ms (%d buffered events).", self.symbol,
+                      self.last_update_id, (time.perf_counter() - started) * 1000, len(buffered))
+
+    def _apply(self, event):
+        """Applies one diff if it follows the book. Returns False on a sequence gap."""
+        first, last = event['U'], event['u']
+        if last < self.last_update_id:
+            return True  # already in the snapshot
+        if self._first:
+            # The first event must span the snapshot or follow straight on from it.
+            if first > self.last_update_id + 1:
+                return False
+            self._first = False
+        elif event.get('pu') != self.last_update_id:
+            return False
+        for levels, updates in ((self.bids, event['b']), (self.asks, event['a'])):
+            for price, qty in updates:
+                qty = Decimal(qty)
+                if qty:
+                    levels[Decimal(price)] = qty
+                else:
+                    levels.pop(Decimal(price), None)
+        self.last_update_id = last
+        self.updated_at = time.monotonic()
+        for changed in self._change_waiters:
+            changed.set()
+        return True
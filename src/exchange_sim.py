@@ -0,0 +1,1062 @@
+# src/exchange_sim.py
+#
+# Local stand-in for the Binance USD-M futures API, for offline load and
+# latency testing. Point BasicBot at it with base_url (or BINANCE_BASE_URL).
+#
+# Usage: python src/exchange_sim.py [--port 8900] [--latency-ms 0] [--jitter-ms 0] [--weight-limit 2400]
+#                                    [--order-limit-10s 300] [--order-limit-1m 1200] [--price BTCUSDT=60000 ...]
+#
+# Orders rest in a price-time priority book per symbol and match against each
+# other. Any remainder that still crosses the last traded price fills against
+# synthetic liquidity at that price, so market orders always execute. Resting
+# orders fill when the simulated market trades through them (POST /sim/trade).
+# Every trade is also published on the <symbol>@aggTrade market stream, book
+# and price changes on <symbol>@bookTicker, <symbol>@depth (diffs sequenced
+# against /fapi/v1/depth's lastUpdateId) and <symbol>@markPrice (single
+# streams under /ws/, combined ones under /stream?streams=), and
+# /fapi/v1/klines serves a synthetic intraday volume profile.
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from decimal import Decimal, InvalidOperation
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+DEFAULT_SYMBOLS = {
+    'BTCUSDT': {'price': '60000', 'tick_size': '0.10', 'step_size': '0.001', 'min_notional': '100'},
+    'ETHUSDT': {'price': '3000', 'tick_size': '0.01', 'step_size': '0.001', 'min_notional': '20'},
+}
+
+# Request weights of the endpoints the bot uses (unlisted endpoints cost 1).
+ENDPOINT_WEIGHTS = {
+    ('GET', 'exchangeInfo'): 1,
+    ('GET', 'depth'): 5,
+    ('GET', 'openOrders'): 1,
+    ('GET', 'allOrders'): 5,
+    ('GET', 'positionRisk'): 5,
+    ('POST', 'batchOrders'): 5,
+    ('DELETE', 'batchOrders'): 1,
+    ('DELETE', 'allOpenOrders'): 1,
+}
+ORDER_ENDPOINTS = {('POST', 'order'), ('PUT', 'order'), ('POST', 'batchOrders')}
+
+KLINE_MINUTES = {'1m': 1, '3m': 3, '5m': 5, '15m': 15, '30m': 30, '1h': 60, '4h': 240, '1d': 1440}
+
+STOP_TYPES = {'STOP', 'STOP_MARKET', 'TAKE_PROFIT', 'TAKE_PROFIT_MARKET'}
+OPEN_STATUSES = {'NEW', 'PARTIALLY_FILLED'}
+ZERO = Decimal(0)
+
+
+class SimError(Exception):
+    """An error returned to the caller in Binance's {'code', 'msg'} format."""
+
+    def __init__(self, code, msg, status=400):
+        super().__init__(msg)
+        self.code = code
+        self.msg = msg
+        self.status = status
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def parse_decimal(params, name, required=True):
+    value = params.get(name)
+    if value is None:
+        if required:
+            raise SimError(-1102, f"Mandatory parameter '{name}' was not sent, was empty/null, or malformed.")
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        raise SimError(-1100, f"Illegal characters found in parameter '{name}'.")
+
+
+# --- Order book ---
+class SimOrder:
+    __slots__ = ('order_id', 'client_order_id', 'account', 'symbol', 'side', 'type', 'time_in_force',
+                 'price', 'stop_price', 'quantity', 'executed', 'cum_quote', 'status', 'reduce_only',
+                 'triggered', 'time', 'update_time', 'seq')
+
+    def to_dict(self):
+        avg_price = self.cum_quote / self.executed if self.executed else ZERO
+        return {
+            'orderId': self.order_id,
+            'symbol': self.symbol,
+            'status': self.status,
+            'clientOrderId': self.client_order_id,
+            'price': str(self.price or ZERO),
+            'avgPrice': str(avg_price),
+            'origQty': str(self.quantity),
+            'executedQty': str(self.executed),
+            'cumQuote': str(self.cum_quote),
+            'timeInForce': self.time_in_force,
+            'type': self.type,
+            'origType': self.type,
+            'reduceOnly': self.reduce_only,
+            'closePosition': False,
+            'side': self.side,
+            'positionSide': 'BOTH',
+            'stopPrice': str(self.stop_price or ZERO),
+            'workingType': 'CONTRACT_PRICE',
+            'priceProtect': False,
+            'time': self.time,
+            'updateTime': self.update_time,
+        }
+
+    @property
+    def remaining(self):
+        return self.quantity - self.executed
+
+
+class OrderBook:
+    """Price-time priority book: one FIFO queue per price level."""
+
+    def __init__(self):
+        self.levels = {'BUY': {}, 'SELL': {}}
+        self.prices = {'BUY': [], 'SELL': []}  # ascending
+        self.update_id = 0
+
+    def add(self, order):
+        levels = self.levels[order.side]
+        queue = levels.get(order.price)
+        if queue is None:
+            queue = levels[order.price] = deque()
+            bisect.insort(self.prices[order.side], order.price)
+        queue.append(order)
+        self.update_id += 1
+
+    def remove(self, order):
+        levels = self.levels[order.side]
+        queue = levels.get(order.price)
+        if queue is None:
+            return
+        try:
+            queue.remove(order)
+        except ValueError:
+            return
+        if not queue:
+            del levels[order.price]
+            prices = self.prices[order.side]
+            del prices[bisect.bisect_left(prices, order.price)]
+        self.update_id += 1
+
+    def best(self, side):
+        prices = self.prices[side]
+        if not prices:
+            return None
+        return prices[-1] if side == 'BUY' else prices[0]
+
+    def makers(self, taker_side, limit_price):
+        """Yields resting orders that cross a taker, best price first, oldest first within a level."""
+        maker_side = 'SELL' if taker_side == 'BUY' else 'BUY'
+        while True:
+            best = self.best(maker_side)
+            if best is None:
+                return
+            if limit_price is not None:
+                if taker_side == 'BUY' and best > limit_price:
+                    return
+                if taker_side == 'SELL' and best < limit_price:
+                    return
+            yield self.levels[maker_side][best][0]
+
+    def level_quantities(self):
+        """{(side, price): total remaining quantity as a string} over every level."""
+        return {(side, price): str(sum(o.remaining for o in queue))
+                for side in ('BUY', 'SELL') for price, queue in self.levels[side].items()}
+
+    def depth(self, side, limit):
+        prices = self.prices[side]
+        selected = reversed(prices[-limit:]) if side == 'BUY' else prices[:limit]
+        return [[str(price), str(sum(o.remaining for o in self.levels[side][price]))] for price in selected]
+
+
+# --- Accounts ---
+class Account:
+    __slots__ = ('api_key', 'secret', 'positions', 'subscribers', 'order_window', 'orders_10s', 'orders_1m')
+
+    def __init__(self, api_key, secret=None):
+        self.api_key = api_key
+        self.secret = secret
+        self.positions = {}  # symbol -> [amount, entry_price, realized_pnl]
+        self.subscribers = set()  # asyncio.Queue per open user-data socket
+        self.order_window = (0, 0)
+        self.orders_10s = 0
+        self.orders_1m = 0
+
+    def publish(self, event):
+        if self.subscribers:
+            message = json.dumps(event)
+            for queue in self.subscribers:
+                queue.put_nowait(message)
+
+
+class ExchangeSimulator:
+    """Matching engine and account state behind the simulated REST/WebSocket API.
+
+    latency/jitter are in seconds and applied to every REST request. error_rules
+    is a list of {'method', 'path', 'rate', 'code', 'msg', 'status'} dicts; a
+    matching request fails with that error with probability 'rate'. Passing
+    accounts ({api_key: secret}) enables HMAC signature checks for those keys.
+    clock returns the current time in epoch ms (default: the wall clock), so a
+    replay can run the simulator on historical time.
+    """
+
+    def __init__(self, symbols=None, latency=0.0, jitter=0.0, weight_limit=2400,
+                 order_limit_10s=300, order_limit_1m=1200, error_rules=None, accounts=None,
+                 synthetic_liquidity=True, seed=None, clock=None):
+        self.clock = clock or now_ms
+        self.symbols = {}
+        self.books = {}
+        self.last_prices = {}
+        self.stops = {}
+        for symbol, spec in (symbols or DEFAULT_SYMBOLS).items():
+            self.add_symbol(symbol, **spec)
+        self.latency = latency
+        self.jitter = jitter
+        self.weight_limit = weight_limit
+        self.order_limit_10s = order_limit_10s
+        self.order_limit_1m = order_limit_1m
+        self.error_rules = list(error_rules or [])
+        self.synthetic_liquidity = synthetic_liquidity
+        self.random = random.Random(seed)
+
+        self.accounts = {key: Account(key, secret) for key, secret in (accounts or {}).items()}
+        self.verify_signatures = bool(accounts)
+        self.listen_keys = {}  # listenKey -> Account
+        self.market_subscribers = {}  # stream name, e.g. 'btcusdt@aggtrade' -> set of asyncio.Queue
+        self.published_depth = {}  # symbol -> (update ID, {(side, price): quantity}) last sent on the depth stream
+        self.orders = {}  # orderId -> SimOrder
+        self.client_ids = {}  # (api_key, clientOrderId) -> SimOrder
+        self.order_ids = itertools.count(1)
+        self.trade_ids = itertools.count(1)
+        self.sequence = itertools.count()
+        self.weight_window = 0
+        self.used_weight = 0
+        self.stats = {'requests': 0, 'orders': 0, 'fills': 0, 'rejected': 0}
+
+    def add_symbol(self, symbol, price, tick_size='0.01', step_size='0.001', min_notional='5'):
+        self.symbols[symbol] = {
+            'tick_size': Decimal(tick_size),
+            'step_size': Decimal(step_size),
+            'min_notional': Decimal(min_notional),
+        }
+        self.books[symbol] = OrderBook()
+        self.last_prices[symbol] = Decimal(str(price))
+        self.stops[symbol] = []
+
+    def account(self, api_key):
+        account = self.accounts.get(api_key)
+        if account is None:
+            if self.verify_signatures:
+                raise SimError(-2015, "Invalid API-key, IP, or permissions for action.", 401)
+            account = self.accounts[api_key] = Account(api_key)
+        return account
+
+    # --- Order entry ---
+    def new_order(self, account, params):
+        symbol = self._symbol(params)
+        side = params.get('side')
+        if side not in ('BUY', 'SELL'):
+            raise SimError(-1102, "Mandatory parameter 'side' was not sent, was empty/null, or malformed.")
+        order_type = params.get('type')
+        if order_type not in ('LIMIT', 'MARKET') and order_type not in STOP_TYPES:
+            raise SimError(-1116, "Invalid orderType.")
+
+        quantity = parse_decimal(params, 'quantity')
+        needs_price = order_type in ('LIMIT', 'STOP', 'TAKE_PROFIT')
+        price = parse_decimal(params, 'price', required=needs_price) if needs_price else None
+        stop_price = parse_decimal(params, 'stopPrice') if order_type in STOP_TYPES else None
+        self._check_filters(symbol, quantity, price if price is not None else self.last_prices[symbol],
+                            check_price=price is not None)
+        if stop_price is not None:
+            self._check_tick(symbol, stop_price)
+
+        client_order_id = params.get('newClientOrderId') or f"sim-{uuid.uuid4().hex[:22]}"
+        if (account.api_key, client_order_id) in self.client_ids:
+            existing = self.client_ids[(account.api_key, client_order_id)]
+            if existing.status in OPEN_STATUSES:
+                raise SimError(-4116, "ClientOrderId is duplicated.")
+
+        order = SimOrder()
+        order.order_id = next(self.order_ids)
+        order.client_order_id = client_order_id
+        order.account = account
+        order.symbol = symbol
+        order.side = side
+        order.type = order_type
+        order.time_in_force = params.get('timeInForce', 'GTC') if needs_price else 'GTC'
+        order.price = price
+        order.stop_price = stop_price
+        order.quantity = quantity
+        order.executed = ZERO
+        order.cum_quote = ZERO
+        order.status = 'NEW'
+        order.reduce_only = str(params.get('reduceOnly', 'false')).lower() == 'true'
+        order.triggered = False
+        order.time = order.update_time = self.clock()
+        order.seq = next(self.sequence)
+
+        self.orders[order.order_id] = order
+        self.client_ids[(account.api_key, client_order_id)] = order
+        self.stats['orders'] += 1
+        self._order_event(order, 'NEW')
+
+        if order_type in STOP_TYPES:
+            self.stops[symbol].append(order)
+            self._check_stops(symbol)
+        else:
+            self._execute(order)
+        return order
+
+    def cancel_order(self, account, params):
+        order = self.find_order(account, params)
+        if order.status not in OPEN_STATUSES:
+            raise SimError(-2011, "Unknown order sent.")
+        self._close(order, 'CANCELED')
+        return order
+
+    def cancel_all(self, account, symbol):
+        for order in list(self.orders.values()):
+            if order.account is account and order.symbol == symbol and order.status in OPEN_STATUSES:
+                self._close(order, 'CANCELED')
+
+    def modify_order(self, account, params):
+        """Amends price/quantity of a resting LIMIT order, keeping its orderId."""
+        order = self.find_order(account, params)
+        if order.status not in OPEN_STATUSES:
+            raise SimError(-2013, "Order does not exist.")
+        if order.type != 'LIMIT':
+            raise SimError(-4028, "Only LIMIT orders can be modified.")
+        quantity = parse_decimal(params, 'quantity')
+        price = parse_decimal(params, 'price')
+        self._check_filters(order.symbol, quantity, price)
+        if quantity <= order.executed:
+            raise SimError(-4029, "Quantity less than or equal to executed quantity.")
+
+        book = self.books[order.symbol]
+        # Priority is lost when the price changes or the quantity increases.
+        lose_priority = price != order.price or quantity > order.quantity
+        if lose_priority:
+            book.remove(order)
+        order.price = price
+        order.quantity = quantity
+        order.update_time = self.clock()
+        self._order_event(order, 'AMENDMENT')
+        if lose_priority:
+            order.seq = next(self.sequence)
+            self._execute(order)
+        else:
+            book.update_id += 1
+            self._publish_market(order.symbol)
+        return order
+
+    def find_order(self, account, params):
+        self._symbol(params)
+        order = None
+        if params.get('orderId') is not None:
+            try:
+                order = self.orders.get(int(params['orderId']))
+            except ValueError:
+                raise SimError(-1100, "Illegal characters found in parameter 'orderId'.")
+        elif params.get('origClientOrderId'):
+            order = self.client_ids.get((account.api_key, params['origClientOrderId']))
+        else:
+            raise SimError(-1102, "Either orderId or origClientOrderId must be sent.")
+        if order is None or order.account is not account:
+            raise SimError(-2013, "Order does not exist.")
+        return order
+
+    def open_orders(self, account, symbol=None):
+        return [o for o in self.orders.values()
+                if o.account is account and o.status in OPEN_STATUSES and (symbol is None or o.symbol == symbol)]
+
+    # --- Market simulation ---
+    def trade(self, symbol, price, quantity=None):
+        """Simulates an external trade: fills resting orders the price trades through, then fires stops."""
+        if symbol not in self.symbols:
+            raise SimError(-1121, "Invalid symbol.")
+        price = Decimal(str(price))
+        remaining = Decimal(str(quantity)) if quantity is not None else None
+        book = self.books[symbol]
+        self.last_prices[symbol] = price
+
+        filled = ZERO
+        for taker_side in ('BUY', 'SELL'):
+            for maker in book.makers(taker_side, price):
+                qty = maker.remaining if remaining is None else min(maker.remaining, remaining)
+                if qty <= 0:
+                    break
+                self._fill(maker, qty, maker.price, is_maker=True)
+                filled += qty
+                if maker.remaining == 0:
+                    book.remove(maker)
+                else:
+                    book.update_id += 1
+                if remaining is not None:
+                    remaining -= qty
+        volume = Decimal(str(quantity)) if quantity is not None else filled
+        if volume > 0:
+            self._publish_trade(symbol, price, volume, buyer_is_maker=False)
+        self._check_stops(symbol)
+        self._publish_market(symbol)
+
+    def klines(self, symbol, interval='1m', start_time=None, end_time=None, limit=500):
+        """Synthetic candles at the last price, with more volume around the daily open and close."""
+        if interval not in KLINE_MINUTES:
+            raise SimError(-1120, "Invalid interval.")
+        step = KLINE_MINUTES[interval] * 60000
+        limit = min(int(limit), 1500)
+        if start_time is not None:
+            first = -(-int(start_time) // step) * step
+        else:
+            last = (int(end_time) if end_time is not None else self.clock()) // step * step
+            first = last - (limit - 1) * step
+        price = str(self.last_prices[symbol])
+        candles = []
+        for open_time in range(first, first + limit * step, step):
+            if end_time is not None and open_time > int(end_time):
+                break
+            minute_of_day = open_time // 60000 % 1440
+            volume = 10 * KLINE_MINUTES[interval] * (1.5 + math.cos(2 * math.pi * minute_of_day / 1440))
+            volume = f"{volume * random.Random(open_time).uniform(0.8, 1.2):.3f}"
+            candles.append([open_time, price, price, price, price, volume, open_time + step - 1,
+                            '0', 0, '0', '0', '0'])
+        return candles
+
+    def _execute(self, order):
+        book = self.books[order.symbol]
+        limit_price = order.price if order.type in ('LIMIT', 'STOP', 'TAKE_PROFIT') else None
+
+        if order.time_in_force == 'GTX' and self._crosses(order, limit_price):
+            self._close(order, 'EXPIRED')
+            return
+        if order.time_in_force == 'FOK' and self._available(order, limit_price) < order.quantity:
+            self._close(order, 'EXPIRED')
+            return
+
+        for maker in book.makers(order.side, limit_price):
+            if order.remaining == 0:
+                break
+            qty = min(order.remaining, maker.remaining)
+            self._fill(maker, qty, maker.price, is_maker=True)
+            self._fill(order, qty, maker.price, is_maker=False)
+            self._publish_trade(order.symbol, maker.price, qty, buyer_is_maker=order.side == 'SELL')
+            if maker.remaining == 0:
+                book.remove(maker)
+            else:
+                book.update_id += 1
+            self.last_prices[order.symbol] = maker.price
+
+        if order.remaining > 0 and self.synthetic_liquidity:
+            last = self.last_prices[order.symbol]
+            if limit_price is None or (order.side == 'BUY' and limit_price >= last) \
+                    or (order.side == 'SELL' and limit_price <= last):
+                self._publish_trade(order.symbol, last, order.remaining, buyer_is_maker=order.side == 'SELL')
+                self._fill(order, order.remaining, last, is_maker=False)
+
+        if order.remaining > 0:
+            if limit_price is None or order.time_in_force in ('IOC', 'FOK'):
+                self._close(order, 'EXPIRED')
+            else:
+                book.add(order)
+        self._check_stops(order.symbol)
+        self._publish_market(order.symbol)
+
+    def _crosses(self, order, limit_price):
+        opposite = self.books[order.symbol].best('SELL' if order.side == 'BUY' else 'BUY')
+        last = self.last_prices[order.symbol]
+        if order.side == 'BUY':
+            return (opposite is not None and opposite <= limit_price) or limit_price >= last
+        return (opposite is not None and opposite >= limit_price) or limit_price <= last
+
+    def _available(self, order, limit_price):
+        """Quantity a FOK order could take right now."""
+        last = self.last_prices[order.symbol]
+        if self.synthetic_liquidity and (limit_price is None or (order.side == 'BUY' and limit_price >= last)
+                                         or (order.side == 'SELL' and limit_price <= last)):
+            return order.quantity
+        book = self.books[order.symbol]
+        maker_side = 'SELL' if order.side == 'BUY' else 'BUY'
+        total = ZERO
+        for price in book.prices[maker_side]:
+            if limit_price is None or (order.side == 'BUY' and price <= limit_price) \
+                    or (order.side == 'SELL' and price >= limit_price):
+                total += sum(m.remaining for m in book.levels[maker_side][price])
+        return total
+
+    def _check_stops(self, symbol):
+        last = self.last_prices[symbol]
+        pending = self.stops[symbol]
+        if not pending:
+            return
+        fired = []
+        for order in pending:
+            if order.status not in OPEN_STATUSES:
+                fired.append(order)
+                continue
+            stop = order.stop_price
+            is_stop = order.type in ('STOP', 'STOP_MARKET')
+            rising = order.side == 'BUY' if is_stop else order.side == 'SELL'
+            if (rising and last >= stop) or (not rising and last <= stop):
+                fired.append(order)
+        # Taken off the list before any executes: an execution moves the price and checks the stops again.
+        for order in fired:
+            pending.remove(order)
+        for order in fired:
+            if order.status in OPEN_STATUSES:
+                order.triggered = True
+                self._execute(order)
+
+    def _fill(self, order, qty, price, is_maker):
+        order.executed += qty
+        order.cum_quote += qty * price
+        order.status = 'FILLED' if order.remaining == 0 else 'PARTIALLY_FILLED'
+        order.update_time = self.clock()
+        self.stats['fills'] += 1
+        realized = self._update_position(order, qty, price)
+        self._order_event(order, 'TRADE', last_qty=qty, last_price=price, is_maker=is_maker, realized=realized)
+
+    def _publish_trade(self, symbol, price, qty, buyer_is_maker):
+        subscribers = self.market_subscribers.get(f"{symbol.lower()}@aggtrade")
+        if subscribers:
+            trade_id, now = next(self.trade_ids), self.clock()
+            message = json.dumps({'e': 'aggTrade', 'E': now, 's': symbol, 'a': trade_id, 'p': str(price),
+                                  'q': str(qty), 'f': trade_id, 'l': trade_id, 'T': now, 'm': buyer_is_maker})
+            for queue in subscribers:
+                queue.put_nowait(message)
+
+    def _publish_market(self, symbol):
+        """Publishes the top of book and mark price (the last price here) to their market streams."""
+        name = symbol.lower()
+        book_subscribers = self.market_subscribers.get(f"{name}@bookticker")
+        mark_subscribers = [queue for stream in (f"{name}@markprice", f"{name}@markprice@1s")
+                            for queue in self.market_subscribers.get(stream, ())]
+        depth_subscribers = [queue for stream in (f"{name}@depth", f"{name}@depth@100ms", f"{name}@depth@250ms",
+                                                  f"{name}@depth@500ms")
+                             for queue in self.market_subscribers.get(stream, ())]
+        if depth_subscribers:
+            self._publish_depth(symbol, depth_subscribers)
+        if not book_subscribers and not mark_subscribers:
+            return
+        now, last = self.clock(), str(self.last_prices[symbol])
+        if book_subscribers:
+            book = self.books[symbol]
+            bid, ask = book.depth('BUY', 1), book.depth('SELL', 1)
+            message = json.dumps({'e': 'bookTicker', 'u': book.update_id, 'E': now, 'T': now, 's': symbol,
+                                  'b': bid[0][0] if bid else last, 'B': bid[0][1] if bid else '0',
+                                  'a': ask[0][0] if ask else last, 'A': ask[0][1] if ask else '0'})
+            for queue in book_subscribers:
+                queue.put_nowait(message)
+        if mark_subscribers:
+            message = json.dumps({'e': 'markPriceUpdate', 'E': now, 's': symbol, 'p': last, 'i': last,
+                                  'P': last, 'r': '0.00010000', 'T': (now // 28800000 + 1) * 28800000})
+            for queue in mark_subscribers:
+                queue.put_nowait(message)
+
+    def _publish_depth(self, symbol, subscribers):
+        """Sends the levels changed since the last depth event, numbered U..u with pu = the previous u."""
+        book = self.books[symbol]
+        last_id, last_levels = self.published_depth.get(symbol, (0, {}))
+        if book.update_id == last_id:
+            return
+        levels = book.level_quantities()
+        changed = {'BUY': [], 'SELL': []}
+        for key, qty in levels.items():
+            if last_levels.get(key) != qty:
+                changed[key[0]].append([str(key[1]), qty])
+        for key in last_levels.keys() - levels.keys():
+            changed[key[0]].append([str(key[1]), '0'])
+        self.published_depth[symbol] = (book.update_id, levels)
+        now = self.clock()
+        message = json.dumps({'e': 'depthUpdate', 'E': now, 'T': now, 's': symbol, 'U': last_id + 1,
+                              'u': book.update_id, 'pu': last_id, 'b': changed['BUY'], 'a': changed['SELL']})
+        for queue in subscribers:
+            queue.put_nowait(message)
+
+    def subscribe_market(self, name, queue):
+        """Adds a queue to a market stream. Depth diffs start from the book as it is now."""
+        symbol, _, kind = name.partition('@')
+        if kind.startswith('depth') and symbol.upper() in self.books:
+            book = self.books[symbol.upper()]
+            self.published_depth.setdefault(symbol.upper(), (book.update_id, book.level_quantities()))
+        self.market_subscribers.setdefault(name, set()).add(queue)
+
+    def _update_position(self, order, qty, price):
+        position = order.account.positions.setdefault(order.symbol, [ZERO, ZERO, ZERO])
+        amount, entry, _ = position
+        signed = qty if order.side == 'BUY' else -qty
+        realized = ZERO
+        if amount == 0 or (amount > 0) == (signed > 0):
+            new_amount = amount + signed
+            entry = (entry * abs(amount) + price * qty) / abs(new_amount)
+        else:
+            closed = min(abs(amount), qty)
+            realized = closed * (price - entry) * (1 if amount > 0 else -1)
+            new_amount = amount + signed
+            if new_amount == 0:
+                entry = ZERO
+            elif (new_amount > 0) != (amount > 0):
+                entry = price
+        position[0], position[1] = new_amount, entry
+        position[2] += realized
+        order.account.publish({
+            'e': 'ACCOUNT_UPDATE', 'E': self.clock(), 'T': order.update_time,
+            'a': {'m': 'ORDER', 'B': [], 'P': [{
+                's': order.symbol, 'pa': str(new_amount), 'ep': str(entry), 'cr': str(position[2]),
+                'up': str((self.last_prices[order.symbol] - entry) * new_amount), 'mt': 'cross',
+                'iw': '0', 'ps': 'BOTH',
+            }]},
+        })
+        return realized
+
+    def _close(self, order, status):
+        order.status = status
+        order.update_time = self.clock()
+        # Untriggered stops are not in the book; _check_stops drops them from its list.
+        if order.type not in STOP_TYPES or order.triggered:
+            self.books[order.symbol].remove(order)
+            self._publish_market(order.symbol)
+        self._order_event(order, 'CANCELED' if status == 'CANCELED' else 'EXPIRED')
+
+    def _order_event(self, order, execution_type, last_qty=ZERO, last_price=ZERO, is_maker=False, realized=ZERO):
+        if not order.account.subscribers:
+            return
+        avg_price = order.cum_quote / order.executed if order.executed else ZERO
+        order.account.publish({
+            'e': 'ORDER_TRADE_UPDATE', 'E': self.clock(), 'T': order.update_time,
+            'o': {
+                's': order.symbol, 'c': order.client_order_id, 'S': order.side, 'o': order.type,
+                'f': order.time_in_force, 'q': str(order.quantity), 'p': str(order.price or ZERO),
+                'ap': str(avg_price), 'sp': str(order.stop_price or ZERO), 'x': execution_type,
+                'X': order.status, 'i': order.order_id, 'l': str(last_qty), 'z': str(order.executed),
+                'L': str(last_price), 'n': '0', 'N': 'USDT', 'T': order.update_time,
+                't': next(self.trade_ids) if execution_type == 'TRADE' else 0,
+                'b': '0', 'a': '0', 'm': is_maker, 'R': order.reduce_only, 'wt': 'CONTRACT_PRICE',
+                'ot': order.type, 'ps': 'BOTH', 'cp': False, 'rp': str(realized),
+            },
+        })
+
+    # --- Validation ---
+    def _symbol(self, params):
+        symbol = params.get('symbol')
+        if not symbol:
+            raise SimError(-1102, "Mandatory parameter 'symbol' was not sent, was empty/null, or malformed.")
+        if symbol not in self.symbols:
+            raise SimError(-1121, "Invalid symbol.")
+        return symbol
+
+    def _check_tick(self, symbol, price):
+        if price <= 0 or price % self.symbols[symbol]['tick_size'] != 0:
+            raise SimError(-4014, "Price not increased by tick size.")
+
+    def _check_filters(self, symbol, quantity, price, check_price=True):
+        spec = self.symbols[symbol]
+        if check_price:
+            self._check_tick(symbol, price)
+        if quantity <= 0 or quantity % spec['step_size'] != 0:
+            raise SimError(-1111, "Precision is over the maximum defined for this asset.")
+        if quantity * price < spec['min_notional']:
+            raise SimError(-4164, f"Order's notional must be no smaller than {spec['min_notional']}.")
+
+    def exchange_info(self):
+        return {
+            'timezone': 'UTC',
+            'serverTime': self.clock(),
+            'rateLimits': [
+                {'rateLimitType': 'REQUEST_WEIGHT', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': self.weight_limit},
+                {'rateLimitType': 'ORDERS', 'interval': 'SECOND', 'intervalNum': 10, 'limit': self.order_limit_10s},
+                {'rateLimitType': 'ORDERS', 'interval': 'MINUTE', 'intervalNum': 1, 'limit': self.order_limit_1m},
+            ],
+            'symbols': [{
+                'symbol': symbol,
+                'status': 'TRADING',
+                'contractType': 'PERPETUAL',
+                'baseAsset': symbol[:-4],
+                'quoteAsset': 'USDT',
+                'pricePrecision': max(0, -spec['tick_size'].normalize().as_tuple().exponent),
+                'quantityPrecision': max(0, -spec['step_size'].normalize().as_tuple().exponent),
+                'filters': [
+                    {'filterType': 'PRICE_FILTER', 'minPrice': str(spec['tick_size']), 'maxPrice': '1000000',
+                     'tickSize': str(spec['tick_size'])},
+                    {'filterType': 'LOT_SIZE', 'minQty': str(spec['step_size']), 'maxQty': '1000',
+                     'stepSize': str(spec['step_size'])},
+                    {'filterType': 'MARKET_LOT_SIZE', 'minQty': str(spec['step_size']), 'maxQty': '120',
+                     'stepSize': str(spec['step_size'])},
+                    {'filterType': 'MIN_NOTIONAL', 'notional': str(spec['min_notional'])},
+                ],
+            } for symbol, spec in self.symbols.items()],
+        }
+
+    # --- Rate limits and injected faults ---
+    def charge(self, account, method, path):
+        """Applies request weight and order-count limits. Returns the headers to report."""
+        window = int(time.time() // 60)
+        if window != self.weight_window:
+            self.weight_window, self.used_weight = window, 0
+        self.used_weight += ENDPOINT_WEIGHTS.get((method, path), 1)
+        headers = {'X-MBX-USED-WEIGHT-1M': str(self.used_weight)}
+        if self.used_weight > self.weight_limit:
+            raise SimError(-1003, "Too many requests; current limit of IP is "
+                                  f"{self.weight_limit} requests per minute.", 429)
+
+        if account is not None and (method, path) in ORDER_ENDPOINTS:
+            now = time.time()
+            window_10s, window_1m = int(now // 10), int(now // 60)
+            if account.order_window[0] != window_10s:
+                account.orders_10s = 0
+            if account.order_window[1] != window_1m:
+                account.orders_1m = 0
+            account.order_window = (window_10s, window_1m)
+            account.orders_10s += 1
+            account.orders_1m += 1
+            headers['X-MBX-ORDER-COUNT-10S'] = str(account.orders_10s)
+            headers['X-MBX-ORDER-COUNT-1M'] = str(account.orders_1m)
+            if account.orders_10s > self.order_limit_10s or account.orders_1m > self.order_limit_1m:
+                raise SimError(-1015, "Too many new orders.", 429)
+        return headers
+
+    def injected_error(self, method, path):
+        for rule in self.error_rules:
+            if rule.get('method', method) == method and rule.get('path', path) == path \
+                    and self.random.random() < rule.get('rate', 1.0):
+                return SimError(rule.get('code', -1001), rule.get('msg', "Internal error; unable to process your request."),
+                                rule.get('status', 503))
+        return None
+
+    def check_signature(self, account, payload):
+        if not self.verify_signatures:
+            return
+        body, _, signature = payload.rpartition('&signature=')
+        expected = hmac.new(account.secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, signature):
+            raise SimError(-1022, "Signature for this request is not valid.")
+
+
+# --- HTTP / WebSocket front end ---
+SIGNED_PATHS = {'order', 'openOrders', 'allOrders', 'batchOrders', 'allOpenOrders', 'positionRisk',
+                'account', 'balance', 'leverage'}
+
+
+class SimServer:
+    """aiohttp application exposing an ExchangeSimulator under /fapi and /ws."""
+
+    def __init__(self, simulator):
+        self.sim = simulator
+        self.app = web.Application()
+        self.app.router.add_route('*', '/fapi/{version}/{path:.+}', self.handle_rest)
+        self.app.router.add_get('/ws/{listen_key}', self.handle_user_stream)
+        self.app.router.add_get('/stream', self.handle_combined_stream)
+        self.app.router.add_post('/sim/trade', self.handle_sim_trade)
+        self.app.router.add_post('/sim/config', self.handle_sim_config)
+        self.app.router.add_get('/sim/stats', self.handle_sim_stats)
+        self.runner = None
+        self.url = None
+
+    async def start(self, host='127.0.0.1', port=8900):
+        self.runner = web.AppRunner(self.app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def handle_rest(self, request):
+        sim = self.sim
+        sim.stats['requests'] += 1
+        if sim.latency or sim.jitter:
+            await asyncio.sleep(sim.latency + sim.random.uniform(0, sim.jitter))
+
+        method, path = request.method, request.match_info['path']
+        body = await request.text()
+        params = dict(request.query)
+        params.update(parse_qsl(body, keep_blank_values=True))
+
+        headers = {}
+        try:
+            api_key = request.headers.get('X-MBX-APIKEY')
+            account = sim.account(api_key) if api_key else None
+            headers = sim.charge(account, method, path)
+            error = sim.injected_error(method, path)
+            if error is not None:
+                raise error
+            if path in SIGNED_PATHS:
+                if account is None:
+                    raise SimError(-2014, "API-key format invalid.", 401)
+                raw = '&'.join(part for part in (request.query_string, body) if part)
+                sim.check_signature(account, raw)
+            result = self.route(method, path, params, account)
+        except SimError as e:
+            sim.stats['rejected'] += 1
+            return web.json_response({'code': e.code, 'msg': e.msg}, status=e.status, headers=headers)
+        return web.json_response(result, headers=headers)
+
+    def route(self, method, path, params, account):
+        sim = self.sim
+        if path == 'ping':
+            return {}
+        if path == 'time':
+            return {'serverTime': sim.clock()}
+        if path == 'exchangeInfo':
+            return sim.exchange_info()
+        if path == 'ticker/price':
+            if params.get('symbol'):
+                symbol = sim._symbol(params)
+                return {'symbol': symbol, 'price': str(sim.last_prices[symbol]), 'time': sim.clock()}
+            return [{'symbol': s, 'price': str(p), 'time': sim.clock()} for s, p in sim.last_prices.items()]
+        if path == 'premiumIndex':
+            # Mark and index price both follow the last trade.
+            symbols = [sim._symbol(params)] if params.get('symbol') else list(sim.last_prices)
+            indexes = [{'symbol': s, 'markPrice': str(sim.last_prices[s]), 'indexPrice': str(sim.last_prices[s]),
+                        'lastFundingRate': '0.00010000', 'nextFundingTime': 0, 'time': sim.clock()} for s in symbols]
+            return indexes[0] if params.get('symbol') else indexes
+        if path == 'ticker/bookTicker':
+            symbol = sim._symbol(params)
+            book = sim.books[symbol]
+            bid, ask = book.depth('BUY', 1), book.depth('SELL', 1)
+            last = str(sim.last_prices[symbol])
+            return {'symbol': symbol, 'bidPrice': bid[0][0] if bid else last, 'bidQty': bid[0][1] if bid else '0',
+                    'askPrice': ask[0][0] if ask else last, 'askQty': ask[0][1] if ask else '0', 'time': sim.clock()}
+        if path == 'klines':
+            return sim.klines(sim._symbol(params), params.get('interval', '1m'), params.get('startTime'),
+                              params.get('endTime'), params.get('limit', 500))
+        if path == 'depth':
+            symbol = sim._symbol(params)
+            book = sim.books[symbol]
+            limit = int(params.get('limit', 500))
+            return {'lastUpdateId': book.update_id, 'E': sim.clock(), 'T': sim.clock(),
+                    'bids': book.depth('BUY', limit), 'asks': book.depth('SELL', limit)}
+        if path == 'listenKey':
+            if account is None:
+                raise SimError(-2014, "API-key format invalid.", 401)
+            if method == 'POST':
+                listen_key = uuid.uuid4().hex
+                sim.listen_keys[listen_key] = account
+                return {'listenKey': listen_key}
+            if method == 'DELETE':
+                sim.listen_keys.pop(params.get('listenKey'), None)
+            return {}
+        if path == 'order':
+            if method == 'POST':
+                return sim.new_order(account, params).to_dict()
+            if method == 'GET':
+                return sim.find_order(account, params).to_dict()
+            if method == 'DELETE':
+                return sim.cancel_order(account, params).to_dict()
+            if method == 'PUT':
+                return sim.modify_order(account, params).to_dict()
+        if path == 'openOrders':
+            symbol = sim._symbol(params) if params.get('symbol') else None
+            return [o.to_dict() for o in sim.open_orders(account, symbol)]
+        if path == 'allOrders':
+            symbol = sim._symbol(params)
+            return [o.to_dict() for o in sim.orders.values() if o.account is account and o.symbol == symbol]
+        if path == 'allOpenOrders' and method == 'DELETE':
+            sim.cancel_all(account, sim._symbol(params))
+            return {'code': 200, 'msg': "The operation of cancel all open order is done."}
+        if path == 'batchOrders':
+            return self.batch(method, params, account)
+        if path == 'positionRisk':
+            return [{'symbol': symbol, 'positionAmt': str(amount), 'entryPrice': str(entry),
+                     'markPrice': str(sim.last_prices[symbol]),
+                     'unRealizedProfit': str((sim.last_prices[symbol] - entry) * amount), 'positionSide': 'BOTH'}
+                    for symbol, (amount, entry, _) in account.positions.items()
+                    if not params.get('symbol') or params['symbol'] == symbol]
+        raise SimError(-1000, f"Unsupported endpoint: {method} {path}", 404)
+
+    def batch(self, method, params, account):
+        results = []
+        if method == 'POST':
+            batch = json.loads(params.get('batchOrders', '[]'))
+            if len(batch) > 5:
+                raise SimError(-4083, "Batch orders can contain at most 5 orders.")
+            for order_params in batch:
+                try:
+                    results.append(self.sim.new_order(account, order_params).to_dict())
+                except SimError as e:
+                    results.append({'code': e.code, 'msg': e.msg})
+            return results
+        if method == 'DELETE':
+            lowered = {key.lower(): value for key, value in params.items()}
+            order_ids = json.loads(lowered.get('orderidlist') or '[]')
+            client_ids = json.loads(lowered.get('origclientorderidlist') or '[]')
+            targets = [{'symbol': params.get('symbol'), 'orderId': i} for i in order_ids] + \
+                      [{'symbol': params.get('symbol'), 'origClientOrderId': c} for c in client_ids]
+            for target in targets:
+                try:
+                    results.append(self.sim.cancel_order(account, target).to_dict())
+                except SimError as e:
+                    results.append({'code': e.code, 'msg': e.msg})
+            return results
+        raise SimError(-1000, f"Unsupported endpoint: {method} batchOrders", 404)
+
+    async def handle_user_stream(self, request):
+        name = request.match_info['listen_key']
+        account = None
+        if '@' not in name:
+            account = self.sim.listen_keys.get(name)
+            if account is None:
+                raise web.HTTPNotFound()
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        queue = asyncio.Queue()
+        if account is None:
+            # Market stream, e.g. /ws/btcusdt@aggTrade
+            name = name.lower()
+            self.sim.subscribe_market(name, queue)
+            subscribers = self.sim.market_subscribers[name]
+        else:
+            subscribers = account.subscribers
+            subscribers.add(queue)
+        writer = asyncio.create_task(self._pump(ws, queue))
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            subscribers.discard(queue)
+            writer.cancel()
+        return ws
+
+    async def handle_combined_stream(self, request):
+        """Combined market streams, e.g. /stream?streams=btcusdt@aggTrade/btcusdt@bookTicker."""
+        names = [name.lower() for name in request.query.get('streams', '').split('/') if '@' in name]
+        if not names:
+            raise web.HTTPBadRequest()
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        queue = asyncio.Queue()
+        tagged = [(name, _CombinedQueue(queue, name)) for name in names]
+        for name, subscriber in tagged:
+            self.sim.subscribe_market(name, subscriber)
+        writer = asyncio.create_task(self._pump(ws, queue))
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            for name, subscriber in tagged:
+                self.sim.market_subscribers[name].discard(subscriber)
+            writer.cancel()
+        return ws
+
+    async def _pump(self, ws, queue):
+        while True:
+            message = await queue.get()
+            await ws.send_str(message)
+
+    async def handle_sim_trade(self, request):
+        payload = await request.json()
+        try:
+            self.sim.trade(payload['symbol'], payload['price'], payload.get('quantity'))
+        except SimError as e:
+            return web.json_response({'code': e.code, 'msg': e.msg}, status=e.status)
+        return web.json_response({'symbol': payload['symbol'], 'price': str(self.sim.last_prices[payload['symbol']])})
+
+    async def handle_sim_config(self, request):
+        """Changes latency (ms), jitter (ms), weight limit or error rules at runtime."""
+        payload = await request.json()
+        if 'latency_ms' in payload:
+            self.sim.latency = payload['latency_ms'] / 1000
+        if 'jitter_ms' in payload:
+            self.sim.jitter = payload['jitter_ms'] / 1000
+        if 'weight_limit' in payload:
+            self.sim.weight_limit = payload['weight_limit']
+        if 'error_rules' in payload:
+            self.sim.error_rules = payload['error_rules']
+        return web.json_response({'ok': True})
+
+    async def handle_sim_stats(self, request):
+        return web.json_response(self.sim.stats)
+
+
+class _CombinedQueue:
+    """Wraps each message of one stream as {"stream": name, "data": ...} on a combined connection's queue."""
+    __slots__ = ('queue', 'prefix')
+
+    def __init__(self, queue, name):
+        self.queue = queue
+        self.prefix = f'{{"stream":{json.dumps(name)},"data":'
+
+    def put_nowait(self, message):
+        self.queue.put_nowait(self.prefix + message + '}')
+
+
+def start_in_thread(simulator=None, host='127.0.0.1', port=0):
+    """Runs a simulator on a background event loop. Returns (server, base_url)."""
+    server = SimServer(simulator or ExchangeSimulator())
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start(host, port))
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    started.wait()
+    server.loop = loop
+    return server, server.url
+
+
+def call_in_loop(server, fn, *args):
+    """Runs fn(*args) on the simulator's loop thread and returns its result (thread-safe)."""
+    async def run():
+        return fn(*args)
+    return asyncio.run_coroutine_threadsafe(run(), server.loop).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Binance USD-M futures simulator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--weight-limit', type=int, default=2400)
+    parser.add_argument('--order-limit-10s', type=int, default=300)
+    parser.add_argument('--order-limit-1m', type=int, default=1200)
+    parser.add_argument('--price', action='append', default=[], metavar='SYMBOL=PRICE',
+                        help="Starting price for a default symbol")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    simulator = ExchangeSimulator(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                                  weight_limit=args.weight_limit, order_limit_10s=args.order_limit_10s,
+                                  order_limit_1m=args.order_limit_1m)
+    for item in args.price:
+        symbol, price = item.split('=')
+        simulator.last_prices[symbol.upper()] = Decimal(price)
+
+    async def serve():
+        server = SimServer(simulator)
+        url = await server.start(args.host, args.port)
+        logging.info(f"Exchange simulator listening on {url} (export BINANCE_BASE_URL={url})")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# src/grid_optimizer.py
+#
+# Ranks grid configurations (lower, upper, grids, quantity) over a historical
+# trade tape and writes the best one as a ready-to-run runtime config.
+#
+# Usage: python src/grid_optimizer.py <tape_dir> --symbol BTCUSDT \
+#            --lower 55000:60000:500 --upper 62000:68000:500 --grids 10,20,40 \
+#            --quantity 0.01,0.02 [--max-drawdown 500] [--verify 3] [--out grid.json]
+#
+# Ranges are start:stop:step (stop included) or comma-separated values.
+#
+# Every configuration is evaluated at once. A GridEngine order only ever
+# alternates between a buy at one level and a sell one level up, so the
+# whole ladder of every configuration is a flat array of such orders, stepped
+# through the price path together. The path is first reduced with NumPy to
+# its swing highs and lows, which keeps every touch sequence of bands at
+# least one grid step wide. PnL, fees and inventory are linear in quantity,
+# so quantities cost nothing extra. --verify replays the best results through
+# the event-driven backtester (src/backtest.py) as a cross-check.
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.backtest import MAKER_FEE, TradeTape, parse_time_ms, run_backtest
+from src.bot_logging import setup_logging
+from src.exchange_sim import DEFAULT_SYMBOLS
+
+# Prices reduced to swing points per NumPy call.
+PIVOT_CHUNK = 1 << 22
+RANK_KEYS = ('net_pnl', 'pnl_per_drawdown', 'round_trips')
+
+
+# --- Path reduction ---
+def _runs(prices, cell):
+    """Consecutive prices in the same cell of width cell, as (cell, low, high) per run."""
+    cells = np.floor_divide(prices, cell).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(cells)) + 1))
+    return cells[starts], np.minimum.reduceat(prices, starts), np.maximum.reduceat(prices, starts)
+
+
+def swing_points(prices, min_swing):
+    """The path's alternating swing lows and highs.
+
+    For any two prices at least min_swing apart, the order in which the path
+    reaches the lower or below and the upper or above is the same on the
+    swing points as on the full path.
+    """
+    cell = min_swing / 2
+    parts = [_runs(prices[i:i + PIVOT_CHUNK], cell) for i in range(0, len(prices), PIVOT_CHUNK)]
+    cells, lows, highs = (np.concatenate(column) for column in zip(*parts))
+    # Runs split across chunk boundaries.
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(cells)) + 1))
+    cells, lows, highs = cells[starts], np.minimum.reduceat(lows, starts), np.maximum.reduceat(highs, starts)
+    if len(cells) == 1:
+        return np.array([lows[0], highs[0]])
+
+    # Within a run the price moves less than min_swing, and between turning runs it is monotonic,
+    # so only the extreme of each turning run matters.
+    up = np.diff(cells) > 0
+    keep = np.ones(len(cells), bool)
+    keep[1:-1] = up[:-1] != up[1:]
+    is_high = np.empty(len(cells), bool)
+    is_high[0], is_high[1:-1], is_high[-1] = not up[0], up[:-1], up[-1]
+    return _drop_small_swings(np.where(is_high, highs, lows)[keep], min_swing)
+
+
+def _drop_small_swings(points, min_swing):
+    """Removes inner swings smaller than min_swing that stay within their neighbours' range."""
+    while len(points) >= 4:
+        a, b, c, d = points[:-3], points[1:-2], points[2:-1], points[3:]
+        inner = (np.abs(c - b) < min_swing) & (np.minimum(b, c) >= np.minimum(a, d)) \
+            & (np.maximum(b, c) <= np.maximum(a, d))
+        if not inner.any():
+            break
+        # Removing pair i+1, i+2 changes the neighbours of pairs i-2 .. i+2, so take every third of a chain.
+        index = np.arange(len(inner))
+        chain_start = np.maximum.accumulate(np.where(inner & ~np.concatenate(([False], inner[:-1])), index, 0))
+        drop = inner & ((index - chain_start) % 3 == 0)
+        keep = np.ones(len(points), bool)
+        keep[np.flatnonzero(drop) + 1] = False
+        keep[np.flatnonzero(drop) + 2] = False
+        points = points[keep]
+    return points
+
+
+# --- Evaluation ---
+def grid_configs(lowers, uppers, grid_counts):
+    """Every (lower, upper, grids) combination with lower < upper, as three arrays."""
+    combos = [(lower, upper, grids) for lower, upper, grids in itertools.product(lowers, uppers, grid_counts)
+              if lower < upper and grids > 0]
+    if not combos:
+        raise ValueError("No grid configuration has lower < upper.")
+    lower, upper, grids = (np.array(column) for column in zip(*combos))
+    return lower.astype(np.float64), upper.astype(np.float64), grids.astype(np.int64)
+
+
+def evaluate(prices, lower, upper, grids, tick_size=None, maker_fee=MAKER_FEE):
+    """Runs every grid configuration over the price path with a quantity of 1 per level.
+
+    lower, upper and grids are equal-length arrays, one entry per configuration.
+    Mirrors GridEngine: levels at lower + i * step for i in 1..grids, buys
+    below the first price and sells at or above it; a filled buy is replaced
+    by a sell one step up and a filled sell by a buy one step down, never
+    outside [lower, upper]. Orders fill when the price touches them. Returns
+    a dict of per-configuration arrays.
+    """
+    step = (upper - lower) / grids
+    config = np.repeat(np.arange(len(grids)), grids)
+    # Level number 1..grids of each initial order.
+    level = np.arange(len(config)) - np.repeat(np.cumsum(grids) - grids, grids) + 1
+    price_at = lower[config] + level * step[config]
+    low_at, high_at = price_at - step[config], price_at + step[config]
+    if tick_size:
+        price_at, low_at, high_at = (np.round(p / tick_size) * tick_size for p in (price_at, low_at, high_at))
+
+    # Each order becomes a buy at `buy` <-> sell at `sell` pair; `selling` is its current side.
+    start = float(prices[0])
+    selling = price_at >= start
+    buy = np.where(selling, low_at, price_at)
+    sell = np.where(selling, price_at, high_at)
+    # A buy on the top level has no sell above it inside the range.
+    sell[~selling & (level == grids[config])] = np.inf
+
+    count = len(grids)
+    cash, position, fees = np.zeros(count), np.zeros(count), np.zeros(count)
+    peak, drawdown, inventory = np.zeros(count), np.zeros(count), np.zeros(count)
+    fills = np.zeros(len(config), np.int64)
+
+    # Tick rounding can narrow a level pair by up to one tick.
+    min_step = float(step.min())
+    points = swing_points(np.asarray(prices, dtype=np.float64), max(min_step - (tick_size or 0), min_step / 2))
+    high = points[0] > points[1] if len(points) > 1 else True
+    for point in points.tolist():
+        if high:
+            hit = np.flatnonzero(selling & (sell <= point))
+            fill_price, direction = sell[hit], -1
+        else:
+            hit = np.flatnonzero(~selling & (buy >= point))
+            fill_price, direction = buy[hit], 1
+        high = not high
+        if hit.size:
+            selling[hit] = direction > 0
+            fills[hit] += 1
+            owners = config[hit]
+            np.add.at(position, owners, direction)
+            np.add.at(cash, owners, -direction * fill_price)
+            np.add.at(fees, owners, fill_price * maker_fee)
+            np.maximum(inventory, np.abs(position), out=inventory)
+        equity = cash + position * point - fees
+        np.maximum(peak, equity, out=peak)
+        np.maximum(drawdown, peak - equity, out=drawdown)
+
+    last = float(prices[-1])
+    return {
+        'lower': lower,
+        'upper': upper,
+        'grids': grids,
+        'net_pnl': cash + position * last - fees,
+        'fees': fees,
+        'fills': np.bincount(config, weights=fills, minlength=count).astype(np.int64),
+        'round_trips': np.bincount(config, weights=fills // 2, minlength=count).astype(np.int64),
+        'max_drawdown': drawdown,
+        'max_inventory': inventory,
+        'position': position,
+        'swing_points': len(points),
+    }
+
+
+def rank(results, quantities, key='net_pnl', top=10, max_drawdown=None, min_notional=0):
+    """The best (configuration, quantity) combinations by key, as dicts.
+
+    Every PnL, fee, drawdown and inventory figure scales with quantity.
+    Quantities whose notional at the lowest level is below min_notional are
+    skipped, since the exchange would reject those orders.
+    """
+    if key not in RANK_KEYS:
+        raise ValueError(f"Unknown ranking key '{key}'. Expected one of: {', '.join(RANK_KEYS)}")
+    quantity = np.asarray(quantities, dtype=np.float64)[:, None]
+    lower, upper, grids = results['lower'], results['upper'], results['grids']
+    net_pnl = quantity * results['net_pnl']
+    max_dd = quantity * results['max_drawdown']
+    valid = quantity * (lower + (upper - lower) / grids) >= min_notional
+    if max_drawdown is not None:
+        valid &= max_dd <= max_drawdown
+    if key == 'net_pnl':
+        score = net_pnl
+    elif key == 'pnl_per_drawdown':
+        score = net_pnl / np.maximum(max_dd, 1e-9)
+    else:
+        score = np.broadcast_to(results['round_trips'].astype(np.float64), net_pnl.shape)
+    score = np.where(valid, score, -np.inf)
+
+    order = np.argsort(score, axis=None)[::-1][:top]
+    rows = []
+    for q_index, c_index in zip(*np.unravel_index(order, score.shape)):
+        if score[q_index, c_index] == -np.inf:
+            break
+        q = float(quantity[q_index, 0])
+        rows.append({
+            'lower': float(lower[c_index]),
+            'upper': float(upper[c_index]),
+            'grids': int(grids[c_index]),
+            'quantity': q,
+            'net_pnl': round(float(net_pnl[q_index, c_index]), 4),
+            'fees': round(q * float(results['fees'][c_index]), 4),
+            'fills': int(results['fills'][c_index]),
+            'round_trips': int(results['round_trips'][c_index]),
+            'max_drawdown': round(float(max_dd[q_index, c_index]), 4),
+            'max_inventory': round(q * float(results['max_inventory'][c_index]), 8),
+            'position': round(q * float(results['position'][c_index]), 8),
+        })
+    return rows
+
+
+def runtime_config(symbol, row, testnet=True):
+    """A src/runtime.py config running the ranked grid row."""
+    return {
+        'testnet': testnet,
+        'strategies': [{
+            'type': 'grid',
+            'name': f"grid-{symbol}",
+            'symbol': symbol,
+            'lower': row['lower'],
+            'upper': row['upper'],
+            'grids': row['grids'],
+            'quantity': row['quantity'],
+        }],
+    }
+
+
+# --- CLI ---
+def _values(text):
+    """start:stop:step (stop included) or comma-separated numbers."""
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 10).tolist()
+    return [float(value) for value in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank grid configurations over a historical trade tape")
+    parser.add_argument('tape', help="Tape directory or .parquet file (see src/backtest.py)")
+    parser.add_argument('--symbol', required=True)
+    parser.add_argument('--lower', type=_values, required=True)
+    parser.add_argument('--upper', type=_values, required=True)
+    parser.add_argument('--grids', type=_values, required=True)
+    parser.add_argument('--quantity', type=_values, required=True)
+    parser.add_argument('--start', help="Epoch ms or ISO date/time (UTC)")
+    parser.add_argument('--end', help="Epoch ms or ISO date/time (UTC)")
+    parser.add_argument('--tick-size', type=float)
+    parser.add_argument('--min-notional', type=float)
+    parser.add_argument('--maker-fee', type=float, default=MAKER_FEE)
+    parser.add_argument('--max-drawdown', type=float, help="Skip results with a larger drawdown (quote asset)")
+    parser.add_argument('--sort', default='net_pnl', choices=RANK_KEYS)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--verify', type=int, default=0, help="Replay the best N through the backtester")
+    parser.add_argument('--out', help="Write the best configuration as a runtime config file")
+    args = parser.parse_args()
+
+    setup_logging(log_file="backtest.log", level=logging.ERROR)
+    symbol = args.symbol.upper()
+    spec = DEFAULT_SYMBOLS.get(symbol, {})
+    tick_size = args.tick_size or float(spec.get('tick_size', 0)) or None
+    min_notional = args.min_notional if args.min_notional is not None else float(spec.get('min_notional', 0))
+    tape = TradeTape.load(args.tape).window(parse_time_ms(args.start), parse_time_ms(args.end))
+    if not len(tape):
+        parser.error("The tape holds no trades in the selected window.")
+
+    started = time.perf_counter()
+    lower, upper, grids = grid_configs(args.lower, args.upper, [int(g) for g in args.grids])
+    results = evaluate(tape.price, lower, upper, grids, tick_size, args.maker_fee)
+    rows = rank(results, args.quantity, args.sort, args.top, args.max_drawdown, min_notional)
+    print(f"{len(grids) * len(args.quantity)} configurations over {len(tape)} trades "
+          f"({results['swing_points']} swing points) in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+    if not rows:
+        print("No configuration passed the filters.", file=sys.stderr)
+        sys.exit(1)
+    for row in rows:
+        print(json.dumps(row))
+
+    for row in rows[:args.verify]:
+        params = {key: row[key] for key in ('lower', 'upper', 'grids', 'quantity')}
+        report = run_backtest('grid', tape, symbol, params, tick_size=args.tick_size, maker_fee=args.maker_fee,
+                              min_notional=args.min_notional)
+        print(f"backtest {params}: net_pnl {report['net_pnl']}, fills {report['fills']}, "
+              f"max_drawdown {report['max_drawdown']}", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(runtime_config(symbol, rows[0]), f, indent=4)
+        best = rows[0]
+        print(f"Wrote {args.out}. Run it with: python src/runtime.py {args.out}\n"
+              f"or: python src/advanced/grid_orders.py {symbol} {best['lower']:g} {best['upper']:g} "
+              f"{best['grids']} {best['quantity']:g} --stream", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# src/journal.py
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, one process per journal is up to the user
+    fcntl = None
+
+# Strategy state must survive reboots, so it lives outside the cache directory.
+JOURNAL_DIR = os.path.join(os.path.expanduser("~"), ".local", "state", "binance-bot", "journal")
+FLUSH_INTERVAL = 0.05
+SNAPSHOT_EVERY = 1000
+
+
+def journal_name(kind, symbol, params):
+    """Journal name for a strategy without an explicit name: its kind, symbol and a hash of its parameters.
+
+    Runs with the same parameters share the journal (that is how a restart
+    resumes); runs with other parameters on the same symbol get their own.
+    """
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:10]
+    return f"{kind}-{symbol}-{digest}"
+
+
+def _fsync_dir(path):
+    """Makes a rename or removal in path durable; directories cannot be opened for this on Windows."""
+    if os.name == 'nt':
+        return
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Journal:
+    """Append-only, crash-safe log of one strategy's state changes.
+
+    append() only queues the record; a background thread writes everything
+    queued and fsyncs it in one go at most every flush_interval seconds, so a
+    crash loses at most that window. Every snapshot_every records the owner's
+    full state (from state_fn) is written atomically as a snapshot and the log
+    starts over, which keeps replay short. Records carry a sequence number, so
+    a crash between writing a snapshot and truncating the log cannot replay
+    a record twice. Records should be idempotent (set/remove style).
+
+    A journal is held by one process at a time: a lock file next to it is
+    locked for as long as the journal is open, and opening it from a second
+    process raises RuntimeError. A record torn by a crash is cut off the end
+    of the log when it is loaded, so new records never run into it.
+    """
+
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL, snapshot_every=SNAPSHOT_EVERY):
+        self.log_path = f"{path}.log"
+        self.snapshot_path = f"{path}.snapshot.json"
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.state_fn = None
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        self._lock_file = self._acquire(f"{path}.lock")
+
+        self._snapshot, self._records, self.seq = self._load()
+        self._pending = []
+        self._since_snapshot = len(self._records)
+        self._closed = False
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._file = open(self.log_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True,
+                                        name=f"journal-{os.path.basename(path)}")
+        self._thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def for_strategy(cls, name, directory=JOURNAL_DIR, **kwargs):
+        return cls(os.path.join(directory, name), **kwargs)
+
+    def replay(self):
+        """Returns (snapshot_state, records): the last snapshot (or None) and every record after it."""
+        return self._snapshot, self._records
+
+    def append(self, record):
+        with self._cond:
+            self.seq += 1
+            record['seq'] = self.seq
+            self._pending.append(json.dumps(record) + "\n")
+            self._since_snapshot += 1
+            self._cond.notify()
+            snapshot_due = self.state_fn is not None and self._since_snapshot >= self.snapshot_every
+        if snapshot_due:
+            self.snapshot()
+
+    def snapshot(self):
+        """Writes the owner's full state and truncates the log."""
+        with self._io_lock:
+            with self._cond:
+                lines, self._pending = self._pending, []
+                seq, state = self.seq, self.state_fn()
+                self._since_snapshot = 0
+            self._write(lines)
+
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'seq': seq, 'state': state}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            _fsync_dir(os.path.dirname(self.snapshot_path))
+            self._file.close()
+            self._file = open(self.log_path, 'w', encoding='utf-8')
+
+    def reset(self):
+        """Forgets everything recorded so far, e.g. when the strategy completes."""
+        with self._io_lock:
+            with self._cond:
+                self._pending = []
+                self._since_snapshot = 0
+            try:
+                os.remove(self.snapshot_path)
+                _fsync_dir(os.path.dirname(self.snapshot_path))
+            except FileNotFoundError:
+                pass
+            self._file.close()
+            self._file = open(self.log_path, 'w', encoding='utf-8')
+        self._snapshot, self._records = None, []
+
+    def flush(self):
+        """Writes and fsyncs everything appended so far."""
+        with self._io_lock:
+            with self._cond:
+                lines, self._pending = self._pending, []
+            self._write(lines)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        self._file.close()
+        self._lock_file.close()
+
+    @staticmethod
+    def _acquire(lock_path):
+        lock_file = open(lock_path, 'a+', encoding='utf-8')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.seek(0)
+                holder = lock_file.read().strip() or "another process"
+                lock_file.close()
+                raise RuntimeError(f"Journal {lock_path[:-5]} is in use by pid {holder}; "
+                                   f"give this run its own name.") from None
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        return lock_file
+
+    def _write(self, lines):
+        if lines:
+            self._file.write(''.join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
+            time.sleep(self.flush_interval)
+
+    def _load(self):
+        snapshot, snapshot_seq = None, 0
+        try:
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                saved = json.load(f)
+            snapshot, snapshot_seq = saved['state'], saved['seq']
+        except FileNotFoundError:
+            pass
+
+        records, seq = [], snapshot_seq
+        try:
+            with open(self.log_path, 'r+b') as f:
+                good_end = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break  # written up to, but not including, its newline
+                    good_end += len(line)
+                    if record['seq'] > snapshot_seq:
+                        records.append(record)
+                        seq = record['seq']
+                if good_end < f.seek(0, os.SEEK_END):
+                    # Cut the torn record off, so the next append starts on a line of its own.
+                    logging.warning(f"Dropping a torn record at the end of {self.log_path}")
+                    f.truncate(good_end)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except FileNotFoundError:
+            pass
+        return snapshot, records, seq
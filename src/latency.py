@@ -0,0 +1,219 @@
+# src/latency.py
+
+import math
+import threading
+import time
+
+try:
+    from src.bot_logging import current_strategy
+except ImportError:  # run as a script from src/
+    from bot_logging import current_strategy
+
+WINDOW_SECONDS = 60
+WINDOW_SLOTS = 6
+# Values are in milliseconds, bucketed on a log scale 5% wide from 1 µs to 100 s.
+MIN_MS = 0.001
+BUCKET_GROWTH = 1.05
+_LOG_GROWTH = math.log(BUCKET_GROWTH)
+BUCKETS = int(math.log(100000 / MIN_MS) / _LOG_GROWTH) + 2
+QUANTILES = (0.5, 0.99)
+
+# Key under which UserDataStream stamps each event's local receive time (time.perf_counter()).
+RECEIVED_AT = '_received_at'
+
+
+def _bucket(value_ms):
+    if value_ms <= MIN_MS:
+        return 0
+    return min(BUCKETS - 1, int(math.log(value_ms / MIN_MS) / _LOG_GROWTH) + 1)
+
+
+def _bucket_upper(index):
+    return MIN_MS * BUCKET_GROWTH ** index
+
+
+class RollingHistogram:
+    """Latency distribution over the last window seconds, as log-bucket counts per time slot.
+
+    Slots older than the window are reset when reused, so quantiles always
+    describe recent traffic. count and sum cover the whole lifetime.
+    """
+    __slots__ = ('slot_seconds', 'counts', 'maxes', 'epochs', 'count', 'sum')
+
+    def __init__(self, window=WINDOW_SECONDS, slots=WINDOW_SLOTS):
+        self.slot_seconds = window / slots
+        self.counts = [None] * slots
+        self.maxes = [0.0] * slots
+        self.epochs = [-1] * slots
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, value_ms, now):
+        epoch = int(now // self.slot_seconds)
+        i = epoch % len(self.epochs)
+        if self.epochs[i] != epoch:
+            self.epochs[i] = epoch
+            self.counts[i] = [0] * BUCKETS
+            self.maxes[i] = 0.0
+        self.counts[i][_bucket(value_ms)] += 1
+        if value_ms > self.maxes[i]:
+            self.maxes[i] = value_ms
+        self.count += 1
+        self.sum += value_ms
+
+    def stats(self, now):
+        """{'count', 'p50', 'p99', 'max'} over the window (quantiles within 5%), or None if empty."""
+        epoch = int(now // self.slot_seconds)
+        live = [i for i, e in enumerate(self.epochs) if 0 <= epoch - e < len(self.epochs)]
+        if not live:
+            return None
+        merged = [sum(column) for column in zip(*(self.counts[i] for i in live))]
+        total = sum(merged)
+        if not total:
+            return None
+        peak = max(self.maxes[i] for i in live)
+        stats = {'count': total, 'max': peak}
+        for q in QUANTILES:
+            rank, seen = q * total, 0
+            for index, n in enumerate(merged):
+                seen += n
+                if seen >= rank:
+                    stats[f"p{round(q * 100)}"] = min(_bucket_upper(index), peak)
+                    break
+        return stats
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class LatencyRecorder:
+    """Rolling latency histograms keyed by metric name and labels, shared by every client of a bot.
+
+    request phases are recorded per endpoint and the total per strategy (the
+    current_strategy log tag); streaming strategies add tick_to_order, from a
+    user-data event arriving to the exchange acknowledging the resulting order.
+    """
+
+    def __init__(self, window=WINDOW_SECONDS, slots=WINDOW_SLOTS):
+        self.window = window
+        self.slots = slots
+        self.histograms = {}  # (name, ((label, value), ...)) -> RollingHistogram
+        self._by_endpoint = {}  # (method, path) -> {phase: RollingHistogram}, to skip key building per request
+        self._lock = threading.Lock()
+
+    def record(self, name, value_ms, **labels):
+        now = time.monotonic()
+        with self._lock:
+            self._histogram(name, tuple(sorted(labels.items()))).record(value_ms, now)
+
+    def observe_request(self, method, path, timings, finished):
+        """Records one REST call from the perf_counter stamps its client collected.
+
+        Phases: queue (rate limiter wait), build, sign, send (request out to
+        response in), first_byte (time to response headers), parse, total.
+        """
+        started = timings['start']
+        phases = {'total': finished - started}
+        acquired = timings.get('acquired')
+        if acquired is not None:
+            phases['queue'] = acquired - started
+            sign = timings.get('sign', 0.0)
+            built = timings.get('built')
+            if built is not None:
+                phases['sign'] = sign
+                phases['build'] = built - acquired - sign
+                received = timings.get('received')
+                if received is not None:
+                    phases['send'] = received - built
+                    phases['first_byte'] = timings.get('first_byte', received - built)
+                    phases['parse'] = timings.get('parsed', finished) - received
+
+        now = time.monotonic()
+        strategy = current_strategy.get()
+        with self._lock:
+            histograms = self._by_endpoint.get((method, path))
+            if histograms is None:
+                histograms = self._by_endpoint[(method, path)] = {}
+            for phase, seconds in phases.items():
+                histogram = histograms.get(phase)
+                if histogram is None:
+                    endpoint = f"{method.upper()} {path}"
+                    histogram = histograms[phase] = self._histogram('request', (('endpoint', endpoint), ('phase', phase)))
+                histogram.record(seconds * 1000, now)
+            if strategy:
+                self._histogram('strategy_request', (('phase', 'total'), ('strategy', strategy))).record(
+                    phases['total'] * 1000, now)
+
+    def _histogram(self, name, labels):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = RollingHistogram(self.window, self.slots)
+        return histogram
+
+    def snapshot(self):
+        """[(name, labels, stats)] for every histogram with samples in the window."""
+        now = time.monotonic()
+        with self._lock:
+            rows = [(name, dict(labels), histogram.stats(now), histogram.count, histogram.sum)
+                    for (name, labels), histogram in self.histograms.items()]
+        return [(name, labels, dict(stats, lifetime_count=count, lifetime_sum=total))
+                for name, labels, stats, count, total in rows if stats is not None]
+
+    def summary(self, name='request', phase='total', top=5):
+        """One-line text of the slowest series by p99, for periodic log dumps."""
+        rows = [(labels, stats) for n, labels, stats in self.snapshot()
+                if n == name and labels.get('phase') == phase]
+        rows.sort(key=lambda row: row[1]['p99'], reverse=True)
+        return "; ".join(
+            f"{labels.get('endpoint') or labels.get('strategy') or labels.get('symbol')} "
+            f"p50 {stats['p50']:.2f} / p99 {stats['p99']:.2f} / max {stats['max']:.2f} ms (n={stats['count']})"
+            for labels, stats in rows[:top])
+
+    def prometheus(self, prefix='binance_bot'):
+        """Prometheus text exposition: one summary (plus a _max gauge) per metric name."""
+        by_name = {}
+        for name, labels, stats in self.snapshot():
+            by_name.setdefault(name, []).append((labels, stats))
+
+        lines = []
+        for name, rows in sorted(by_name.items()):
+            metric = f"{prefix}_{name}_ms"
+            lines.append(f"# TYPE {metric} summary")
+            for labels, stats in rows:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{{label_text},quantile="{q}"}} {stats[f"p{round(q * 100)}"]:.4f}')
+                lines.append(f"{metric}_count{{{label_text}}} {stats['lifetime_count']}")
+                lines.append(f"{metric}_sum{{{label_text}}} {stats['lifetime_sum']:.4f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            for labels, stats in rows:
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+                lines.append(f"{metric}_max{{{label_text}}} {stats['max']:.4f}")
+        return "\n".join(lines) + "\n"
+
+
+def record_tick_to_order(client, event, **labels):
+    """Records event receipt -> order acknowledged for an order sent in reaction to a stream event."""
+    latency = getattr(client, 'latency', None)
+    received = event.get(RECEIVED_AT)
+    if latency is None or received is None:
+        return
+    latency.record('tick_to_order', (time.perf_counter() - received) * 1000,
+                   strategy=current_strategy.get() or '', **labels)
+
+
+async def serve_metrics(text_fn, host='127.0.0.1', port=9108):
+    """Serves text_fn() at http://host:port/metrics in Prometheus text format. Returns the aiohttp runner."""
+    from aiohttp import web
+
+    async def handle(request):
+        return web.Response(text=text_fn(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -2,23 +2,17 @@
 import sys
 import os
 import logging
-from binance.client import Client
-from binance.enums import *
-from binance.exceptions import BinanceAPIException, BinanceRequestException
-from bot_client import BasicBot
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),  
-        logging.StreamHandler()         
-    ]
-)
+from bot_logging import setup_logging
+from bot_daemon import send_command, DaemonCommandError
+from symbol_filters import FilterError
+setup_logging()
 
 api_key = os.getenv("BINANCE_API_KEY")
 api_secret = os.getenv("BINANCE_API_SECRET")
+# When set, orders go through a running bot_daemon.py instead of a fresh client.
+daemon_socket = os.getenv("BINANCE_BOT_SOCKET")
 
-if not api_key or not api_secret:
+if not daemon_socket and (not api_key or not api_secret):
     logging.error("BINANCE_API_KEY and BINANCE_API_SECRET environment variables must be set.")
     sys.exit(1)
 
@@ -35,32 +29,13 @@ except ValueError:
     logging.error("Quantity and Price must be numbers.")
     sys.exit(1)
 
-if side_str == 'BUY':
-    side = SIDE_BUY
-elif side_str == 'SELL':
-    side = SIDE_SELL
-else:
+if side_str not in ('BUY', 'SELL'):
     logging.error("Side must be 'BUY' or 'SELL'.")
     sys.exit(1)
-try:
-    bot = BasicBot(api_key, api_secret, testnet=True)
-    client = bot.client
-except Exception as e:
-    logging.error(f"Failed to initialize Binance client: {e}")
-    sys.exit(1)
+side = side_str
 
-try:
-    logging.info(f"Placing a LIMIT {side_str} order for {quantity} {symbol} at {price}")
-    
-    order = client.futures_create_order(
-        symbol=symbol,
-        side=side,
-        type=ORDER_TYPE_LIMIT,
-        timeInForce=TIME_IN_FORCE_GTC,
-        quantity=quantity,
-        price=price
-    )
-    
+
+def log_order(order):
     logging.info("Order placed successfully! ")
     logging.info(f"  - Order ID: {order['orderId']}")
     logging.info(f"  - Symbol: {order['symbol']}")
@@ -70,9 +45,38 @@ try:
     logging.info(f"  - Placed Price: {order['price']}")
     logging.info(f"  - Placed Quantity: {order['origQty']}")
 
+
+params = dict(symbol=symbol, side=side, type='LIMIT', timeInForce='GTC', quantity=quantity, price=price)
+
+if daemon_socket:
+    # The daemon rounds to the symbol filters itself, and this process never imports python-binance.
+    logging.info(f"Placing a LIMIT {side_str} order for {quantity} {symbol} at {price}")
+    try:
+        log_order(send_command('futures_create_order', daemon_socket, **params))
+    except DaemonCommandError as e:
+        logging.error(f"Bot Daemon Error (Code {e.code}): {e.message}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+    sys.exit(0)
+
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from bot_client import BasicBot
+
+try:
+    bot = BasicBot(api_key, api_secret, testnet=True)
+except Exception as e:
+    logging.error(f"Failed to initialize Binance client: {e}")
+    sys.exit(1)
+
+try:
+    logging.info(f"Placing a LIMIT {side_str} order for {quantity} {symbol} at {price}")
+    log_order(bot.client.futures_create_order(**bot.filters.prepare_order(params)))
+
 except BinanceAPIException as e:
     logging.error(f"Binance API Error (Code {e.code}): {e.message}")
 except BinanceRequestException as e:
     logging.error(f"Binance Request Error: {e.message}")
+except FilterError as e:
+    logging.error(f"Order rejected before sending: {e}")
 except Exception as e:
-    logging.error(f"An unexpected error occurred: {e}")
\ No newline at end of file
+    logging.error(f"An unexpected error occurred: {e}")
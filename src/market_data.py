@@ -0,0 +1,328 @@
+# src/market_data.py
+#
+# Live top-of-book, mark price and last trade per symbol from the public
+# futures market streams, so strategies can read a current price without a
+# REST call. Optionally mirrored into a named shared-memory table that other
+# processes on the host read with SharedQuotes.
+
+import asyncio
+import json
+import logging
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import websockets
+
+STREAMS = ('bookTicker', 'markPrice@1s', 'aggTrade')
+# Binance allows up to 1024 streams per futures connection; staying well below
+# keeps one busy connection from delaying every symbol.
+MAX_STREAMS_PER_CONNECTION = 200
+# A price not updated for this many seconds counts as missing, so callers fall back to REST.
+MAX_AGE = 5.0
+# Seqlock retries before a read gives up on a slot its writer never finished.
+MAX_READ_RETRIES = 1000
+
+
+class Quote(namedtuple('Quote', 'symbol bid bid_qty ask ask_qty book_received mark funding_rate mark_received '
+                                'last last_qty volume notional trade_received event_time')):
+    """Immutable snapshot of one symbol. *_received are time.monotonic() stamps (0.0 = never).
+
+    volume and notional are the cumulative aggTrade quantity and quote volume
+    since the feed started.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def empty(cls, symbol):
+        return cls(symbol, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0)
+
+    @property
+    def mid(self):
+        return (self.bid + self.ask) / 2 if self.bid and self.ask else None
+
+    def price(self, max_age=MAX_AGE, now=None):
+        """Last trade price, else book mid, else mark price, whichever is fresh first; None if all are stale."""
+        now = time.monotonic() if now is None else now
+        if self.last and now - self.trade_received <= max_age:
+            return self.last
+        if self.bid and self.ask and now - self.book_received <= max_age:
+            return (self.bid + self.ask) / 2
+        if self.mark and now - self.mark_received <= max_age:
+            return self.mark
+        return None
+
+
+class _QuoteReader:
+    """Price lookups shared by the in-process cache and the shared-memory reader."""
+
+    def price(self, symbol, max_age=MAX_AGE):
+        """A fresh price for symbol (see Quote.price), or None if the feed has none."""
+        quote = self.get(symbol)
+        return quote.price(max_age) if quote is not None else None
+
+    def book(self, symbol, max_age=MAX_AGE):
+        """(bid, ask) if the book ticker is fresh, else None."""
+        quote = self.get(symbol)
+        if quote is None or not quote.bid or time.monotonic() - quote.book_received > max_age:
+            return None
+        return quote.bid, quote.ask
+
+    def volume_window(self, symbol):
+        """Traded volume and VWAP of symbol from now on, read off the cumulative trade counters."""
+        return VolumeWindow(self, symbol)
+
+
+class VolumeWindow:
+    """Volume and VWAP traded since creation; a drop-in for a strategy's own aggTrade counter."""
+
+    def __init__(self, reader, symbol):
+        self.reader = reader
+        self.symbol = symbol
+        quote = reader.get(symbol)
+        self.start_volume = quote.volume if quote is not None else 0.0
+        self.start_notional = quote.notional if quote is not None else 0.0
+
+    @property
+    def volume(self):
+        quote = self.reader.get(self.symbol)
+        return quote.volume - self.start_volume if quote is not None else 0.0
+
+    @property
+    def vwap(self):
+        quote = self.reader.get(self.symbol)
+        if quote is None or quote.volume <= self.start_volume:
+            return None
+        return (quote.notional - self.start_notional) / (quote.volume - self.start_volume)
+
+
+class MarketData(_QuoteReader):
+    """Latest book ticker, mark price and trade of each symbol, from combined market streams.
+
+    Each update swaps in a new immutable Quote under the symbol, so readers on
+    any thread or task get a consistent snapshot with one dict lookup and no
+    lock. Updates are applied on the event loop running run(); connections
+    reconnect with backoff, and quotes left stale by a drop simply age out of
+    price(). With shared_memory the quotes are also published to a table of
+    that name for SharedQuotes readers in other processes. Listeners added
+    with on_update() are called on the loop with (event type, new Quote) after
+    every update, for strategies that react to prices rather than poll them.
+    """
+
+    def __init__(self, stream_url, symbols, shared_memory=None, streams=STREAMS,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        self.stream_url = stream_url.rstrip('/')
+        self.symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        self.streams = streams
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.quotes = {symbol: Quote.empty(symbol) for symbol in self.symbols}
+        self.table = QuoteTable.create(shared_memory, self.symbols) if shared_memory else None
+        self.messages = 0
+        self.listeners = []
+        self._running = False
+        self._sockets = set()
+
+    def get(self, symbol):
+        return self.quotes.get(symbol)
+
+    def covers(self, symbols, stream):
+        """True if every symbol is subscribed to stream, e.g. 'markPrice@1s'."""
+        return stream in self.streams and all(symbol in self.quotes for symbol in symbols)
+
+    def on_update(self, handler):
+        """Registers handler(event_type, quote); it runs inline on the feed, so it must not block."""
+        self.listeners.append(handler)
+
+    def off_update(self, handler):
+        if handler in self.listeners:
+            self.listeners.remove(handler)
+
+    def attach(self, stream):
+        """Makes the cache available to strategies run on a user-data stream (stream.market_data)."""
+        stream.market_data = self
+
+    async def run(self):
+        """Keeps one connection per MAX_STREAMS_PER_CONNECTION streams open until stop() is called."""
+        self._running = True
+        names = [f"{symbol.lower()}@{stream}" for symbol in self.symbols for stream in self.streams]
+        chunks = [names[i:i + MAX_STREAMS_PER_CONNECTION] for i in range(0, len(names), MAX_STREAMS_PER_CONNECTION)]
+        await asyncio.gather(*(self._connection(chunk) for chunk in chunks))
+
+    async def stop(self):
+        self._running = False
+        for ws in list(self._sockets):
+            await ws.close()
+
+    def close(self):
+        """Removes the shared-memory table, if any."""
+        if self.table is not None:
+            self.table.close(unlink=True)
+            self.table = None
+
+    async def _connection(self, names):
+        url = f"{self.stream_url}/stream?streams={'/'.join(names)}"
+        delay = self.reconnect_delay
+        while self._running:
+            try:
+                async with websockets.connect(url) as ws:
+                    self._sockets.add(ws)
+                    delay = self.reconnect_delay
+                    try:
+                        async for message in ws:
+                            self.apply(json.loads(message)['data'])
+                    finally:
+                        self._sockets.discard(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Market data stream error: {e}")
+
+            if self._running:
+                logging.warning(f"Market data stream disconnected. Reconnecting in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def apply(self, event):
+        """Applies one bookTicker, markPriceUpdate or aggTrade event."""
+        symbol = event.get('s')
+        q = self.quotes.get(symbol)
+        if q is None:
+            return
+        now = time.monotonic()
+        kind = event.get('e')
+        if kind == 'bookTicker':
+            quote = Quote(symbol, float(event['b']), float(event['B']), float(event['a']), float(event['A']), now,
+                          q.mark, q.funding_rate, q.mark_received, q.last, q.last_qty, q.volume, q.notional,
+                          q.trade_received, event['E'])
+        elif kind == 'markPriceUpdate':
+            quote = Quote(symbol, q.bid, q.bid_qty, q.ask, q.ask_qty, q.book_received,
+                          float(event['p']), float(event.get('r') or 0.0), now, q.last, q.last_qty, q.volume,
+                          q.notional, q.trade_received, event['E'])
+        elif kind == 'aggTrade':
+            price, qty = float(event['p']), float(event['q'])
+            quote = Quote(symbol, q.bid, q.bid_qty, q.ask, q.ask_qty, q.book_received, q.mark, q.funding_rate,
+                          q.mark_received, price, qty, q.volume + qty, q.notional + price * qty, now, event['E'])
+        else:
+            return
+        self.quotes[symbol] = quote
+        self.messages += 1
+        if self.table is not None:
+            self.table.write(self.table.index[symbol], quote)
+        for listener in self.listeners:
+            try:
+                listener(kind, quote)
+            except Exception as e:
+                logging.error(f"Error in market data listener for {symbol}: {e}")
+
+
+# --- Shared memory ---
+# Header: magic, slot count. Each slot: seqlock counter, symbol, then the
+# Quote fields after the symbol (13 doubles and the int64 event time).
+_MAGIC = b'BBQ1'
+_HEADER = struct.Struct('<4sI')
+_SEQ = struct.Struct('<Q')
+_SYMBOL = struct.Struct('<16s')
+_BODY = struct.Struct('<13dq')
+_SLOT_SIZE = _SEQ.size + _SYMBOL.size + _BODY.size
+
+
+class QuoteTable:
+    """Fixed-size table of Quotes in named shared memory, one seqlocked slot per symbol.
+
+    A single writer bumps a slot's counter to odd, writes the fields and bumps
+    it back to even; readers retry while the counter is odd or changed under
+    them, so they never see a half-written quote and never block the writer.
+    The *_received stamps are time.monotonic(), a host-wide clock on Linux and
+    macOS, so readers in other processes can judge freshness too.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.buf = shm.buf
+        self.owner = owner
+        magic, slots = _HEADER.unpack_from(self.buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Shared memory '{shm.name}' does not hold a quote table.")
+        self.symbols = [_SYMBOL.unpack_from(self.buf, self._offset(i) + _SEQ.size)[0].rstrip(b'\0').decode()
+                        for i in range(slots)]
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self._seq = [0] * slots
+
+    @classmethod
+    def create(cls, name, symbols):
+        size = _HEADER.size + len(symbols) * _SLOT_SIZE
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a writer that did not shut down cleanly.
+            logging.warning(f"Replacing stale shared memory '{name}'.")
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _HEADER.pack_into(shm.buf, 0, _MAGIC, len(symbols))
+        for i, symbol in enumerate(symbols):
+            offset = _HEADER.size + i * _SLOT_SIZE
+            _SEQ.pack_into(shm.buf, offset, 0)
+            _SYMBOL.pack_into(shm.buf, offset + _SEQ.size, symbol.encode())
+            _BODY.pack_into(shm.buf, offset + _SEQ.size + _SYMBOL.size, *Quote.empty(symbol)[1:])
+        return cls(shm, owner=True)
+
+    @classmethod
+    def open(cls, name):
+        try:
+            shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:  # Python < 3.13 registers every attach with the resource tracker
+            from multiprocessing import resource_tracker
+            shm = shared_memory.SharedMemory(name)
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, owner=False)
+
+    @staticmethod
+    def _offset(i):
+        return _HEADER.size + i * _SLOT_SIZE
+
+    def write(self, i, quote):
+        offset = self._offset(i)
+        seq = self._seq[i] + 1
+        _SEQ.pack_into(self.buf, offset, seq)
+        _BODY.pack_into(self.buf, offset + _SEQ.size + _SYMBOL.size, *quote[1:])
+        _SEQ.pack_into(self.buf, offset, seq + 1)
+        self._seq[i] = seq + 1
+
+    def read(self, i):
+        offset = self._offset(i)
+        body = offset + _SEQ.size + _SYMBOL.size
+        for _ in range(MAX_READ_RETRIES):
+            before = _SEQ.unpack_from(self.buf, offset)[0]
+            if before & 1:
+                continue
+            fields = _BODY.unpack_from(self.buf, body)
+            if _SEQ.unpack_from(self.buf, offset)[0] == before:
+                return Quote(self.symbols[i], *fields)
+        return None
+
+    def close(self, unlink=False):
+        self.shm.close()
+        if unlink and self.owner:
+            self.shm.unlink()
+
+
+class SharedQuotes(_QuoteReader):
+    """Read-only view of another process's MarketData(shared_memory=name) quotes."""
+
+    def __init__(self, name):
+        self.table = QuoteTable.open(name)
+
+    @property
+    def symbols(self):
+        return self.table.symbols
+
+    def get(self, symbol):
+        i = self.table.index.get(symbol)
+        return self.table.read(i) if i is not None else None
+
+    def close(self):
+        self.table.close()
@@ -1,30 +1,29 @@
 
 import sys
 import os
+import asyncio
 import logging
-from binance.client import Client
-from binance.enums import *
-from binance.exceptions import BinanceAPIException, BinanceRequestException
-from bot_client import BasicBot
+from bot_logging import setup_logging
+from bot_daemon import send_command, DaemonCommandError
+from symbol_filters import FilterError
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("bot.log"),  
-        logging.StreamHandler()         
-    ]
-)
+setup_logging()
 
 api_key = os.getenv("BINANCE_API_KEY")
 api_secret = os.getenv("BINANCE_API_SECRET")
+# When set, orders go through a running bot_daemon.py instead of a fresh client.
+daemon_socket = os.getenv("BINANCE_BOT_SOCKET")
 
-if not api_key or not api_secret:
+if not daemon_socket and (not api_key or not api_secret):
     logging.error("BINANCE_API_KEY and BINANCE_API_SECRET environment variables must be set.")
     sys.exit(1)
 
+# --smart: split the order into IOC limit children across the live depth book (order_router.py)
+smart = '--smart' in sys.argv
+sys.argv = [arg for arg in sys.argv if arg != '--smart']
+
 if len(sys.argv) < 4:
-    logging.info("Usage: python src/market_orders.py <symbol> <side> <quantity>")
+    logging.info("Usage: python src/market_orders.py <symbol> <side> <quantity> [--smart]")
     sys.exit(1)
 
 symbol = sys.argv[1].upper()
@@ -35,44 +34,81 @@ except ValueError:
     logging.error("Error: Quantity must be a number.")
     sys.exit(1)
 
-if side_str == 'BUY':
-    side = SIDE_BUY
-elif side_str == 'SELL':
-    side = SIDE_SELL
-else:
+if side_str not in ('BUY', 'SELL'):
     logging.error("Error: Side must be 'BUY' or 'SELL'.")
     sys.exit(1)
+side = side_str
+
+
+def log_order(order):
+    logging.info("Order placed successfully! ")
+    logging.info(f"  - Order ID: {order['orderId']}")
+    logging.info(f"  - Symbol: {order['symbol']}")
+    logging.info(f"  - Side: {order['side']}")
+    logging.info(f"  - Type: {order['type']}")
+    logging.info(f"  - Status: {order['status']}")
+    logging.info(f"  - Original Quantity: {order['origQty']}")
+    logging.info(f"  - Executed Quantity: {order['executedQty']}")
+
+
+if daemon_socket and smart:
+    logging.error("--smart needs its own client and depth stream; unset BINANCE_BOT_SOCKET.")
+    sys.exit(1)
+
+if daemon_socket:
+    # The daemon rounds to the symbol filters itself, and this process never imports python-binance.
+    logging.info(f"Placing a MARKET {side_str} order for {quantity} {symbol}")
+    try:
+        log_order(send_command('futures_create_order', daemon_socket, symbol=symbol, side=side, type='MARKET',
+                               quantity=quantity))
+    except DaemonCommandError as e:
+        logging.error(f"Bot Daemon Error (Code {e.code}): {e.message}")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred: {e}")
+    sys.exit(0)
+
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+from bot_client import BasicBot
+
+if smart:
+    from order_router import route_order
+    try:
+        bot = BasicBot(api_key, api_secret, testnet=True)
+        logging.info(f"Routing a MARKET {side_str} order for {quantity} {symbol} across the book")
+        report = asyncio.run(route_order(bot.client, bot.stream_url, symbol, side, quantity))
+    except (BinanceAPIException, BinanceRequestException) as e:
+        logging.error(f"Binance Error: {e.message}")
+        sys.exit(1)
+    except Exception as e:
+        logging.error(f"Smart routing failed: {e}")
+        sys.exit(1)
+    for child in report['children']:
+        logging.info(f"  - Child {child['order_id']} (round {child['round']}): {child['executed']}/{child['quantity']} "
+                     f"at {child['price'] or 'MARKET'}, {child['status']}")
+    logging.info(f"  - Executed Quantity: {report['executed']} of {report['requested']}")
+    logging.info(f"  - Average Price: {report['avg_price']} (mid {report['mid']}, slippage {report['slippage_bps']} bps)")
+    sys.exit(0)
 
 try:
     bot = BasicBot(api_key, api_secret, testnet=True)
-    client = bot.client
 except Exception as e:
     logging.error(f"Failed to initialize Binance client: {e}")
     sys.exit(1)
+
 try:
     logging.info(f"Placing a MARKET {side_str} order for {quantity} {symbol}")
-    
-    order = client.futures_create_order(
+    log_order(bot.client.futures_create_order(**bot.filters.prepare_order(dict(
         symbol=symbol,
         side=side,
-        type=ORDER_TYPE_MARKET,
+        type='MARKET',
         quantity=quantity
-    )
-
-    logging.info("Order placed successfully! ")
-    logging.info(f"  - Order ID: {order['orderId']}")
-    logging.info(f"  - Symbol: {order['symbol']}")
-    logging.info(f"  - Side: {order['side']}")
-    logging.info(f"  - Type: {order['type']}")
-    logging.info(f"  - Status: {order['status']}")
-    
- 
-    logging.info(f"  - Original Quantity: {order['origQty']}")
-    logging.info(f"  - Executed Quantity: {order['executedQty']}")
+    ))))
 
 except BinanceAPIException as e:
     logging.error(f"Binance API Error (Code {e.code}): {e.message}")
 except BinanceRequestException as e:
     logging.error(f"Binance Request Error: {e.message}")
+except FilterError as e:
+    logging.error(f"Order rejected before sending: {e}")
 except Exception as e:
-    logging.error(f"An unexpected error occurred: {e}")
\ No newline at end of file
+    logging.error(f"An unexpected error occurred: {e}")
@@ -0,0 +1,184 @@
+# src/order_router.py
+
+import asyncio
+import logging
+import time
+import uuid
+from decimal import Decimal
+
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+try:
+    from src.depth_book import DepthBook
+    from src.symbol_filters import SymbolFilterCache
+except ImportError:  # run as a script from src/
+    from depth_book import DepthBook
+    from symbol_filters import SymbolFilterCache
+
+MAX_LEVELS = 10
+MAX_ROUNDS = 3
+# Levels further than this from the mid at the start are never taken.
+MAX_SLIPPAGE_BPS = 50
+# How long to wait for the depth stream to reflect a round's fills before planning the next one.
+SETTLE_SECONDS = 0.5
+SYNC_TIMEOUT = 10.0
+ZERO = Decimal(0)
+
+
+class SmartOrderRouter:
+    """Executes a parent market order as concurrent IOC limit children sized to a local DepthBook.
+
+    Each round walks the opposite side of the book from the best level and
+    gives every level a child for up to participation x its visible quantity,
+    priced at that level, then sends them all at once. Quantity a level is too
+    small to carry after step-size and min-notional rounding rolls into the
+    next level's child. What the children leave unfilled is re-planned from
+    the updated book, for up to max_rounds. Levels more than max_slippage_bps
+    from the starting mid are never used; what is still left at the end is
+    reported as unfilled or, with finish_market, sent as one MARKET order.
+    """
+
+    def __init__(self, client, book, max_levels=MAX_LEVELS, participation=1.0, max_slippage_bps=MAX_SLIPPAGE_BPS,
+                 max_rounds=MAX_ROUNDS, finish_market=False):
+        self.client = client
+        self.book = book
+        self.symbol = book.symbol
+        self.max_levels = max_levels
+        self.participation = Decimal(str(participation))
+        self.max_slippage_bps = max_slippage_bps
+        self.max_rounds = max_rounds
+        self.finish_market = finish_market
+        self.filters = SymbolFilterCache.for_client(client)
+
+    def plan(self, side, quantity, mid):
+        """[(price, quantity)] children for up to quantity against the current book, best level first."""
+        filters = self.filters.get(self.symbol)
+        band = mid * Decimal(self.max_slippage_bps) / 10000
+        limit = mid + band if side == 'BUY' else mid - band
+        children = []
+        remaining, carry = quantity, ZERO
+        for price, available in self.book.levels('SELL' if side == 'BUY' else 'BUY', self.max_levels):
+            if (side == 'BUY' and price > limit) or (side == 'SELL' and price < limit):
+                break
+            wanted = min(remaining, carry + available * self.participation)
+            qty = filters.round_quantity(wanted)
+            if qty < filters.min_qty or qty <= 0 or not filters.meets_min_notional(qty, price):
+                carry = wanted
+                continue
+            if filters.max_qty:
+                qty = min(qty, filters.max_qty)
+            children.append((price, qty))
+            remaining -= qty
+            carry = wanted - qty
+            if remaining <= 0:
+                break
+        return children
+
+    async def execute(self, side, quantity, finish_market=None):
+        """Routes side/quantity through the book. Returns a report with fills and slippage against the mid."""
+        started = time.perf_counter()
+        quantity = Decimal(str(quantity))
+        finish_market = self.finish_market if finish_market is None else finish_market
+        if not self.book.synced.is_set():
+            await asyncio.wait_for(self.book.synced.wait(), SYNC_TIMEOUT)
+        mid = self.book.mid()
+        if mid is None:
+            raise ValueError(f"The {self.symbol} depth book has no bid or no ask to route against.")
+
+        children = []
+        executed = quote = ZERO
+        rounds = 0
+        while rounds < self.max_rounds and executed < quantity:
+            plan = self.plan(side, quantity - executed, mid)
+            if not plan:
+                break
+            rounds += 1
+            before = self.book.last_update_id
+            # Every child reports, even if one raises, so the fills of its siblings are never lost.
+            results = await asyncio.gather(*(asyncio.to_thread(self._send, side, qty, price)
+                                             for price, qty in plan), return_exceptions=True)
+            for (price, qty), result in zip(plan, results):
+                if isinstance(result, BaseException):
+                    result = self._failed(qty, price, result)
+                filled, value = self._record(children, rounds, price, qty, result)
+                executed += filled
+                quote += value
+            if executed < quantity:
+                await self.book.wait_changed(SETTLE_SECONDS, since=before)
+
+        if finish_market and executed < quantity:
+            filters = self.filters.get(self.symbol)
+            qty = filters.round_quantity(quantity - executed, market=True)
+            if qty >= filters.market_min_qty and qty > 0:
+                result = await asyncio.to_thread(self._send, side, qty)
+                filled, value = self._record(children, rounds + 1, None, qty, result)
+                executed += filled
+                quote += value
+
+        avg_price = quote / executed if executed else None
+        slippage = None
+        if avg_price is not None:
+            slippage = (avg_price - mid) / mid * 10000
+            slippage = round(float(slippage if side == 'BUY' else -slippage), 2)
+        elapsed = (time.perf_counter() - started) * 1000
+        logging.info("Routed %s %s %s in %d children over %d rounds: executed %s at avg %s, "
+                     "slippage %s bps vs mid %s (%.1f ms).", side, quantity, self.symbol, len(children), rounds,
+                     executed, avg_price, slippage, mid, elapsed, extra={'symbol': self.symbol})
+        return {
+            'symbol': self.symbol,
+            'side': side,
+            'requested': str(quantity),
+            'executed': str(executed),
+            'unfilled': str(quantity - executed),
+            'avg_price': str(avg_price) if avg_price is not None else None,
+            'mid': str(mid),
+            'slippage_bps': slippage,
+            'rounds': rounds,
+            'children': children,
+            'elapsed_ms': round(elapsed, 3),
+        }
+
+    def _send(self, side, quantity, price=None):
+        params = {'symbol': self.symbol, 'side': side, 'quantity': str(quantity),
+                  'newClientOrderId': f"sor-{uuid.uuid4().hex[:20]}", 'newOrderRespType': 'RESULT'}
+        if price is None:
+            params['type'] = 'MARKET'
+        else:
+            params.update(type='LIMIT', timeInForce='IOC', price=str(price))
+        try:
+            return self.client.futures_create_order(**params)
+        except (BinanceAPIException, BinanceRequestException) as e:
+            logging.error("Child order of %s at %s failed: %s", quantity, price or 'MARKET', e.message,
+                          extra={'symbol': self.symbol, 'code': getattr(e, 'code', None)})
+            return {'code': getattr(e, 'code', None), 'msg': e.message}
+        except Exception as e:  # a RiskError/FilterError refusal, or a timeout with the order's fate unknown
+            return self._failed(quantity, price, e)
+
+    def _failed(self, quantity, price, error):
+        logging.error("Child order of %s at %s failed: %s", quantity, price or 'MARKET', error,
+                      extra={'symbol': self.symbol})
+        return {'code': getattr(error, 'code', None), 'msg': str(error) or type(error).__name__}
+
+    @staticmethod
+    def _record(children, round_number, price, quantity, result):
+        """Adds one child to the report. Returns its (executed quantity, quote value)."""
+        filled = Decimal(result.get('executedQty') or '0')
+        avg_price = Decimal(result.get('avgPrice') or '0')
+        children.append({'round': round_number, 'price': str(price) if price is not None else None,
+                         'quantity': str(quantity), 'executed': str(filled),
+                         'avg_price': str(avg_price) if filled else None,
+                         'status': result.get('status') or result.get('msg'), 'order_id': result.get('orderId')})
+        return filled, filled * avg_price
+
+
+async def route_order(client, stream_url, symbol, side, quantity, **options):
+    """Builds a depth book for one parent order, routes it and tears the book down. Returns the report."""
+    book = DepthBook(client, stream_url, symbol)
+    task = asyncio.create_task(book.run())
+    try:
+        await asyncio.wait_for(book.synced.wait(), SYNC_TIMEOUT)
+        return await SmartOrderRouter(client, book, **options).execute(side, quantity)
+    finally:
+        await book.stop()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
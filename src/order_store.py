@@ -0,0 +1,234 @@
+# src/order_store.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from decimal import Decimal
+
+OPEN_STATUSES = {'NEW', 'PARTIALLY_FILLED'}
+RESYNC_INTERVAL = 5 * 60
+# Until the first snapshot succeeds, failed resyncs are retried from this delay, doubling.
+SYNC_RETRY_DELAY = 1.0
+ORDER_NOT_FOUND_CODE = -2013
+# Closed orders are kept for lookups by late readers, up to this many.
+MAX_CLOSED_ORDERS = 10000
+ZERO = Decimal(0)
+
+
+class OrderRecord:
+    __slots__ = ('order_id', 'client_order_id', 'symbol', 'side', 'type', 'status', 'price', 'stop_price',
+                 'quantity', 'executed', 'avg_price', 'update_time')
+
+    def __init__(self, order_id, client_order_id, symbol, side, type, status, price, stop_price,
+                 quantity, executed, avg_price, update_time):
+        self.order_id = order_id
+        self.client_order_id = client_order_id
+        self.symbol = symbol
+        self.side = side
+        self.type = type
+        self.status = status
+        self.price = price
+        self.stop_price = stop_price
+        self.quantity = quantity
+        self.executed = executed
+        self.avg_price = avg_price
+        self.update_time = update_time
+
+    @classmethod
+    def from_rest(cls, order):
+        return cls(order['orderId'], order['clientOrderId'], order['symbol'], order['side'], order['type'],
+                   order['status'], Decimal(order['price']), Decimal(order.get('stopPrice') or '0'),
+                   Decimal(order['origQty']), Decimal(order['executedQty']), Decimal(order.get('avgPrice') or '0'),
+                   order.get('updateTime') or order.get('time') or 0)
+
+    @classmethod
+    def from_event(cls, o):
+        return cls(o['i'], o['c'], o['s'], o['S'], o['o'], o['X'], Decimal(o['p']), Decimal(o.get('sp') or '0'),
+                   Decimal(o['q']), Decimal(o['z']), Decimal(o.get('ap') or '0'), o['T'])
+
+    @property
+    def is_open(self):
+        return self.status in OPEN_STATUSES
+
+    def sequence(self):
+        """Orders successive states of one order: later time, more filled, then closed after open."""
+        return self.update_time, self.executed, not self.is_open
+
+
+class PositionRecord:
+    __slots__ = ('symbol', 'amount', 'entry_price', 'update_time')
+
+    def __init__(self, symbol, amount, entry_price, update_time):
+        self.symbol = symbol
+        self.amount = amount
+        self.entry_price = entry_price
+        self.update_time = update_time
+
+
+class OrderStore:
+    """Local book of orders and positions, kept current from user-data stream deltas.
+
+    Lookups by orderId and clientOrderId, and the open orders of a symbol, are
+    dict reads. Every delta and snapshot row is applied only if it is newer than
+    the stored state (by exchange time, then filled quantity, then open before
+    closed), so late or replayed events never roll an order back. A full REST
+    snapshot resyncs the book when it starts, after every reconnect and every
+    resync_interval seconds. Until the first snapshot has succeeded (and
+    synced is set), a failed one is retried within seconds.
+    """
+
+    def __init__(self, client, resync_interval=RESYNC_INTERVAL, max_closed=MAX_CLOSED_ORDERS):
+        self.client = client
+        self.resync_interval = resync_interval
+        self.orders = {}  # orderId -> OrderRecord
+        self.by_client_id = {}  # clientOrderId -> OrderRecord
+        self.open_orders_by_symbol = {}  # symbol -> {orderId: OrderRecord}
+        self.positions = {}  # symbol -> PositionRecord
+        self.closed = deque()
+        self.max_closed = max_closed
+        self.synced = asyncio.Event()
+        self.stale_events = 0
+        self.resyncs = 0
+        self._resync_task = None
+
+    # --- Reads ---
+    def get(self, order_id=None, client_order_id=None):
+        if order_id is not None:
+            return self.orders.get(order_id)
+        return self.by_client_id.get(client_order_id)
+
+    def open_orders(self, symbol):
+        return list(self.open_orders_by_symbol.get(symbol, {}).values())
+
+    def position(self, symbol):
+        return self.positions.get(symbol)
+
+    # --- Stream ---
+    def attach(self, stream):
+        """Subscribes to every order and account event of a stream and resyncs first on each reconnect."""
+        stream.on('ORDER_TRADE_UPDATE', self.apply_order_event)
+        stream.on('ACCOUNT_UPDATE', self.apply_account_event)
+        stream.on_reconnect(self.resync, first=True)
+        stream.order_store = self
+
+    def detach(self, stream):
+        stream.off('ORDER_TRADE_UPDATE', self.apply_order_event)
+        stream.off('ACCOUNT_UPDATE', self.apply_account_event)
+        stream.off_reconnect(self.resync)
+        stream.order_store = None
+
+    async def run(self, stream):
+        """Takes the first snapshot once the stream is live, then resyncs every resync_interval seconds."""
+        delay = SYNC_RETRY_DELAY
+        while True:
+            await stream.connected.wait()
+            try:
+                await self.resync()
+            except Exception as e:
+                logging.error(f"Order store resync failed: {e}")
+                if not self.synced.is_set():
+                    # Readers wait on the first snapshot, so do not make them wait out the full interval.
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.resync_interval)
+                    continue
+            await asyncio.sleep(self.resync_interval)
+
+    def apply_order_event(self, event):
+        self.apply(OrderRecord.from_event(event['o']))
+
+    def apply_account_event(self, event):
+        update_time = event['T']
+        for p in event['a'].get('P', ()):
+            if p.get('ps', 'BOTH') == 'BOTH':
+                self._apply_position(p['s'], Decimal(p['pa']), Decimal(p['ep']), update_time)
+
+    # --- Snapshots ---
+    async def resync(self):
+        """Replaces drifted state with a REST snapshot. Concurrent callers share one snapshot."""
+        if self._resync_task is None or self._resync_task.done():
+            self._resync_task = asyncio.create_task(self._resync())
+        await asyncio.shield(self._resync_task)
+
+    async def _resync(self):
+        started = int(time.time() * 1000) + self.client.timestamp_offset
+        open_orders, positions = await asyncio.gather(
+            asyncio.to_thread(self.client.futures_get_open_orders),
+            asyncio.to_thread(self.client.futures_position_information))
+
+        missing = self.apply_snapshot(open_orders, positions, started)
+        # Orders we hold as open that closed while we were not listening: fetch how they ended.
+        for record in missing:
+            try:
+                order = await asyncio.to_thread(self.client.futures_get_order, symbol=record.symbol,
+                                                orderId=record.order_id)
+            except Exception as e:
+                # One lookup must not fail the whole snapshot; the order is tried again on the next resync.
+                logging.warning(f"Could not look up order {record.order_id} ({record.symbol}): {e}")
+                if getattr(e, 'code', None) == ORDER_NOT_FOUND_CODE:
+                    self._forget(record)
+                continue
+            self.apply(OrderRecord.from_rest(order))
+        self.resyncs += 1
+        self.synced.set()
+        logging.info(f"Order store resynced: {sum(map(len, self.open_orders_by_symbol.values()))} open orders, "
+                     f"{len(missing)} closed while away.")
+
+    def apply_snapshot(self, open_orders, positions, started):
+        """Applies REST snapshot rows. Returns the records that should be open but were not in the snapshot."""
+        snapshot_ids = set()
+        for order in open_orders:
+            snapshot_ids.add(order['orderId'])
+            self.apply(OrderRecord.from_rest(order))
+        missing = [record for symbol_orders in self.open_orders_by_symbol.values()
+                   for record in symbol_orders.values()
+                   if record.order_id not in snapshot_ids and record.update_time <= started]
+
+        held = set()
+        for p in positions:
+            if p.get('positionSide', 'BOTH') == 'BOTH':
+                held.add(p['symbol'])
+                self._apply_position(p['symbol'], Decimal(p['positionAmt']), Decimal(p['entryPrice']),
+                                     p.get('updateTime') or started)
+        for symbol in set(self.positions) - held:
+            self._apply_position(symbol, ZERO, ZERO, started)
+        return missing
+
+    # --- Updates ---
+    def apply(self, record):
+        """Stores one order state unless the stored state is newer. Returns True if it was applied."""
+        current = self.orders.get(record.order_id)
+        if current is not None and record.sequence() < current.sequence():
+            self.stale_events += 1
+            return False
+
+        self.orders[record.order_id] = record
+        self.by_client_id[record.client_order_id] = record
+        symbol_orders = self.open_orders_by_symbol.setdefault(record.symbol, {})
+        if record.is_open:
+            symbol_orders[record.order_id] = record
+        elif symbol_orders.pop(record.order_id, None) is not None or current is None:
+            self._retire(record)
+        return True
+
+    def _forget(self, record):
+        """Closes an open order the exchange no longer knows of (archived or never accepted)."""
+        record.status = 'EXPIRED'
+        if self.open_orders_by_symbol.get(record.symbol, {}).pop(record.order_id, None) is not None:
+            self._retire(record)
+
+    def _retire(self, record):
+        self.closed.append(record.order_id)
+        while len(self.closed) > self.max_closed:
+            old = self.orders.get(self.closed.popleft())
+            if old is not None and not old.is_open:
+                del self.orders[old.order_id]
+                if self.by_client_id.get(old.client_order_id) is old:
+                    del self.by_client_id[old.client_order_id]
+
+    def _apply_position(self, symbol, amount, entry_price, update_time):
+        current = self.positions.get(symbol)
+        if current is not None and update_time < current.update_time:
+            self.stale_events += 1
+            return
+        self.positions[symbol] = PositionRecord(symbol, amount, entry_price, update_time)
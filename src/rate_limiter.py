@@ -0,0 +1,230 @@
+# src/rate_limiter.py
+
+import heapq
+import itertools
+import re
+from urllib.parse import unquote
+import threading
+import time
+
+# Lower value = served first when requests are queued.
+PRIORITY_CANCEL = 0
+PRIORITY_ORDER = 1
+PRIORITY_QUERY = 2
+PRIORITY_NAMES = {PRIORITY_CANCEL: 'cancel', PRIORITY_ORDER: 'order', PRIORITY_QUERY: 'query'}
+
+INTERVAL_SECONDS = {'S': 1, 'SECOND': 1, 'M': 60, 'MINUTE': 60, 'H': 3600, 'HOUR': 3600, 'D': 86400, 'DAY': 86400}
+
+# (method, path) -> (IP weight, order count) for USD-M futures endpoints.
+# Unlisted endpoints cost weight 1 and no orders.
+ENDPOINT_COSTS = {
+    ('POST', 'order'): (0, 1),
+    ('PUT', 'order'): (0, 1),
+    ('DELETE', 'batchOrders'): (1, 0),
+    ('GET', 'allOrders'): (5, 0),
+    ('GET', 'positionRisk'): (5, 0),
+    ('GET', 'account'): (5, 0),
+    ('GET', 'balance'): (5, 0),
+}
+CANCEL_PATHS = {'order', 'batchOrders', 'allOpenOrders'}
+ORDER_PATHS = {'order', 'batchOrders', 'listenKey'}
+
+HEADER_PATTERN = re.compile(r'^x-mbx-(used-weight|order-count)-(\d+)([smhd])$', re.IGNORECASE)
+
+
+def request_cost(method, path, params=None):
+    """Returns (weight, orders) for one futures request."""
+    params = params or {}
+    if (method, path) in ENDPOINT_COSTS:
+        return ENDPOINT_COSTS[(method, path)]
+    if path == 'batchOrders' and method == 'POST':
+        # Every order in the batch counts against the order limits.
+        return 5, batch_size(params.get('batchOrders'))
+    if path == 'openOrders' and method == 'GET':
+        return (1 if params.get('symbol') else 40), 0
+    if path == 'depth':
+        limit = int(params.get('limit', 500))
+        return (2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20), 0
+    if path in ('ticker/price', 'ticker/bookTicker'):
+        return (1 if params.get('symbol') else 2), 0
+    if path == 'klines':
+        limit = int(params.get('limit', 500))
+        return (1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10), 0
+    return 1, 0
+
+
+def batch_size(batch_orders):
+    """Orders in a batchOrders param: a list, or the URL-encoded JSON string python-binance sends."""
+    if isinstance(batch_orders, (list, tuple)):
+        return max(1, len(batch_orders))
+    if isinstance(batch_orders, str):
+        # Each order carries a newClientOrderId, which python-binance fills in when missing.
+        return max(1, unquote(batch_orders).count('"newClientOrderId"'))
+    return 1
+
+
+def request_priority(method, path):
+    if method == 'DELETE' and path in CANCEL_PATHS:
+        return PRIORITY_CANCEL
+    if method in ('POST', 'PUT') and path in ORDER_PATHS:
+        return PRIORITY_ORDER
+    return PRIORITY_QUERY
+
+
+class TokenBucket:
+    """Bucket refilled to its limit at each wall-clock interval boundary.
+
+    Binance counts weight and orders in fixed windows aligned to the clock, so
+    refilling on the same boundaries (rather than continuously) never lets more
+    through than the exchange will accept. Server-reported usage can only lower
+    the balance.
+    """
+    __slots__ = ('kind', 'limit', 'interval', 'tokens', 'window')
+
+    def __init__(self, kind, limit, interval):
+        self.kind = kind
+        self.limit = limit
+        self.interval = interval
+        self.tokens = limit
+        self.window = int(time.time() // interval)
+
+    def refill(self, now):
+        window = int(now // self.interval)
+        if window != self.window:
+            self.window = window
+            self.tokens = self.limit
+
+    def wait_time(self, amount, now):
+        if self.tokens >= min(amount, self.limit):
+            return 0.0
+        return (self.window + 1) * self.interval - now
+
+    def observe_used(self, used, now):
+        self.refill(now)
+        self.tokens = min(self.tokens, self.limit - used)
+
+
+class RateLimiter:
+    """Central scheduler for all REST calls of one API key / IP.
+
+    Tracks request weight and order counts in per-window token buckets, learns the real
+    limits from exchangeInfo and corrects its balance from X-MBX-* response
+    headers, so other processes sharing the IP are accounted for. When requests
+    have to wait, cancels go first, then order placement, then status queries.
+    safety keeps a share of each limit in reserve.
+    """
+
+    def __init__(self, weight_limit=2400, order_limit_10s=300, order_limit_1m=1200, safety=0.9):
+        self.safety = safety
+        self.buckets = {}
+        self._set_bucket('REQUEST_WEIGHT', 60, weight_limit)
+        self._set_bucket('ORDERS', 10, order_limit_10s)
+        self._set_bucket('ORDERS', 60, order_limit_1m)
+        self.blocked_until = 0.0
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._stats = {priority: [0, 0.0, 0.0] for priority in PRIORITY_NAMES}  # count, total wait, max wait
+        self.throttled = 0
+
+    def _set_bucket(self, kind, interval, limit):
+        self.buckets[(kind, interval)] = TokenBucket(kind, max(1, int(limit * self.safety)), interval)
+
+    def configure(self, exchange_info):
+        """Replaces the default limits with the rateLimits section of futures exchangeInfo."""
+        with self._condition:
+            self.buckets = {}
+            for rate_limit in exchange_info.get('rateLimits', []):
+                kind = rate_limit['rateLimitType']
+                if kind not in ('REQUEST_WEIGHT', 'ORDERS'):
+                    continue
+                interval = INTERVAL_SECONDS[rate_limit['interval']] * rate_limit.get('intervalNum', 1)
+                self._set_bucket(kind, interval, rate_limit['limit'])
+            self._condition.notify_all()
+
+    def acquire(self, method, path, params=None, priority=None):
+        """Blocks until the request may be sent. Returns the seconds spent waiting."""
+        weight, orders = request_cost(method, path, params)
+        if priority is None:
+            priority = request_priority(method, path)
+        start = time.monotonic()
+
+        with self._condition:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    wait = self.blocked_until - time.monotonic()
+                    if self._waiters[0] == entry and wait <= 0:
+                        wait = self._wait_time(time.time(), weight, orders)
+                        if wait <= 0:
+                            break
+                    self._condition.wait(timeout=wait if wait > 0 else None)
+                self._consume(weight, orders)
+                waited = time.monotonic() - start
+                stats = self._stats[priority]
+                stats[0] += 1
+                stats[1] += waited
+                stats[2] = max(stats[2], waited)
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._condition.notify_all()
+        return waited
+
+    def _wait_time(self, now, weight, orders):
+        wait = 0.0
+        for (kind, _), bucket in self.buckets.items():
+            amount = weight if kind == 'REQUEST_WEIGHT' else orders
+            if amount:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount, now))
+        return wait
+
+    def _consume(self, weight, orders):
+        for (kind, _), bucket in self.buckets.items():
+            bucket.tokens -= weight if kind == 'REQUEST_WEIGHT' else orders
+
+    def observe(self, status_code, headers):
+        """Syncs the buckets with the usage the exchange reports and honours 429/418 back-offs."""
+        now = time.time()
+        with self._condition:
+            for name, value in headers.items():
+                match = HEADER_PATTERN.match(name)
+                if not match:
+                    continue
+                kind = 'REQUEST_WEIGHT' if match.group(1).lower() == 'used-weight' else 'ORDERS'
+                interval = int(match.group(2)) * INTERVAL_SECONDS[match.group(3).upper()]
+                bucket = self.buckets.get((kind, interval))
+                if bucket is not None:
+                    bucket.observe_used(int(value), now)
+
+            if status_code in (418, 429):
+                self.throttled += 1
+                retry_after = headers.get('Retry-After')
+                backoff = float(retry_after) if retry_after else (60.0 if status_code == 429 else 120.0)
+                self.blocked_until = max(self.blocked_until, time.monotonic() + backoff)
+            self._condition.notify_all()
+
+    def metrics(self):
+        """Snapshot of queue depth, remaining capacity and wait times per priority."""
+        with self._condition:
+            now = time.time()
+            buckets = {}
+            for (kind, interval), bucket in self.buckets.items():
+                bucket.refill(now)
+                buckets[f"{kind}_{interval}s"] = {'limit': bucket.limit, 'available': bucket.tokens}
+            return {
+                'queue_depth': len(self._waiters),
+                'blocked_for': max(0.0, self.blocked_until - time.monotonic()),
+                'throttled_responses': self.throttled,
+                'buckets': buckets,
+                'waits': {
+                    PRIORITY_NAMES[priority]: {
+                        'count': count,
+                        'avg_wait': total / count if count else 0.0,
+                        'max_wait': worst,
+                    }
+                    for priority, (count, total, worst) in self._stats.items()
+                },
+            }
@@ -0,0 +1,564 @@
+# src/risk.py
+#
+# Pre-trade risk gate for one account. Exposure, open-order notional and PnL
+# are kept incrementally from the orders sent through the gate, user-data
+# stream fills and market-data prices, so checking an order is a few dict
+# reads and float operations under a lock, with no network call.
+
+import asyncio
+import logging
+import threading
+
+from binance.exceptions import BinanceAPIException
+
+try:
+    from src.batch_orders import cancel_orders_batched, is_rejected
+    from src.order_store import OPEN_STATUSES
+    from src.symbol_filters import FilterError
+except ImportError:  # run as a script from src/
+    from batch_orders import cancel_orders_batched, is_rejected
+    from order_store import OPEN_STATUSES
+    from symbol_filters import FilterError
+
+# Limits a symbols entry may override for that symbol.
+SYMBOL_LIMITS = ('max_order_notional', 'max_position_notional')
+# An order whose request failed without a definite answer is looked up this long after, doubling while unknown.
+RESOLVE_DELAY = 5.0
+MAX_RESOLVE_DELAY = 300.0
+ORDER_NOT_FOUND_CODE = -2013
+
+
+class RiskError(FilterError):
+    """An order refused by the pre-trade risk check; nothing was sent."""
+
+
+def _flag(value):
+    return value is True or str(value).lower() == 'true'
+
+
+class SymbolExposure:
+    """Running position, open order quantities and price of one symbol; notionals are at the last price."""
+    __slots__ = ('symbol', 'position', 'entry_price', 'open_buy', 'open_sell', 'price', 'worst_case', 'held',
+                 'unrealized', 'max_order_notional', 'max_position_notional')
+
+    def __init__(self, symbol, max_order_notional=None, max_position_notional=None):
+        self.symbol = symbol
+        self.position = 0.0
+        self.entry_price = 0.0
+        self.open_buy = 0.0
+        self.open_sell = 0.0
+        self.price = 0.0
+        self.worst_case = 0.0  # notional if every open buy, or every open sell, filled
+        self.held = 0.0  # notional of the position itself
+        self.unrealized = 0.0
+        self.max_order_notional = max_order_notional
+        self.max_position_notional = max_position_notional
+
+    def worst_case_notional(self, buy=0.0, sell=0.0, price=None):
+        return max(abs(self.position + self.open_buy + buy), abs(self.position - self.open_sell - sell)) * \
+            (price or self.price)
+
+    def fill(self, side, quantity, price):
+        """Moves the position and its average entry price by one fill."""
+        signed = quantity if side == 'BUY' else -quantity
+        position = self.position
+        if position == 0 or (position > 0) == (signed > 0):
+            self.entry_price = (self.entry_price * abs(position) + price * quantity) / (abs(position) + quantity)
+        elif quantity > abs(position):
+            self.entry_price = price  # flipped: the remainder opened at this price
+        # Rounded so a position closed over many fills comes back to exactly zero.
+        self.position = round(position + signed, 12)
+        if self.position == 0:
+            self.entry_price = 0.0
+
+
+class TrackedOrder:
+    __slots__ = ('symbol', 'side', 'price', 'remaining', 'filled', 'reduce_only', 'confirmed')
+
+    def __init__(self, symbol, side, price, reduce_only=False, filled=0.0):
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.remaining = 0.0
+        self.filled = filled
+        self.reduce_only = reduce_only
+        self.confirmed = False  # seen on the stream, so it is on the exchange
+
+
+class RiskEngine:
+    """Checks every order against account and per-symbol limits before it is sent.
+
+    The client's futures_create_order and futures_place_batch_order (sync and
+    async) call check() first, which raises RiskError, a FilterError, for an
+    order that would break a limit. Orders that pass are counted as open
+    straight away, so a burst of orders cannot slip past a limit between the
+    request and its stream event. Fills, cancels and expiries from the
+    user-data stream and prices from MarketData update the running totals in
+    O(1) per event, and sync() rebuilds them from an OrderStore after
+    reconnects. Reduce-only and closePosition orders always pass. An order
+    with no price of its own on a symbol with no price yet is sized at the
+    REST mark price; if that lookup fails it is checked without its notional
+    limits, and a warning is logged.
+
+    Limits (None turns one off), all in quote currency except the counts:
+    max_order_notional per order; max_position_notional per symbol, for the
+    largest position the open orders could leave if every buy (or every
+    sell) filled; max_gross_notional for that worst case summed over
+    symbols; max_open_notional and max_open_orders for orders not yet
+    filled; max_leverage for the gross worst case over equity plus PnL;
+    max_loss for realized plus unrealized PnL. symbols maps a symbol to its
+    own max_order_notional / max_position_notional.
+
+    The kill switch trips when PnL falls to -max_loss, or when the filled
+    positions alone (after a fill, or as prices move) go over the position,
+    gross or leverage limit. From then on every order other than reduce-only
+    is refused, and every open order the engine knows of, reduce-only ones
+    included, is batch-cancelled, as is any order other than reduce-only that
+    reaches the exchange afterwards. kill() trips it by hand and reset()
+    re-arms it.
+    """
+
+    def __init__(self, client, max_order_notional=None, max_position_notional=None, max_gross_notional=None,
+                 max_open_notional=None, max_open_orders=None, max_leverage=None, max_loss=None, equity=None,
+                 symbols=None):
+        if max_leverage is not None and not equity:
+            raise ValueError("max_leverage needs the account equity.")
+        self.client = client
+        self.max_order_notional = max_order_notional
+        self.max_position_notional = max_position_notional
+        self.max_gross_notional = max_gross_notional
+        self.max_open_notional = max_open_notional
+        self.max_open_orders = max_open_orders
+        self.max_leverage = max_leverage
+        self.max_loss = max_loss
+        self.equity = equity or 0.0
+        self.symbol_limits = {}
+        for symbol, limits in (symbols or {}).items():
+            unknown = set(limits) - set(SYMBOL_LIMITS)
+            if unknown:
+                raise ValueError(f"Unknown limit(s) for {symbol}: {', '.join(sorted(unknown))}. "
+                                 f"Expected: {', '.join(SYMBOL_LIMITS)}")
+            self.symbol_limits[symbol] = limits
+
+        self.symbols = {}  # symbol -> SymbolExposure
+        self.orders = {}  # clientOrderId -> TrackedOrder, open or reserved
+        self.gross = 0.0  # sum of the symbols' worst cases
+        self.held = 0.0  # sum of the symbols' position notionals
+        self.open_notional = 0.0
+        self.open_orders = 0
+        self.realized = 0.0
+        self.unrealized = 0.0
+        self.refused = 0
+        self.killed = False
+        self.kill_reason = None
+        self._synced_fills = {}  # clientOrderId -> filled quantity of orders already closed at the last sync
+        self.store = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, client, **limits):
+        """The gate of everything using this client, created on first use."""
+        risk = getattr(client, 'risk', None)
+        if risk is None:
+            risk = client.risk = cls(client, **limits)
+        return risk
+
+    # --- Pre-trade ---
+    def check(self, params):
+        """Counts an order as open if it passes every limit, else raises RiskError.
+
+        params must carry newClientOrderId; send_failed() it if its request raises.
+        """
+        if _flag(params.get('reduceOnly')) or _flag(params.get('closePosition')):
+            return
+        if self.killed:
+            self.refused += 1
+            raise RiskError(f"Kill switch tripped ({self.kill_reason}); only reduce-only orders are accepted.")
+        symbol, side = params['symbol'], params['side']
+        quantity = float(params['quantity'])
+        price = float(params.get('price') or params.get('stopPrice') or 0)
+        if not price and not getattr(self.symbols.get(symbol), 'price', 0):
+            price = self._mark_price(symbol)  # no MarketData price yet; one REST call, outside the lock
+        with self._lock:
+            state = self.symbols.get(symbol) or self._add_symbol(symbol)
+            price = price or state.price
+            if not price:
+                logging.warning(f"No price known for {symbol}; {params.get('type')} order checked without "
+                                f"its notional limits.")
+            error = self._breaks_limit(state, side, quantity, price)
+            if error:
+                self.refused += 1
+                raise RiskError(error)
+            if not state.price:
+                state.price = price  # stands in until the market data has a price
+            order = self.orders[params['newClientOrderId']] = TrackedOrder(symbol, side, price)
+            self.open_orders += 1
+            self._set_remaining(order, state, quantity)
+            self._refresh(state)
+
+    def _mark_price(self, symbol):
+        """The symbol's mark price from REST, or 0.0 if it cannot be fetched."""
+        try:
+            return float(self.client.futures_mark_price(symbol=symbol)['markPrice'])
+        except Exception as e:
+            logging.warning(f"Could not fetch the {symbol} mark price: {e}")
+            return 0.0
+
+    def check_amend(self, params):
+        """Checks an in-place amendment (futures_modify_order params) and raises RiskError if it breaks a limit.
+
+        The amended order is weighed in place of what it had open. Nothing is
+        reserved: the stream event for the amendment reprices the order.
+        """
+        with self._lock:
+            order = self.orders.get(params.get('origClientOrderId'))
+            if order is not None and order.reduce_only:
+                return
+            if self.killed:
+                self.refused += 1
+                raise RiskError(f"Kill switch tripped ({self.kill_reason}); only reduce-only orders are accepted.")
+            symbol = params['symbol']
+            state = self.symbols.get(symbol) or self._add_symbol(symbol)
+            remaining = float(params['quantity']) - (order.filled if order is not None else 0.0)
+            error = self._breaks_limit(state, params['side'], remaining, float(params['price']), replacing=order)
+            if error:
+                self.refused += 1
+                raise RiskError(error)
+
+    def _breaks_limit(self, state, side, quantity, price, replacing=None):
+        notional = quantity * price
+        limit = state.max_order_notional
+        if limit is not None and notional > limit:
+            return f"{state.symbol} order notional {notional:.2f} is over the limit of {limit}."
+        open_notional, added = self.open_notional + notional, quantity
+        if replacing is not None:
+            open_notional -= replacing.remaining * replacing.price
+            added -= replacing.remaining
+        elif self.max_open_orders is not None and self.open_orders >= self.max_open_orders:
+            return f"{self.open_orders} orders are open, the limit is {self.max_open_orders}."
+        if self.max_open_notional is not None and open_notional > self.max_open_notional:
+            return (f"Open order notional would be {open_notional:.2f}, "
+                    f"over the limit of {self.max_open_notional}.")
+        buy, sell = (added, 0.0) if side == 'BUY' else (0.0, added)
+        worst_case = state.worst_case_notional(buy, sell, state.price or price)
+        limit = state.max_position_notional
+        if limit is not None and worst_case > limit:
+            return f"{state.symbol} worst-case position notional would be {worst_case:.2f}, over the limit of {limit}."
+        gross = self.gross - state.worst_case + worst_case
+        if self.max_gross_notional is not None and gross > self.max_gross_notional:
+            return f"Gross worst-case notional would be {gross:.2f}, over the limit of {self.max_gross_notional}."
+        if self.max_leverage is not None and gross > self.max_leverage * self.account_equity:
+            return (f"Leverage would be {gross / max(self.account_equity, 1e-9):.2f}x, "
+                    f"over the limit of {self.max_leverage}x.")
+        return None
+
+    def release(self, client_id):
+        """Stops counting a checked order that never reached the exchange (its request failed)."""
+        with self._lock:
+            order = self.orders.get(client_id)
+            if order is None or order.confirmed:
+                return
+            self._set_remaining(order, self.symbols[order.symbol], 0.0)
+            self._remove(client_id, order)
+
+    def send_failed(self, params, error):
+        """Settles a checked order whose request raised error.
+
+        A 4xx BinanceAPIException is a definite rejection, so the order stops
+        counting. Anything else (a timeout, a dropped connection, a 5xx) may
+        have left the order live, so it stays counted until the stream
+        confirms it or a lookup finds the exchange never had it.
+        """
+        if isinstance(error, BinanceAPIException) and 400 <= (error.status_code or 0) < 500:
+            self.release(params['newClientOrderId'])
+        else:
+            self._resolve_later(params['newClientOrderId'], params['symbol'], RESOLVE_DELAY)
+
+    def _resolve_later(self, client_id, symbol, delay):
+        timer = threading.Timer(delay, self._resolve, (client_id, symbol, delay))
+        timer.daemon = True
+        timer.start()
+
+    def _resolve(self, client_id, symbol, delay):
+        with self._lock:
+            order = self.orders.get(client_id)
+            if order is None or order.confirmed:
+                return
+        if self.store is not None and self.store.get(client_order_id=client_id) is not None:
+            return  # on the exchange; its stream events keep it current
+        try:
+            self.client.futures_get_order(symbol=symbol, origClientOrderId=client_id)
+        except BinanceAPIException as e:
+            if e.code == ORDER_NOT_FOUND_CODE:
+                logging.info(f"Order {client_id} never reached the exchange; no longer counted.")
+                self.release(client_id)
+                return
+            logging.warning(f"Could not look up order {client_id}: {e.message}")
+            self._resolve_later(client_id, symbol, min(delay * 2, MAX_RESOLVE_DELAY))
+            return
+        except Exception as e:
+            logging.warning(f"Could not look up order {client_id}: {e}")
+            self._resolve_later(client_id, symbol, min(delay * 2, MAX_RESOLVE_DELAY))
+            return
+        with self._lock:
+            order.confirmed = True
+
+    def screen_batch(self, orders, new_client_id):
+        """Checks each order of a batch. Returns (orders to send, results with the refusals filled in).
+
+        The orders to send get a newClientOrderId from new_client_id() if they
+        have none; their entries in results are None until settle_batch().
+        """
+        send, results = [], []
+        for order in orders:
+            order = dict(order)
+            order.setdefault('newClientOrderId', new_client_id())
+            try:
+                self.check(order)
+            except RiskError as e:
+                results.append({'code': None, 'msg': f"rejected before sending: {e}"})
+                continue
+            send.append(order)
+            results.append(None)
+        return send, results
+
+    def settle_batch(self, sent, placed, results):
+        """Fills the exchange's results in and releases the orders it rejected. Returns results."""
+        sent, placed = iter(sent), iter(placed)
+        for i, result in enumerate(results):
+            if result is None:
+                result = results[i] = next(placed)
+                order = next(sent)
+                if is_rejected(result):
+                    self.release(order['newClientOrderId'])
+        return results
+
+    # --- Stream ---
+    def attach(self, stream, market=None):
+        """Follows a stream's order events, resyncing from its OrderStore after reconnects, and market prices."""
+        self.store = stream.order_store
+        stream.on('ORDER_TRADE_UPDATE', self.apply_order_event)
+        stream.on_reconnect(self._on_reconnect)
+        if market is not None:
+            market.on_update(self.on_price)
+
+    def detach(self, stream, market=None):
+        stream.off('ORDER_TRADE_UPDATE', self.apply_order_event)
+        stream.off_reconnect(self._on_reconnect)
+        if market is not None:
+            market.off_update(self.on_price)
+
+    def apply_order_event(self, event):
+        """Applies one ORDER_TRADE_UPDATE: the fill since the last event, and what is left open."""
+        o = event['o']
+        client_id, symbol = o['c'], o['s']
+        filled = float(o['z'])
+        is_open = o['X'] in OPEN_STATUSES
+        with self._lock:
+            state = self.symbols.get(symbol) or self._add_symbol(symbol)
+            order = self.orders.get(client_id)
+            if order is None:
+                already_filled = self._synced_fills.pop(client_id, 0.0)
+                if not is_open and filled <= already_filled:
+                    return
+                order = self.orders[client_id] = TrackedOrder(
+                    symbol, o['S'], float(o['p']) or float(o.get('sp') or 0) or state.price,
+                    _flag(o.get('R')), already_filled)
+                if not order.reduce_only:
+                    self.open_orders += 1
+            order.confirmed = True
+            fill = filled - order.filled
+            if fill > 0:
+                order.filled = filled
+                fill_price = float(o['L']) or order.price
+                state.fill(order.side, fill, fill_price)
+                if not state.price:
+                    state.price = fill_price
+                self.realized += float(o.get('rp') or 0)
+                if o.get('N') and symbol.endswith(o['N']):
+                    self.realized -= float(o.get('n') or 0)
+            price = float(o['p'])
+            if price and price != order.price and not order.reduce_only:
+                # Amended in place.
+                self.open_notional += order.remaining * (price - order.price)
+                order.price = price
+            self._set_remaining(order, state, float(o['q']) - filled if is_open else 0.0)
+            if not is_open:
+                self._remove(client_id, order)
+            breach = self._refresh(state)
+            straggler = is_open and self.killed and not order.reduce_only
+        if breach:
+            self.kill(breach)
+        elif straggler:
+            # Reached the exchange after the kill switch tripped.
+            self._in_background(self._cancel, {symbol: [client_id]})
+
+    def on_price(self, event_type, quote):
+        """MarketData listener: reprices the symbol's exposure and PnL."""
+        price = quote.mark or quote.last
+        if price:
+            self.update_price(quote.symbol, price)
+
+    def update_price(self, symbol, price):
+        state = self.symbols.get(symbol)
+        if state is None or price == state.price:
+            return
+        with self._lock:
+            state.price = price
+            breach = self._refresh(state)
+        if breach:
+            self.kill(breach)
+
+    def sync(self, store):
+        """Rebuilds positions and open orders from an OrderStore; realized PnL and prices carry over.
+
+        The store does not record reduceOnly, so its open orders all count as
+        adding exposure until the stream says otherwise.
+        """
+        with self._lock:
+            prices = {symbol: state.price for symbol, state in self.symbols.items()}
+            self.symbols, self.orders = {}, {}
+            self.gross = self.held = self.open_notional = self.unrealized = 0.0
+            self.open_orders = 0
+            self._synced_fills = {}
+            for symbol, position in store.positions.items():
+                state = self._add_symbol(symbol)
+                state.position, state.entry_price = float(position.amount), float(position.entry_price)
+            for record in store.orders.values():
+                if not record.is_open:
+                    self._synced_fills[record.client_order_id] = float(record.executed)
+                    continue
+                state = self.symbols.get(record.symbol) or self._add_symbol(record.symbol)
+                order = self.orders[record.client_order_id] = TrackedOrder(
+                    record.symbol, record.side, float(record.price or record.stop_price), filled=float(record.executed))
+                order.confirmed = True
+                self.open_orders += 1
+                self._set_remaining(order, state, float(record.quantity - record.executed))
+            breaches = []
+            for symbol, state in self.symbols.items():
+                state.price = prices.get(symbol) or state.price or state.entry_price
+                breaches.append(self._refresh(state))
+        logging.info(f"Risk state synced: {len(self.orders)} open orders, gross worst-case notional "
+                     f"{self.gross:.2f}, positions {self.held:.2f}.")
+        breach = next((breach for breach in breaches if breach), None)
+        if breach:
+            self.kill(breach)
+
+    async def _on_reconnect(self):
+        if self.store is not None:
+            self.sync(self.store)
+
+    # --- Kill switch ---
+    def kill(self, reason):
+        """Trips the kill switch: refuses new orders and batch-cancels every open one. Returns False if already tripped."""
+        with self._lock:
+            if self.killed:
+                return False
+            self.killed, self.kill_reason = True, reason
+            by_symbol = {}
+            for client_id, order in self.orders.items():
+                by_symbol.setdefault(order.symbol, []).append(client_id)
+        logging.error(f"Kill switch tripped: {reason}. Cancelling {len(self.orders)} open orders.",
+                      extra={'kill_reason': reason})
+        self._in_background(self._cancel, by_symbol)
+        return True
+
+    def reset(self):
+        """Re-arms the kill switch; orders are accepted again."""
+        with self._lock:
+            self.killed, self.kill_reason = False, None
+        logging.warning("Kill switch reset.")
+
+    def _cancel(self, by_symbol):
+        cancelled = 0
+        for symbol, client_ids in by_symbol.items():
+            results = cancel_orders_batched(self.client, symbol, client_ids)
+            failed = [result for result in results if is_rejected(result)]
+            cancelled += len(results) - len(failed)
+            if failed:
+                # -2011: already filled, cancelled, or a reservation that never reached the exchange.
+                logging.warning(f"Kill switch: {len(failed)} {symbol} cancels failed: {failed[0].get('msg')}")
+        logging.info(f"Kill switch cancelled {cancelled} orders.")
+        return cancelled
+
+    @staticmethod
+    def _in_background(fn, *args):
+        """Runs fn on the event loop's worker pool when called on a loop, else right here."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            fn(*args)
+            return
+        loop.run_in_executor(None, fn, *args)
+
+    # --- Bookkeeping (under the lock) ---
+    def _add_symbol(self, symbol):
+        limits = self.symbol_limits.get(symbol, {})
+        state = self.symbols[symbol] = SymbolExposure(
+            symbol, limits.get('max_order_notional', self.max_order_notional),
+            limits.get('max_position_notional', self.max_position_notional))
+        return state
+
+    def _set_remaining(self, order, state, remaining):
+        delta = remaining - order.remaining
+        if not delta:
+            return
+        order.remaining = remaining
+        if order.reduce_only:
+            return
+        if order.side == 'BUY':
+            state.open_buy = round(state.open_buy + delta, 12)
+        else:
+            state.open_sell = round(state.open_sell + delta, 12)
+        self.open_notional += delta * order.price
+
+    def _remove(self, client_id, order):
+        if self.orders.pop(client_id, None) is not None and not order.reduce_only:
+            self.open_orders -= 1
+
+    def _refresh(self, state):
+        """Recomputes a symbol's notionals and PnL into the account totals. Returns a breach reason, or None."""
+        worst_case = state.worst_case_notional()
+        held = abs(state.position) * state.price
+        unrealized = (state.price - state.entry_price) * state.position if state.position and state.price else 0.0
+        self.gross += worst_case - state.worst_case
+        self.held += held - state.held
+        self.unrealized += unrealized - state.unrealized
+        state.worst_case, state.held, state.unrealized = worst_case, held, unrealized
+        if self.killed:
+            return None
+        if self.max_loss is not None and self.pnl <= -self.max_loss:
+            return f"PnL {self.pnl:.2f} reached the loss limit of {self.max_loss}"
+        if state.max_position_notional is not None and held > state.max_position_notional:
+            return f"{state.symbol} position notional {held:.2f} is over the limit of {state.max_position_notional}"
+        if self.max_gross_notional is not None and self.held > self.max_gross_notional:
+            return f"gross position notional {self.held:.2f} is over the limit of {self.max_gross_notional}"
+        if self.max_leverage is not None and self.held > self.max_leverage * self.account_equity:
+            return f"leverage {self.held / max(self.account_equity, 1e-9):.2f}x is over the limit of {self.max_leverage}x"
+        return None
+
+    # --- Reads ---
+    @property
+    def pnl(self):
+        return self.realized + self.unrealized
+
+    @property
+    def account_equity(self):
+        return self.equity + self.pnl
+
+    def report(self):
+        return {
+            'killed': self.killed,
+            'kill_reason': self.kill_reason,
+            'gross_notional': round(self.gross, 2),
+            'position_notional': round(self.held, 2),
+            'open_notional': round(self.open_notional, 2),
+            'open_orders': self.open_orders,
+            'realized_pnl': round(self.realized, 4),
+            'unrealized_pnl': round(self.unrealized, 4),
+            'refused': self.refused,
+            'symbols': {symbol: {'position': state.position, 'entry_price': state.entry_price, 'price': state.price,
+                                 'open_buy': state.open_buy, 'open_sell': state.open_sell,
+                                 'worst_case_notional': round(state.worst_case, 2)}
+                        for symbol, state in self.symbols.items()},
+        }
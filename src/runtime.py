@@ -0,0 +1,250 @@
+# src/runtime.py
+#
+# Hosts many strategy instances as asyncio tasks in one process, sharing one
+# BasicBot (one pooled HTTP session), one user-data stream, one local order
+# store, one market-data feed, one pre-trade risk gate and one bounded worker
+# pool for blocking REST calls.
+#
+# Usage: python src/runtime.py <config.json>
+# See config.example.json for the file format.
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.advanced.grid_engine import GridEngine
+from src.advanced.oco_engine import OcoEngine
+from src.advanced.trailing_engine import TrailingStopEngine
+from src.advanced.twap_engine import TwapEngine
+from src.bot_client import BasicBot
+from src.bot_logging import setup_logging, current_strategy
+from src.journal import Journal, JOURNAL_DIR, journal_name
+from src.latency import serve_metrics
+from src.market_data import MarketData
+from src.order_store import OrderStore
+from src.risk import RiskEngine
+from src.user_stream import UserDataStream
+
+STRATEGY_TYPES = {
+    'grid': GridEngine,
+    'oco': OcoEngine,
+    'trailing': TrailingStopEngine,
+    'twap': TwapEngine,
+}
+# Strategies whose state is journaled so they can resume after a restart.
+JOURNALED_TYPES = {'grid', 'oco'}
+
+DEFAULT_MAX_WORKERS = 16
+METRICS_INTERVAL = 60
+
+
+def build_strategy(client, config, journal_dir=None):
+    """Builds one strategy from its config entry. Returns (name, strategy).
+
+    With a journal_dir, grid and OCO strategies journal their state there under their name, or
+    without one under a hash of their parameters, so two unnamed runs on one symbol never share a journal.
+    """
+    params = dict(config)
+    kind = params.pop('type')
+    if kind not in STRATEGY_TYPES:
+        raise ValueError(f"Unknown strategy type '{kind}'. Expected one of: {', '.join(STRATEGY_TYPES)}")
+    explicit_name = params.pop('name', None)
+    name = explicit_name or f"{kind}-{params.get('symbol', '')}"
+    if journal_dir and kind in JOURNALED_TYPES:
+        params['journal'] = Journal.for_strategy(
+            explicit_name or journal_name(kind, params.get('symbol', ''), params), journal_dir)
+    return name, STRATEGY_TYPES[kind](client, **params)
+
+
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+    if not config.get('strategies'):
+        raise ValueError("Config must contain a non-empty 'strategies' list.")
+    return config
+
+
+class StrategyRuntime:
+    """Runs strategies concurrently over one shared session and user-data stream.
+
+    Blocking REST calls go through a fixed-size thread pool that matches the
+    HTTP connection pool, so memory and connection count stay bounded however
+    many strategies are hosted. With market_data, the book ticker, mark price
+    and trades of every strategy's symbol are streamed into one MarketData
+    cache (published to shared memory under market_data_shm, if set) that
+    strategies read prices from instead of the REST ticker.
+
+    With a RiskEngine on the bot's client, every strategy's orders go through
+    it: it follows the stream's fills and the market data's prices, and
+    strategies only start once it holds the order store's first snapshot.
+    """
+
+    def __init__(self, bot, max_workers=None, metrics_interval=METRICS_INTERVAL, metrics_port=None,
+                 market_data=True, market_data_shm=None):
+        self.bot = bot
+        self.max_workers = max_workers or bot.pool_size
+        self.metrics_interval = metrics_interval
+        self.metrics_port = metrics_port
+        self.stream = UserDataStream(bot.client, bot.stream_url)
+        self.store = OrderStore(bot.client)
+        self.store.attach(self.stream)
+        self.market_data_enabled = market_data
+        self.market_data_shm = market_data_shm
+        self.market = None
+        self.risk = bot.client.risk
+        self.strategies = {}
+
+    def add(self, name, strategy):
+        if name in self.strategies:
+            raise ValueError(f"Duplicate strategy name '{name}'")
+        self.strategies[name] = strategy
+
+    async def run(self):
+        """Runs every strategy until all of them finish (grids run until cancelled)."""
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='rest'))
+
+        stream_task = asyncio.create_task(self.stream.run())
+        metrics_task = asyncio.create_task(self._log_metrics())
+        store_task = asyncio.create_task(self.store.run(self.stream))
+        symbols = set()
+        for strategy in self.strategies.values():
+            if hasattr(strategy, 'symbol'):
+                symbols.add(strategy.symbol)
+            symbols.update(getattr(strategy, 'symbols', ()))
+        symbols = sorted(symbols)
+        market_task = None
+        if self.market_data_enabled and symbols:
+            self.market = MarketData(self.bot.stream_url, symbols, shared_memory=self.market_data_shm)
+            self.market.attach(self.stream)
+            market_task = asyncio.create_task(self.market.run())
+        if self.risk is not None:
+            self.risk.attach(self.stream, self.market)
+            # Positions and open orders from before this run count against the limits from the first order.
+            await self.store.synced.wait()
+            self.risk.sync(self.store)
+        metrics_server = None
+        if self.metrics_port:
+            metrics_server = await serve_metrics(self.metrics_text, port=self.metrics_port)
+            logging.info(f"Serving metrics on http://127.0.0.1:{self.metrics_port}/metrics")
+        tasks = [asyncio.create_task(self._supervise(name, strategy), name=name)
+                 for name, strategy in self.strategies.items()]
+        logging.info(f"Runtime started with {len(tasks)} strategies.")
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.stream.stop()
+            stream_task.cancel()
+            metrics_task.cancel()
+            store_task.cancel()
+            if market_task is not None:
+                await self.market.stop()
+                market_task.cancel()
+            await asyncio.gather(stream_task, metrics_task, store_task, *tasks,
+                                 *([market_task] if market_task is not None else []), return_exceptions=True)
+            if self.risk is not None:
+                self.risk.detach(self.stream, self.market)
+            if self.market is not None:
+                self.market.close()
+            if metrics_server is not None:
+                await metrics_server.cleanup()
+
+    def metrics_text(self):
+        """Latency histograms and rate limiter state in Prometheus text format."""
+        limiter = self.bot.rate_limiter.metrics()
+        lines = [
+            "# TYPE binance_bot_rate_limiter_queue_depth gauge",
+            f"binance_bot_rate_limiter_queue_depth {limiter['queue_depth']}",
+            "# TYPE binance_bot_rate_limiter_throttled_responses counter",
+            f"binance_bot_rate_limiter_throttled_responses {limiter['throttled_responses']}",
+        ]
+        if self.risk is not None:
+            risk = self.risk.report()
+            for name, kind in (('gross_notional', 'gauge'), ('position_notional', 'gauge'),
+                               ('open_notional', 'gauge'), ('open_orders', 'gauge'), ('realized_pnl', 'gauge'),
+                               ('unrealized_pnl', 'gauge'), ('refused', 'counter')):
+                lines += [f"# TYPE binance_bot_risk_{name} {kind}", f"binance_bot_risk_{name} {risk[name]}"]
+            lines += ["# TYPE binance_bot_risk_killed gauge", f"binance_bot_risk_killed {int(risk['killed'])}"]
+        return self.bot.latency.prometheus() + "\n".join(lines) + "\n"
+
+    async def _log_metrics(self):
+        """Periodically logs the shared rate limiter's queue depth and wait times, and the slowest latencies."""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            metrics = self.bot.rate_limiter.metrics()
+            waits = ", ".join(f"{name} avg {w['avg_wait'] * 1000:.1f} ms / max {w['max_wait'] * 1000:.1f} ms"
+                              for name, w in metrics['waits'].items())
+            logging.info(f"Rate limiter: queue depth {metrics['queue_depth']}, {waits}")
+            for label, name, phase in (("Request latency", 'request', 'total'),
+                                       ("Strategy request latency", 'strategy_request', 'total'),
+                                       ("Tick-to-order latency", 'tick_to_order', None)):
+                summary = self.bot.latency.summary(name, phase)
+                if summary:
+                    logging.info(f"{label}: {summary}")
+            if self.risk is not None:
+                risk = self.risk.report()
+                logging.info(f"Risk: gross worst-case {risk['gross_notional']}, positions {risk['position_notional']}, "
+                             f"{risk['open_orders']} open orders ({risk['open_notional']}), PnL "
+                             f"{risk['realized_pnl']} realized / {risk['unrealized_pnl']} unrealized, "
+                             f"{risk['refused']} refused{', KILLED: ' + risk['kill_reason'] if risk['killed'] else ''}")
+
+    async def _supervise(self, name, strategy):
+        # Everything this strategy logs, including from worker threads, also goes to logs/<name>.log.
+        current_strategy.set(name)
+        try:
+            await strategy.run(self.stream)
+            logging.info(f"Strategy {name} finished.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Strategy {name} failed: {e}")
+
+
+def main():
+    setup_logging(strategy_logs=True)
+
+    if len(sys.argv) < 2:
+        logging.info("Usage: python src/runtime.py <config.json>")
+        sys.exit(1)
+
+    api_key = os.getenv("BINANCE_API_KEY")
+    api_secret = os.getenv("BINANCE_API_SECRET")
+    if not api_key or not api_secret:
+        logging.error("BINANCE_API_KEY and BINANCE_API_SECRET environment variables must be set.")
+        sys.exit(1)
+
+    try:
+        config = load_config(sys.argv[1])
+        max_workers = config.get('max_workers', DEFAULT_MAX_WORKERS)
+        bot = BasicBot(api_key, api_secret, testnet=config.get('testnet', True),
+                       base_url=config.get('base_url'), pool_size=max_workers)
+        if config.get('risk'):
+            RiskEngine.for_client(bot.client, **config['risk'])
+        runtime = StrategyRuntime(bot, max_workers, config.get('metrics_interval', METRICS_INTERVAL),
+                                  config.get('metrics_port'), config.get('market_data', True),
+                                  config.get('market_data_shm'))
+        for entry in config['strategies']:
+            runtime.add(*build_strategy(bot.client, entry, config.get('journal_dir', JOURNAL_DIR)))
+    except (OSError, ValueError, TypeError) as e:
+        logging.error(f"Invalid config: {e}")
+        sys.exit(1)
+
+    try:
+        bot.load_rate_limits()
+    except Exception as e:
+        logging.warning(f"Could not load rate limits, using defaults: {e}")
+
+    try:
+        asyncio.run(runtime.run())
+    except KeyboardInterrupt:
+        logging.info("Runtime stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# src/symbol_filters.py
+
+import json
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+# The parsed filters of every symbol are cached on disk so one-shot scripts can
+# round orders without downloading exchangeInfo on every run.
+EXCHANGE_INFO_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "binance-bot", "exchange_info.json")
+EXCHANGE_INFO_TTL = 6 * 60 * 60
+# An unknown symbol triggers a fresh download at most this often.
+UNKNOWN_SYMBOL_REFRESH = 60
+
+# Rejections that mean our cached filters may be out of date.
+FILTER_ERROR_CODES = {-1013, -1111, -4003, -4014, -4023, -4164}
+
+PRICE_TYPES = {'LIMIT', 'STOP', 'TAKE_PROFIT'}
+STOP_PRICE_TYPES = {'STOP', 'STOP_MARKET', 'TAKE_PROFIT', 'TAKE_PROFIT_MARKET'}
+MARKET_TYPES = {'MARKET', 'STOP_MARKET', 'TAKE_PROFIT_MARKET'}
+
+
+class FilterError(ValueError):
+    """An order that cannot be made to satisfy the symbol's filters by rounding."""
+
+
+def _decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _text(value):
+    return f"{value:f}"
+
+
+class SymbolFilters:
+    """Tick, step and notional filters of one symbol, with Decimal rounding."""
+    __slots__ = ('symbol', 'tick_size', 'min_price', 'max_price', 'step_size', 'min_qty', 'max_qty',
+                 'market_step_size', 'market_min_qty', 'market_max_qty', 'min_notional')
+
+    def __init__(self, symbol, tick_size, min_price, max_price, step_size, min_qty, max_qty,
+                 market_step_size, market_min_qty, market_max_qty, min_notional):
+        self.symbol = symbol
+        self.tick_size = Decimal(tick_size)
+        self.min_price = Decimal(min_price)
+        self.max_price = Decimal(max_price)
+        self.step_size = Decimal(step_size)
+        self.min_qty = Decimal(min_qty)
+        self.max_qty = Decimal(max_qty)
+        self.market_step_size = Decimal(market_step_size)
+        self.market_min_qty = Decimal(market_min_qty)
+        self.market_max_qty = Decimal(market_max_qty)
+        self.min_notional = Decimal(min_notional)
+
+    @classmethod
+    def from_symbol_info(cls, info):
+        filters = {f['filterType']: f for f in info['filters']}
+        price = filters.get('PRICE_FILTER', {})
+        lot = filters.get('LOT_SIZE', {})
+        market_lot = filters.get('MARKET_LOT_SIZE', lot)
+        notional = filters.get('MIN_NOTIONAL', {})
+        return cls(
+            info['symbol'],
+            price.get('tickSize', '0'), price.get('minPrice', '0'), price.get('maxPrice', '0'),
+            lot.get('stepSize', '0'), lot.get('minQty', '0'), lot.get('maxQty', '0'),
+            market_lot.get('stepSize', '0'), market_lot.get('minQty', '0'), market_lot.get('maxQty', '0'),
+            notional.get('notional', notional.get('minNotional', '0')),
+        )
+
+    def to_dict(self):
+        return {name: getattr(self, name) if name == 'symbol' else _text(getattr(self, name))
+                for name in self.__slots__}
+
+    def round_price(self, price, rounding=ROUND_HALF_UP):
+        """Rounds a price to the nearest tick (or with the given Decimal rounding mode)."""
+        price = _decimal(price)
+        if not self.tick_size:
+            return price
+        return (price / self.tick_size).to_integral_value(rounding=rounding) * self.tick_size
+
+    def round_quantity(self, quantity, market=False):
+        """Rounds a quantity down to the step size, so an order never exceeds what was asked for."""
+        quantity = _decimal(quantity)
+        step = self.market_step_size if market else self.step_size
+        if not step:
+            return quantity
+        return (quantity / step).to_integral_value(rounding=ROUND_DOWN) * step
+
+    def round_prices(self, prices, rounding=ROUND_HALF_UP):
+        """round_price over a sequence, e.g. every level of a grid."""
+        tick = self.tick_size
+        if not tick:
+            return [_decimal(p) for p in prices]
+        return [(_decimal(p) / tick).to_integral_value(rounding=rounding) * tick for p in prices]
+
+    def round_quantities(self, quantities, market=False):
+        """round_quantity over a sequence, e.g. every slice of a TWAP."""
+        step = self.market_step_size if market else self.step_size
+        if not step:
+            return [_decimal(q) for q in quantities]
+        return [(_decimal(q) / step).to_integral_value(rounding=ROUND_DOWN) * step for q in quantities]
+
+    def meets_min_notional(self, quantity, price):
+        return _decimal(quantity) * _decimal(price) >= self.min_notional
+
+    def check(self, quantity, price=None, market=False, reduce_only=False):
+        """Raises FilterError if a rounded quantity/price would still be rejected."""
+        min_qty, max_qty = (self.market_min_qty, self.market_max_qty) if market else (self.min_qty, self.max_qty)
+        if quantity < min_qty or quantity <= 0:
+            raise FilterError(f"{self.symbol} quantity {_text(quantity)} is below the minimum of {_text(min_qty)}.")
+        if max_qty and quantity > max_qty:
+            raise FilterError(f"{self.symbol} quantity {_text(quantity)} is above the maximum of {_text(max_qty)}.")
+        if price is None:
+            return
+        if price < self.min_price or (self.max_price and price > self.max_price) or price <= 0:
+            raise FilterError(f"{self.symbol} price {_text(price)} is outside "
+                              f"[{_text(self.min_price)}, {_text(self.max_price)}].")
+        if not reduce_only and not self.meets_min_notional(quantity, price):
+            raise FilterError(f"{self.symbol} order notional {_text(quantity * price)} is below "
+                              f"the minimum of {_text(self.min_notional)}.")
+
+    def prepare_order(self, params, reference_price=None):
+        """Returns a copy of futures_create_order params with price, stopPrice and quantity rounded.
+
+        MARKET-type orders are checked against minNotional only when a
+        reference_price is given, and reduce-only orders are exempt from it.
+        Raises FilterError if the order cannot pass.
+        """
+        params = dict(params)
+        order_type = params.get('type', 'LIMIT')
+        market = order_type in MARKET_TYPES
+        price = None
+        if 'price' in params and order_type in PRICE_TYPES:
+            price = self.round_price(params['price'])
+            params['price'] = _text(price)
+        if 'stopPrice' in params and order_type in STOP_PRICE_TYPES:
+            stop_price = self.round_price(params['stopPrice'])
+            params['stopPrice'] = _text(stop_price)
+            if price is None:
+                price = stop_price
+        if 'quantity' in params:
+            quantity = self.round_quantity(params['quantity'], market)
+            params['quantity'] = _text(quantity)
+            if price is None and reference_price is not None:
+                price = _decimal(reference_price)
+            reduce_only = str(params.get('reduceOnly', '')).lower() == 'true'
+            self.check(quantity, price, market, reduce_only)
+        return params
+
+
+class SymbolFilterCache:
+    """exchangeInfo filters for every symbol, loaded once per TTL and shared on disk.
+
+    get() serves from memory, then from the disk cache while it is fresh, and
+    only then downloads exchangeInfo. invalidate() forces the next get() to
+    download again, e.g. after a filter-related rejection. With path=None the
+    cache is kept in memory only.
+    """
+
+    def __init__(self, client, path=EXCHANGE_INFO_CACHE, ttl=EXCHANGE_INFO_TTL):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.endpoint = client.FUTURES_TESTNET_URL if client.testnet else client.FUTURES_URL
+        self.symbols = {}
+        self.fetched_at = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, client):
+        """The cache shared by everything using this client, created on first use."""
+        cache = getattr(client, 'symbol_filters', None)
+        if cache is None:
+            cache = client.symbol_filters = cls(client)
+        return cache
+
+    def get(self, symbol):
+        """Returns the SymbolFilters of a symbol. Raises FilterError for unknown symbols."""
+        with self._lock:
+            if not self._fresh() and not self._load():
+                self._fetch()
+            filters = self.symbols.get(symbol)
+            if filters is None and time.time() - self.fetched_at > UNKNOWN_SYMBOL_REFRESH:
+                # A symbol listed since the cache was written.
+                self._fetch()
+                filters = self.symbols.get(symbol)
+        if filters is None:
+            raise FilterError(f"Unknown symbol {symbol}.")
+        return filters
+
+    def prepare_order(self, params, reference_price=None):
+        return self.get(params['symbol']).prepare_order(params, reference_price)
+
+    def update(self, exchange_info):
+        """Replaces the cache with a freshly downloaded exchangeInfo response."""
+        with self._lock:
+            self._apply(exchange_info)
+
+    def invalidate(self):
+        with self._lock:
+            self.symbols = {}
+            self.fetched_at = 0
+            if self.path is None:
+                return
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def _fresh(self):
+        return bool(self.symbols) and time.time() - self.fetched_at <= self.ttl
+
+    def _load(self):
+        if self.path is None:
+            return False
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if cached.get('endpoint') != self.endpoint or time.time() - cached.get('fetched_at', 0) > self.ttl:
+            return False
+        self.symbols = {symbol: SymbolFilters(**fields) for symbol, fields in cached['symbols'].items()}
+        self.fetched_at = cached['fetched_at']
+        return True
+
+    def _fetch(self):
+        self._apply(self.client.futures_exchange_info())
+
+    def _apply(self, exchange_info):
+        self.symbols = {info['symbol']: SymbolFilters.from_symbol_info(info) for info in exchange_info['symbols']}
+        self.fetched_at = time.time()
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({'endpoint': self.endpoint, 'fetched_at': self.fetched_at,
+                           'symbols': {symbol: filters.to_dict() for symbol, filters in self.symbols.items()}}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
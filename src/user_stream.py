@@ -0,0 +1,196 @@
+# src/user_stream.py
+
+import asyncio
+import contextvars
+import inspect
+import json
+import logging
+import time
+
+import websockets
+
+try:
+    from src.latency import RECEIVED_AT
+except ImportError:  # run as a script from src/
+    from latency import RECEIVED_AT
+
+# Binance expires a futures listen key 60 minutes after the last keepalive.
+KEEPALIVE_INTERVAL = 30 * 60
+# Events one handler may fall behind by; past that its events are dropped and the stream resyncs.
+SUBSCRIBER_QUEUE_SIZE = 10000
+
+
+class UserDataStream:
+    """Futures user-data stream with listen-key keepalive and automatic reconnect.
+
+    Handlers are registered per event type (e.g. ORDER_TRADE_UPDATE), optionally
+    for one symbol only, and may be plain functions or coroutines. Each handler
+    gets its own FIFO queue, so events reach it in order while a slow handler
+    never holds up the socket or other strategies sharing the stream. A queue
+    holds at most SUBSCRIBER_QUEUE_SIZE events: a handler that falls further
+    behind has the overflow dropped, and the stream reconnects so every
+    reconnect handler resyncs from REST. Reconnect handlers run once the new
+    socket is open, so a REST reconcile done there cannot miss events. Each
+    event carries its local receive time (perf_counter) under RECEIVED_AT,
+    for tick-to-order latency.
+    """
+
+    def __init__(self, client, stream_url, keepalive_interval=KEEPALIVE_INTERVAL,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        self.client = client
+        self.stream_url = stream_url.rstrip('/')
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.listen_key = None
+        self.handlers = {}
+        self.reconnect_handlers = []
+        self.connected = asyncio.Event()
+        # Set by OrderStore.attach(); strategies read order state from it when present.
+        self.order_store = None
+        # Set by MarketData.attach(); strategies read live prices from it when present.
+        self.market_data = None
+        self._ws = None
+        self._running = False
+
+    def on(self, event_type, handler, symbol=None):
+        """Registers a handler for one user-data event type, optionally for a single symbol."""
+        self.handlers.setdefault((event_type, symbol), []).append(_Subscriber(handler))
+
+    def off(self, event_type, handler, symbol=None):
+        """Removes a handler registered with on()."""
+        subscribers = self.handlers.get((event_type, symbol), [])
+        for subscriber in subscribers:
+            if subscriber.handler == handler:
+                subscriber.close()
+                subscribers.remove(subscriber)
+                break
+        if not subscribers:
+            self.handlers.pop((event_type, symbol), None)
+
+    def on_reconnect(self, handler, first=False):
+        """Registers a handler that runs after every reconnect (not the first connect).
+
+        Handlers run one after another; first=True puts this one ahead of the
+        rest, for shared state that other handlers read.
+        """
+        if first:
+            self.reconnect_handlers.insert(0, handler)
+        else:
+            self.reconnect_handlers.append(handler)
+
+    def off_reconnect(self, handler):
+        if handler in self.reconnect_handlers:
+            self.reconnect_handlers.remove(handler)
+
+    async def run(self):
+        """Connects and dispatches events until stop() is called."""
+        self._running = True
+        delay = self.reconnect_delay
+        first_connect = True
+
+        while self._running:
+            try:
+                self.listen_key = await asyncio.to_thread(self.client.futures_stream_get_listen_key)
+                async with websockets.connect(f"{self.stream_url}/ws/{self.listen_key}") as ws:
+                    self._ws = ws
+                    delay = self.reconnect_delay
+                    keepalive = asyncio.create_task(self._keepalive())
+                    try:
+                        if not first_connect:
+                            logging.info("User-data stream reconnected. Reconciling state...")
+                            for handler in self.reconnect_handlers:
+                                await _call(handler)
+                        first_connect = False
+                        self.connected.set()
+
+                        async for message in ws:
+                            received = time.perf_counter()
+                            event = json.loads(message)
+                            event[RECEIVED_AT] = received
+                            await self._dispatch(event)
+                    finally:
+                        self.connected.clear()
+                        keepalive.cancel()
+                        self._ws = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"User-data stream error: {e}")
+
+            if self._running:
+                logging.warning(f"User-data stream disconnected. Reconnecting in {delay:.1f} seconds...")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def stop(self):
+        """Stops the stream and closes the socket."""
+        self._running = False
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _dispatch(self, event):
+        event_type = event.get('e')
+        if event_type == 'listenKeyExpired':
+            logging.warning("Listen key expired. Forcing reconnect.")
+            await self._ws.close()
+            return
+        dropped = False
+        for subscriber in self.handlers.get((event_type, None), ()):
+            dropped |= not subscriber.deliver(event)
+        symbol = event.get('o', {}).get('s')
+        if symbol is not None:
+            for subscriber in self.handlers.get((event_type, symbol), ()):
+                dropped |= not subscriber.deliver(event)
+        if dropped and self._ws is not None:
+            logging.warning(f"A {event_type} handler fell {SUBSCRIBER_QUEUE_SIZE} events behind; "
+                            f"dropping events and reconnecting to resync.")
+            await self._ws.close()
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await asyncio.to_thread(self.client.futures_stream_keepalive, self.listen_key)
+            except Exception as e:
+                logging.error(f"Listen key keepalive failed: {e}")
+
+
+class _Subscriber:
+    """One handler with its own event queue, drained in order by a lazily started task."""
+    __slots__ = ('handler', 'queue', 'task', 'context')
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.task = None
+        # The handler runs in the subscriber's context (e.g. its strategy's log tag), not the stream's.
+        self.context = contextvars.copy_context()
+
+    def deliver(self, event):
+        """Queues an event for the handler. Returns False if the queue is full and the event was dropped."""
+        if self.task is None:
+            self.task = self.context.run(asyncio.create_task, self._drain())
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def _drain(self):
+        while True:
+            event = await self.queue.get()
+            try:
+                await _call(self.handler, event)
+            except Exception as e:
+                logging.error(f"Error in {event.get('e')} handler: {e}")
+
+
+async def _call(handler, *args):
+    result = handler(*args)
+    if inspect.isawaitable(result):
+        await result
@@ -0,0 +1,63 @@
+import asyncio
+import contextlib
+import time
+
+import pytest
+
+from src.bot_client import BasicBot
+from src.exchange_sim import ExchangeSimulator, call_in_loop, start_in_thread
+from src.order_store import OrderStore
+from src.user_stream import UserDataStream
+
+API_KEY, API_SECRET = 'test-key', 'test-secret-0123456789'
+
+
+class Exchange:
+    """A simulator on its own thread and a bot pointed at it."""
+
+    def __init__(self, sim, server, bot):
+        self.sim = sim
+        self.server = server
+        self.bot = bot
+        self.client = bot.client
+
+    def trade(self, symbol, price, quantity=None):
+        """An external trade at price; quantity=0 only moves the last price."""
+        call_in_loop(self.server, self.sim.trade, symbol, price, quantity)
+
+    def open_ids(self, symbol):
+        return {o['clientOrderId'] for o in self.client.futures_get_open_orders(symbol=symbol)}
+
+    @contextlib.asynccontextmanager
+    async def user_stream(self, reconnect_delay=0.1):
+        """A running user-data stream with an OrderStore attached, synced before it is yielded."""
+        stream = UserDataStream(self.client, self.bot.stream_url, reconnect_delay=reconnect_delay)
+        store = OrderStore(self.client)
+        store.attach(stream)
+        tasks = [asyncio.create_task(stream.run()), asyncio.create_task(store.run(stream))]
+        try:
+            await asyncio.wait_for(store.synced.wait(), 5)
+            yield stream, store
+        finally:
+            await stream.stop()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def wait_until(predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise AssertionError("condition not met in time")
+            await asyncio.sleep(0.02)
+
+
+@pytest.fixture
+def exchange():
+    sim = ExchangeSimulator(accounts={API_KEY: API_SECRET}, weight_limit=10**9,
+                            order_limit_10s=10**9, order_limit_1m=10**9)
+    server, url = start_in_thread(sim)
+    yield Exchange(sim, server, BasicBot(API_KEY, API_SECRET, base_url=url))
+    asyncio.run_coroutine_threadsafe(server.stop(), server.loop).result()
+    server.loop.call_soon_threadsafe(server.loop.stop)
@@ -0,0 +1,63 @@
+import asyncio
+from decimal import Decimal
+
+from src.advanced.grid_engine import GridEngine, ladder_diff
+
+
+def _book(exchange):
+    orders = exchange.client.futures_get_open_orders(symbol='BTCUSDT')
+    return sorted((o['side'], Decimal(o['price'])) for o in orders)
+
+
+def test_fill_refills_opposite_side(exchange):
+    client = exchange.client
+
+    async def main():
+        async with exchange.user_stream() as (stream, store):
+            engine = GridEngine(client, 'BTCUSDT', 57500, 62500, 5, 0.01)
+            task = asyncio.create_task(engine.run(stream))
+            await exchange.wait_until(lambda: len(engine.order_ids) == 5)
+            assert _book(exchange) == [('BUY', Decimal('58500')), ('BUY', Decimal('59500')),
+                                       ('SELL', Decimal('60500')), ('SELL', Decimal('61500')),
+                                       ('SELL', Decimal('62500'))]
+
+            await asyncio.to_thread(exchange.trade, 'BTCUSDT', 59500)
+            # The filled buy at 59500 is replaced by a sell one step up.
+            await exchange.wait_until(lambda: len(engine.order_ids) == 5
+                                      and ('BUY', Decimal('59500')) not in engine.order_ids.values())
+            assert sorted(engine.order_ids.values()) == _book(exchange)
+            assert _book(exchange).count(('SELL', Decimal('60500'))) == 2
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+
+
+def test_recenter_keeps_shared_levels_and_amends_the_rest(exchange):
+    engine = GridEngine(exchange.client, 'BTCUSDT', 57500, 62500, 5, 0.01)
+    engine.place_initial_orders()
+    before = dict(engine.order_ids)
+
+    # Move the market a step up without trading through the resting orders.
+    exchange.trade('BTCUSDT', 61000, 0)
+    keep, amend, cancel, create = engine.recenter()
+
+    assert (engine.lower, engine.upper) == (58500.0, 63500.0)
+    assert sorted(before[client_id] for client_id in keep) == [
+        ('BUY', Decimal('59500')), ('SELL', Decimal('61500')), ('SELL', Decimal('62500'))]
+    assert sorted((side, price) for _, side, price in amend) == [('BUY', Decimal('60500')), ('SELL', Decimal('63500'))]
+    assert cancel == [] and create == []
+    # Amended in place: the same five orders, now on the new ladder.
+    assert set(engine.order_ids) == set(before)
+    assert sorted(engine.order_ids.values()) == _book(exchange) == [
+        ('BUY', Decimal('59500')), ('BUY', Decimal('60500')), ('SELL', Decimal('61500')),
+        ('SELL', Decimal('62500')), ('SELL', Decimal('63500'))]
+
+
+def test_ladder_diff_cancels_and_creates_when_sides_do_not_match():
+    current = {'a': ('BUY', 1), 'b': ('BUY', 2), 'c': ('SELL', 3)}
+    keep, amend, cancel, create = ladder_diff(current, [('BUY', 2), ('SELL', 3), ('SELL', 4)])
+    assert keep == ['b', 'c']
+    assert amend == []
+    assert cancel == ['a']
+    assert create == [('SELL', 4)]
@@ -0,0 +1,59 @@
+from src.advanced.oco_engine import OcoEngine
+from src.journal import Journal
+
+
+def test_torn_tail_is_dropped_on_replay(tmp_path):
+    path = str(tmp_path / "strategy")
+    journal = Journal(path)
+    for n in range(3):
+        journal.append({'op': 'add', 'n': n})
+    journal.close()
+    # A crash in the middle of a write leaves a record without its newline.
+    with open(f"{path}.log", 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "n": 3, "se')
+
+    journal = Journal(path)
+    state, records = journal.replay()
+    assert state is None
+    assert [record['n'] for record in records] == [0, 1, 2]
+    assert journal.seq == 3
+    # The next record starts on a line of its own and gets the next sequence number.
+    journal.append({'op': 'add', 'n': 4})
+    journal.close()
+
+    state, records = Journal(path).replay()
+    assert [(record['n'], record['seq']) for record in records] == [(0, 1), (1, 2), (2, 3), (4, 4)]
+
+
+def test_replay_starts_from_the_snapshot(tmp_path):
+    path = str(tmp_path / "strategy")
+    journal = Journal(path)
+    journal.state_fn = lambda: {'orders': 2}
+    journal.append({'op': 'add', 'n': 0})
+    journal.snapshot()
+    journal.append({'op': 'add', 'n': 1})
+    journal.close()
+    with open(f"{path}.log", 'a', encoding='utf-8') as f:
+        f.write('{"op"')
+
+    state, records = Journal(path).replay()
+    assert state == {'orders': 2}
+    assert [record['n'] for record in records] == [1]
+
+
+def test_restarted_oco_takes_over_its_legs(exchange, tmp_path):
+    client = exchange.client
+    path = str(tmp_path / "oco")
+    journal = Journal(path)
+    engine = OcoEngine(client, 'BTCUSDT', 'BUY', 0.01, 61000, 59000, journal=journal)
+    engine.place_orders()
+    journal.close()
+    with open(f"{path}.log", 'a', encoding='utf-8') as f:
+        f.write('{"op": "placed", "leg"')
+
+    restarted = OcoEngine(client, 'BTCUSDT', 'BUY', 0.01, 61000, 59000, journal=Journal(path))
+    assert restarted.restored
+    assert restarted.placed == {engine.tp_client_id, engine.sl_client_id}
+    restarted.resume()
+    # Nothing placed twice.
+    assert exchange.open_ids('BTCUSDT') == {engine.tp_client_id, engine.sl_client_id}
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+import requests
+
+from src.advanced import oco_engine
+from src.advanced.oco_engine import OcoEngine
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(oco_engine, 'CANCEL_BACKOFF', 0.01)
+    monkeypatch.setattr(oco_engine, 'CANCEL_RETRY_DELAY', 0.05)
+
+
+def test_fill_cancels_sibling(exchange):
+    client = exchange.client
+    client.futures_create_order(symbol='BTCUSDT', side='BUY', type='MARKET', quantity='0.010')
+
+    async def main():
+        async with exchange.user_stream() as (stream, store):
+            engine = OcoEngine(client, 'BTCUSDT', 'BUY', 0.01, 61000, 59000)
+            task = asyncio.create_task(engine.run(stream))
+            await exchange.wait_until(lambda: len(engine.placed) == 2)
+            assert exchange.open_ids('BTCUSDT') == {engine.tp_client_id, engine.sl_client_id}
+
+            await asyncio.to_thread(exchange.trade, 'BTCUSDT', 61000)
+            await asyncio.wait_for(task, 5)
+            assert engine.done
+            assert engine.filled_leg == 'take-profit'
+            assert engine.fill_to_cancel_ms is not None
+            assert exchange.open_ids('BTCUSDT') == set()
+
+    asyncio.run(main())
+
+
+def test_failed_sibling_cancel_is_retried(exchange, monkeypatch):
+    client = exchange.client
+    client.futures_create_order(symbol='BTCUSDT', side='BUY', type='MARKET', quantity='0.010')
+    cancel = client.futures_cancel_order
+    failures = [oco_engine.CANCEL_ATTEMPTS + 1]  # one more than a single _complete call retries
+
+    def flaky_cancel(**params):
+        if failures[0]:
+            failures[0] -= 1
+            raise requests.exceptions.ConnectionError("connection reset")
+        return cancel(**params)
+
+    async def main():
+        async with exchange.user_stream() as (stream, store):
+            engine = OcoEngine(client, 'BTCUSDT', 'BUY', 0.01, 61000, 59000, reconcile_interval=60)
+            task = asyncio.create_task(engine.run(stream))
+            await exchange.wait_until(lambda: len(engine.placed) == 2)
+            monkeypatch.setattr(client, 'futures_cancel_order', flaky_cancel)
+
+            await asyncio.to_thread(exchange.trade, 'BTCUSDT', 61000)
+            # Well before the reconcile interval.
+            await asyncio.wait_for(task, 5)
+            assert engine.done
+            assert failures == [0]
+            assert exchange.open_ids('BTCUSDT') == set()
+
+    asyncio.run(main())
+
+
+def test_stop_loss_failure_cancels_take_profit(exchange, monkeypatch):
+    client = exchange.client
+    create = client.futures_create_order
+
+    def create_without_stops(**params):
+        if params['type'] == 'STOP_MARKET':
+            raise requests.exceptions.ConnectionError("connection reset")
+        return create(**params)
+
+    monkeypatch.setattr(client, 'futures_create_order', create_without_stops)
+    engine = OcoEngine(client, 'BTCUSDT', 'BUY', 0.01, 61000, 59000)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        engine.place_orders()
+    assert exchange.open_ids('BTCUSDT') == set()
+    assert engine.tp_client_id not in engine.placed
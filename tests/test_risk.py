@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from src.risk import RiskEngine, RiskError
+
+
+def test_max_loss_trips_kill_switch(exchange):
+    client = exchange.client
+    risk = RiskEngine.for_client(client, max_loss=30)
+
+    async def main():
+        async with exchange.user_stream() as (stream, store):
+            risk.attach(stream)
+            client.futures_create_order(symbol='BTCUSDT', side='BUY', type='MARKET', quantity='0.025')
+            resting = client.futures_create_order(symbol='BTCUSDT', side='BUY', type='LIMIT', timeInForce='GTC',
+                                                  quantity='0.005', price='50000')
+            await exchange.wait_until(lambda: risk.symbols['BTCUSDT'].position == 0.025
+                                      and resting['clientOrderId'] in risk.orders)
+            assert not risk.killed
+
+            # 0.025 long from 60000 loses 50 at 58000.
+            await asyncio.to_thread(risk.update_price, 'BTCUSDT', 58000.0)
+            assert risk.killed
+            assert 'loss' in risk.kill_reason.lower()
+            await exchange.wait_until(lambda: exchange.open_ids('BTCUSDT') == set())
+
+            with pytest.raises(RiskError):
+                client.futures_create_order(symbol='BTCUSDT', side='BUY', type='MARKET', quantity='0.001')
+            # Closing the position is still allowed.
+            closed = client.futures_create_order(symbol='BTCUSDT', side='SELL', type='MARKET', quantity='0.025',
+                                                 reduceOnly='true')
+            assert closed['status'] == 'FILLED'
+            await exchange.wait_until(lambda: risk.symbols['BTCUSDT'].position == 0)
+
+    asyncio.run(main())
+
+
+def test_manual_kill_and_reset(exchange):
+    client = exchange.client
+    risk = RiskEngine.for_client(client)
+    client.futures_create_order(symbol='ETHUSDT', side='BUY', type='LIMIT', timeInForce='GTC',
+                                quantity='0.100', price='2900')
+
+    assert risk.kill("manual")
+    assert not risk.kill("again")
+    assert exchange.open_ids('ETHUSDT') == set()
+    with pytest.raises(RiskError):
+        client.futures_create_order(symbol='ETHUSDT', side='BUY', type='LIMIT', timeInForce='GTC',
+                                    quantity='0.100', price='2900')
+    assert risk.refused == 1
+
+    risk.reset()
+    order = client.futures_create_order(symbol='ETHUSDT', side='BUY', type='LIMIT', timeInForce='GTC',
+                                        quantity='0.100', price='2900')
+    assert exchange.open_ids('ETHUSDT') == {order['clientOrderId']}
@@ -0,0 +1,56 @@
+import asyncio
+from decimal import Decimal
+
+from binance.exceptions import BinanceRequestException
+
+from src.advanced.twap_engine import TwapEngine
+
+
+def _failing_slices(engine, fail):
+    """Makes place_slice raise while fail(index, call number) is true; returns the (index, quantity) calls."""
+    place, calls = engine.place_slice, []
+
+    def place_slice(index, quantity):
+        calls.append((index, quantity))
+        if fail(index, len(calls)):
+            raise BinanceRequestException("connection reset")
+        return place(index, quantity)
+
+    engine.place_slice = place_slice
+    return calls
+
+
+def test_failed_last_slice_is_sent_as_catch_up(exchange):
+    engine = TwapEngine(exchange.client, 'BTCUSDT', 'BUY', 0.05, 0.01, slices=5)
+    calls = _failing_slices(engine, lambda index, call: call == 5)
+
+    report = asyncio.run(engine.run())
+
+    assert len(calls) == 6
+    assert calls[-1] == (4, Decimal('0.010'))
+    assert Decimal(report['executed']) == Decimal('0.050')
+    assert Decimal(report['unfilled']) == 0
+    assert float(exchange.client.futures_position_information(symbol='BTCUSDT')[0]['positionAmt']) == 0.05
+
+
+def test_failed_slice_is_carried_into_the_next(exchange):
+    engine = TwapEngine(exchange.client, 'BTCUSDT', 'SELL', 0.05, 0.01, slices=5)
+    calls = _failing_slices(engine, lambda index, call: index == 2)
+
+    report = asyncio.run(engine.run())
+
+    assert calls[3] == (3, Decimal('0.020'))
+    assert Decimal(report['executed']) == Decimal('0.050')
+    assert Decimal(report['unfilled']) == 0
+
+
+def test_unsent_remainder_is_reported(exchange):
+    engine = TwapEngine(exchange.client, 'BTCUSDT', 'SELL', 0.05, 0.01, slices=5)
+    calls = _failing_slices(engine, lambda index, call: index >= 3)
+
+    report = asyncio.run(engine.run())
+
+    # Slices 4 and 5, then the catch-up for both, all failed.
+    assert calls[-1] == (4, Decimal('0.020'))
+    assert Decimal(report['executed']) == Decimal('0.030')
+    assert Decimal(report['unfilled']) == Decimal('0.020')
@@ -0,0 +1,43 @@
+import asyncio
+
+
+def test_reconnect_resyncs_order_store(exchange):
+    client = exchange.client
+
+    async def main():
+        async with exchange.user_stream() as (stream, store):
+            order = client.futures_create_order(symbol='BTCUSDT', side='BUY', type='LIMIT', timeInForce='GTC',
+                                                quantity='0.010', price='59000')
+            await exchange.wait_until(lambda: store.get(order_id=order['orderId']) is not None)
+            resyncs = store.resyncs
+
+            # Drop the socket and fill the order while the stream is down: no event reaches the store.
+            await stream._ws.close()
+            await asyncio.to_thread(exchange.trade, 'BTCUSDT', 58900)
+
+            await exchange.wait_until(lambda: store.resyncs > resyncs)
+            record = store.get(order_id=order['orderId'])
+            assert record.status == 'FILLED'
+            assert store.open_orders('BTCUSDT') == []
+            assert float(store.position('BTCUSDT').amount) == 0.01
+
+    asyncio.run(main())
+
+
+def test_events_after_reconnect_reach_handlers(exchange):
+    client = exchange.client
+
+    async def main():
+        async with exchange.user_stream() as (stream, store):
+            seen = []
+            stream.on('ORDER_TRADE_UPDATE', lambda event: seen.append(event['o']['c']), symbol='BTCUSDT')
+            reconnected = asyncio.Event()
+            stream.on_reconnect(reconnected.set)
+
+            await stream._ws.close()
+            await asyncio.wait_for(reconnected.wait(), 5)
+            order = client.futures_create_order(symbol='BTCUSDT', side='SELL', type='LIMIT', timeInForce='GTC',
+                                                quantity='0.010', price='61000')
+            await exchange.wait_until(lambda: order['clientOrderId'] in seen)
+
+    asyncio.run(main())